@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from authentication.services.token import TokenService
+from glik.constants import AUTH_TOKEN_REFRESH_SECONDS
+
+class CachedTokenAuthentication(TokenAuthentication):
+  """
+  TokenAuthentication that keeps the user of each token in the cache, so the
+  requests don't query the token and the user. The entries are removed when the
+  token is deleted (logout) and when the user is saved or deleted (authentication/signals.py).
+  With AUTH_TOKEN_EXPIRATION_SECONDS the tokens expire after that time without use
+  """
+
+  def authenticate_credentials(self, key):
+    entry = cache.get(TokenService.get_cache_key(key))
+    if entry is None:
+      try:
+        token = Token.objects.select_related('user').get(key=key)
+      except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+      entry = { 'user': token.user, 'created': token.created }
+      TokenService.cache_token(key, token.user, token.created)
+
+    user = entry['user']
+    if not user.is_active:
+      raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+    if settings.AUTH_TOKEN_EXPIRATION_SECONDS:
+      self.check_expiration(key, user, entry['created'])
+    return (user, key)
+
+  @staticmethod
+  def check_expiration(key, user, created):
+    if TokenService.is_expired(created):
+      Token.objects.filter(key=key).delete()
+      raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+    # sliding expiration, the token is renewed at most once every AUTH_TOKEN_REFRESH_SECONDS
+    now = timezone.now()
+    if (now - created).total_seconds() > AUTH_TOKEN_REFRESH_SECONDS:
+      Token.objects.filter(key=key).update(created=now)
+      TokenService.cache_token(key, user, now)
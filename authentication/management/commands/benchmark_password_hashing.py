@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from authentication.services.security import Security_service
+
+class Command(BaseCommand):
+  help = 'Logins per second per core of each cost of the password hasher (PASSWORD_HASH_ITERATIONS)'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--iterations', type=int, nargs='+', default=[600000, 390000, 260000, 100000], help='Costs to compare')
+    parser.add_argument('--logins', type=int, default=20, help='Logins for each cost')
+    parser.add_argument('--workers', type=int, default=4, help='Threads logging in at the same time')
+
+  def handle(self, *args, **options):
+    """
+    A login is the work of LoginView with the password: Security_service.encrypt and the
+    check of the hash. It runs in one thread (per core) and then in --workers threads
+    """
+    password = 'benchmark-password'
+
+    def login(encoded):
+      return check_password(Security_service().encrypt(password), encoded)
+
+    for iterations in options['iterations']:
+      with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+        encoded = make_password(Security_service().encrypt(password))
+        start = time.perf_counter()
+        for _ in range(options['logins']):
+          login(encoded)
+        seconds = time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+          start = time.perf_counter()
+          list(executor.map(login, [encoded] * options['logins'] * options['workers']))
+          parallel_seconds = time.perf_counter() - start
+
+      self.stdout.write(
+        f"{iterations:>8} iterations: {seconds / options['logins'] * 1000:7.1f} ms/login | "
+        f"{options['logins'] / seconds:7.1f} logins/s per core | "
+        f"{options['logins'] * options['workers'] / parallel_seconds:7.1f} logins/s with {options['workers']} threads"
+      )
@@ -0,0 +1,57 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from authentication.authentication import CachedTokenAuthentication
+from users.models import User
+from users.views import SelfUserView
+
+class Command(BaseCommand):
+  help = 'Compare the throughput of an authenticated endpoint with TokenAuthentication and CachedTokenAuthentication'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--requests', type=int, default=2000, help='Requests for each authentication class')
+
+  def handle(self, *args, **options):
+    """
+    The requests go to api/user/self through the view (without the middlewares),
+    the user and its token are discarded at the end of the benchmark
+    """
+    factory = APIRequestFactory()
+    original_classes = SelfUserView.authentication_classes
+    with transaction.atomic():
+      suffix = uuid.uuid4().hex[:8]
+      user = User.objects.create(username=f"benchmark-{suffix}", email=f"benchmark-{suffix}@example.com", country_user_id=f"B-{suffix}")
+      token = Token.objects.create(user=user)
+      try:
+        for authentication_class in [TokenAuthentication, CachedTokenAuthentication]:
+          SelfUserView.authentication_classes = [authentication_class]
+          view = SelfUserView.as_view()
+          # warm up, the first request fills the caches
+          view(factory.get('/api/user/self', HTTP_AUTHORIZATION=f"Token {token.key}"))
+
+          timings = []
+          queries = []
+          # counts the queries without keeping them
+          with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            for _ in range(options['requests']):
+              request = factory.get('/api/user/self', HTTP_AUTHORIZATION=f"Token {token.key}")
+              start = time.perf_counter()
+              response = view(request)
+              timings.append((time.perf_counter() - start) * 1000)
+              assert response.status_code == 200
+          timings.sort()
+          self.stdout.write(
+            f"{authentication_class.__name__:>25}: {len(timings) / (sum(timings) / 1000):8.1f} requests/s | "
+            f"p50 {statistics.median(timings):6.2f} ms | p95 {timings[int(len(timings) * 0.95) - 1]:6.2f} ms | "
+            f"{len(queries) / len(timings):.1f} queries/request"
+          )
+      finally:
+        SelfUserView.authentication_classes = original_classes
+        transaction.set_rollback(True)
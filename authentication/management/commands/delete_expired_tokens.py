@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from authentication.services.token import TokenService
+
+class Command(BaseCommand):
+  help = 'Delete the authentication tokens unused for AUTH_TOKEN_EXPIRATION_SECONDS'
+
+  def handle(self, *args, **options):
+    """
+    The expired tokens are rejected when they are used, this command removes
+    the ones that are never used again, it should be scheduled daily
+    """
+    if not settings.AUTH_TOKEN_EXPIRATION_SECONDS:
+      self.stdout.write('AUTH_TOKEN_EXPIRATION_SECONDS is not set, the tokens never expire')
+      return
+    deleted = TokenService.delete_expired_tokens()
+    self.stdout.write(self.style.SUCCESS(f"{deleted} expired tokens deleted"))
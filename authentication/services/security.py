@@ -6,12 +6,18 @@ encrypt and decrypt text
 import hashlib
 # To get the environment variable
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 load_dotenv()
 
+@lru_cache(maxsize=None)
+def get_secret_key():
+  # read once, the service is created on each login
+  return os.environ.get("SHA256_SECRET").encode('utf-8')
+
 class Security_service:
   def __init__(self):
-    self.key = os.environ.get("SHA256_SECRET").encode('utf-8')
+    self.key = get_secret_key()
   
   def encrypt(self, text):
     """Encrypts text using SHA256 and a secret key."""
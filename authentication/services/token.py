@@ -0,0 +1,48 @@
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from glik.constants import AUTH_TOKEN_CACHE_SECONDS
+
+class TokenService:
+
+  def get_cache_key(key):
+    # the tokens are credentials, only their hash is written in the cache
+    return f"auth:token:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+  def cache_token(key, user, created):
+    cache.set(TokenService.get_cache_key(key), { 'user': user, 'created': created }, AUTH_TOKEN_CACHE_SECONDS)
+
+  def is_expired(created):
+    expiration = settings.AUTH_TOKEN_EXPIRATION_SECONDS
+    return bool(expiration) and created < timezone.now() - timedelta(seconds=expiration)
+
+  def get_or_create_token(user):
+    """
+    This method returns the token of the user, an expired token is replaced
+    """
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and TokenService.is_expired(token.created):
+      token.delete()
+      token = Token.objects.create(user=user)
+    return token
+
+  def delete_expired_tokens():
+    expiration = settings.AUTH_TOKEN_EXPIRATION_SECONDS
+    if not expiration:
+      return 0
+    deleted, _ = Token.objects.filter(created__lt=timezone.now() - timedelta(seconds=expiration)).delete()
+    return deleted
+
+  def invalidate_key(key):
+    transaction.on_commit(lambda: cache.delete(TokenService.get_cache_key(key)))
+
+  def invalidate_user(user_id):
+    """
+    The cached user of the token is outdated after any change of the user (password, is_active...)
+    """
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+      TokenService.invalidate_key(key)
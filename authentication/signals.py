@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from authentication.services.token import TokenService
+from users.models import User
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+  # logout, expiration and the tokens deleted with their user
+  TokenService.invalidate_key(instance.key)
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+  # password changes, deactivations... the saves of the last login don't change the cached user
+  if not created and update_fields != frozenset(['last_login']):
+    TokenService.invalidate_user(instance.id)
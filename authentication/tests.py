@@ -1,3 +1,84 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from authentication.authentication import CachedTokenAuthentication
+from users.models import User, UserDocument
+from glik.constants import DOCUMENT_TYPES_BITS
 
-# Create your tests here.
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestCachedTokenAuthentication(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.token = Token.objects.create(user=self.user)
+    self.authentication = CachedTokenAuthentication()
+
+  def test_the_user_of_the_token_is_cached(self):
+    user, _ = self.authentication.authenticate_credentials(self.token.key)
+    self.assertEqual(user.id, self.user.id)
+    with self.assertNumQueries(0):
+      user, _ = self.authentication.authenticate_credentials(self.token.key)
+    self.assertEqual(user.id, self.user.id)
+
+  def test_logout_invalidates_the_token(self):
+    key = self.token.key
+    self.authentication.authenticate_credentials(key)
+    with self.captureOnCommitCallbacks(execute=True):
+      self.token.delete()
+    with self.assertRaises(exceptions.AuthenticationFailed):
+      self.authentication.authenticate_credentials(key)
+
+  def test_changes_of_the_user_invalidate_the_token(self):
+    self.authentication.authenticate_credentials(self.token.key)
+    with self.captureOnCommitCallbacks(execute=True):
+      self.user.is_active = False
+      self.user.save()
+    with self.assertRaises(exceptions.AuthenticationFailed):
+      self.authentication.authenticate_credentials(self.token.key)
+
+  def test_documents_invalidate_the_token(self):
+    # the document types are updated without a save of the user
+    self.authentication.authenticate_credentials(self.token.key)
+    with self.captureOnCommitCallbacks(execute=True):
+      UserDocument.objects.create(user=self.user, name="CI", document="user_documents/CI")
+    user, _ = self.authentication.authenticate_credentials(self.token.key)
+    self.assertEqual(user.document_types, DOCUMENT_TYPES_BITS["CI"])
+
+  @override_settings(AUTH_TOKEN_EXPIRATION_SECONDS=60 * 60 * 24)
+  def test_sliding_expiration(self):
+    # a token in use is renewed
+    Token.objects.filter(key=self.token.key).update(created=timezone.now() - timedelta(hours=2))
+    self.authentication.authenticate_credentials(self.token.key)
+    self.token.refresh_from_db()
+    self.assertGreater(self.token.created, timezone.now() - timedelta(minutes=1))
+
+    # a token unused for longer than the expiration is deleted
+    cache.clear()
+    Token.objects.filter(key=self.token.key).update(created=timezone.now() - timedelta(days=2))
+    with self.assertRaises(exceptions.AuthenticationFailed):
+      self.authentication.authenticate_credentials(self.token.key)
+    self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+class TestPasswordHashing(TestCase):
+  def setUp(self):
+    self.client = APIClient()
+    with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+      self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+      self.user.set_password("secret-password")
+      self.user.save()
+
+  def login(self):
+    return self.client.post('/api/auth/login', {'username': 'johndoe', 'password': 'secret-password'}, format='json')
+
+  @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+  def test_the_hash_is_updated_on_login(self):
+    self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+    self.assertEqual(self.login().status_code, 200)
+    self.user.refresh_from_db()
+    self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+    # the new hash is of the same password
+    self.assertEqual(self.login().status_code, 200)
@@ -7,6 +7,7 @@ from rest_framework.authtoken.models import Token
 from utils.api_response import get_successful_response, get_failed_response
 from rest_framework.authtoken.views import ObtainAuthToken
 from authentication.services.security import Security_service
+from authentication.services.token import TokenService
 from rest_framework.permissions import IsAuthenticated
 from django.utils.translation import gettext as _
 from notifications.services.email import send_forgot_password_email
@@ -29,8 +30,6 @@ class ForgotPasswordView(APIView):
       # Get token and new password from request
       token = request.data['token']
       new_password = request.data['new_password']
-      security_service = Security_service()
-      new_password = security_service.encrypt(new_password)
     except:
       return get_failed_response(message=_("Token and new password are required"))
 
@@ -79,18 +78,11 @@ class ForgotPasswordView(APIView):
 
 class LoginView(ObtainAuthToken):
   def post(self, request, *args, **kwargs):
-    print(request.data['password'])
     security_service = Security_service()
-    print(request.data['password'])
     request.data['password'] = security_service.encrypt(request.data['password'])
-    print(request.data['password'])
 
     serializer = self.serializer_class(data=request.data, context={'request': request})
-    print(request)
     serializer.is_valid(raise_exception=True)
-    print(request.data['password'])
     user = serializer.validated_data['user']
-    print(request.data['password'])
-    token, created = Token.objects.get_or_create(user=user)
-    print(request.data['password'])
+    token = TokenService.get_or_create_token(user)
     return get_successful_response(data={'token': token.key}, message="Login successful")
\ No newline at end of file
@@ -1,6 +1,9 @@
 from enum import Enum
 
 PAGE_SIZE_DEFAULT = 5
+# The larger lists are exported with ?format=ndjson|csv&stream=1
+PAGE_SIZE_MAX = 100
+STREAM_CHUNK_SIZE = 1000
 
 # Environment variables
 
@@ -30,16 +33,76 @@ GROUPS = {
 
 USER_TYPES_OPTIONS = [('natural', 'Natural'), ('juridic', 'Juridic')]
 
+# The searches of users that look like an id number match a part of the ids from this many digits
+USER_SEARCH_ID_MIN_DIGITS = 3
+# Users of a bulk onboarding (users/services/user_onboarding.py), they are saved by batches.
+# The passwords of an api/user/onboarding request are hashed in the request, these take about
+# a second at 600000 iterations (PASSWORD_HASH_ITERATIONS), the longer lists are onboarded with
+# the onboard_users command
+USER_ONBOARDING_MAX_USERS = 8
+USER_ONBOARDING_BATCH_SIZE = 1000
+
+# Direct uploads of the user documents: content type -> extension of the file
+USER_DOCUMENT_CONTENT_TYPES = { 'application/pdf': '.pdf', 'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/heic': '.heic' }
+USER_DOCUMENT_MAX_SIZE = 20 * 1024 * 1024
+
 # => User Document Types
+# New types are added at the end, the position is the bit of the type in User.document_types
 DOCUMENT_TYPES = [ 'CI', 'RIF', 'PASSPORT', 'DRIVER_LICENSE', 'SERVICE_STATEMENT', 'RESIDENCE_PERMIT', 'BANK_ACCOUNT_STATEMENT', 'PAYROLL', 'COMMERCIAL_REGISTER', 'CONSTITUTIVE_DOCUMENT', 'OTHER' , 'WORK_STATEMENT']
+DOCUMENT_TYPES_BITS = { name: 1 << index for index, name in enumerate(DOCUMENT_TYPES) }
 
 # The users should have at least one element of each row
 DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE = [ ['CI', 'PASSPORT'], ['RIF'], ['SERVICE_STATEMENT', 'RESIDENCE_PERMIT'], ['WORK_STATEMENT'] ]
 DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE = [ ['COMMERCIAL_REGISTER', 'CONSTITUTIVE_DOCUMENT'], ['RIF'], ['CI'] ]
 
+# Products constants
+
+# Autocomplete of the product search box
+SUGGEST_MIN_LENGTH = 2
+SUGGEST_LIMIT_DEFAULT = 8
+SUGGEST_LIMIT_MAX = 20
+SUGGEST_CACHE_SECONDS = 60
+# Minimum word similarity (pg_trgm) between the search and the name or brand
+SUGGEST_SIMILARITY_THRESHOLD = 0.4
+
+# Limits of the price facet, the last bucket has no upper limit
+PRODUCT_PRICE_BUCKETS = [0, 500, 1000, 2500, 5000, 10000]
+# The facets are omitted when they take longer than this (the page is returned anyway)
+PRODUCT_FACETS_TIMEOUT_MS = 300
+# Keys of Product.extra with their own b-tree index, filtered by their text value
+PRODUCT_EXTRA_PROMOTED_KEYS = ('color', 'engine_size')
+# Maximum number of extra__<key> filters of a request
+PRODUCT_EXTRA_FILTERS_MAX = 10
+# Maximum number of values of all the extra__<key> filters of a request, a repeated param adds one per value
+PRODUCT_EXTRA_FILTER_VALUES_MAX = 20
+
+# Rows validated and saved together in the bulk import of products
+PRODUCT_IMPORT_BATCH_SIZE = 1000
+
+# Widths of the resized copies of the product images, they are never enlarged
+PRODUCT_IMAGE_WIDTHS = [320, 640, 1024]
+# Format: (Pillow format, quality)
+PRODUCT_IMAGE_FORMATS = {
+  'webp': ('WEBP', 80),
+  'jpeg': ('JPEG', 82),
+}
+# Threads that create the variants out of the request
+PRODUCT_IMAGE_WORKERS = 2
+# Direct uploads of the product images: content type -> extension of the file
+PRODUCT_IMAGE_CONTENT_TYPES = { 'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp' }
+PRODUCT_IMAGE_MAX_SIZE = 20 * 1024 * 1024
+
 # Leases constants
 
 LEASE_WEEKS_PERIODS = [ 12, 24, 36, 48 ]
+# A weekly fee is affordable when it takes at most this percent of the weekly income
+LEASE_MAX_WEEKLY_FEE_INCOME_PERCENT = 30
+# Limits of the api/product/quote endpoint
+QUOTE_MAX_PRODUCTS = 50
+QUOTE_MAX_INCOMES = 20
+# The quotes are computed in int64: with amounts (prices and incomes) up to this value the fees
+# of a basket of QUOTE_MAX_PRODUCTS products (and fee * 100) can't overflow
+QUOTE_MAX_AMOUNT = 10 ** 15
 
 LEASES_TYPES = [('lease', 'Lease'), ('purchase', 'Purchase')]
 
@@ -50,6 +113,17 @@ class LEASES_STATUS(Enum):
   CANCELED = 'CANCELED'
   FINISHED = 'FINISHED'
 
+# The leases in these status are not counted in the best sellers counters of the products
+LEASES_STATUS_NOT_COUNTED = [ LEASES_STATUS.REJECTED.value, LEASES_STATUS.CANCELED.value ]
+
+# Rolling counters of leases of the products, in days
+LEASES_COUNT_WINDOWS = { 'leases_count_7d': 7, 'leases_count_30d': 30 }
+
+# A lease pending approval holds a unit of the stock of the product for this long
+STOCK_RESERVATION_SECONDS = 72 * 60 * 60
+# The expired reservations are released by batches of this size
+STOCK_RESERVATION_SWEEP_BATCH_SIZE = 500
+
 # Payments 
 
 class PAYMENTS_STATUS(Enum):
@@ -57,7 +131,70 @@ class PAYMENTS_STATUS(Enum):
   PAID = 'PAID'
   CANCELED = 'CANCELED'
 
+# Storage
+
+# The signed urls are cached until this many seconds before they expire
+SIGNED_URL_CACHE_MARGIN_SECONDS = 60
+
+# The public files are named after their content, so they can be cached forever
+PUBLIC_FILES_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# The clients upload the files straight to the storage, the url to start the upload is valid for this long
+DIRECT_UPLOAD_SECONDS = 60 * 60
+# A started upload can be resumed for days, the ones that aren't finalized in this time are deleted (delete_expired_uploads)
+DIRECT_UPLOAD_PENDING_SECONDS = 60 * 60 * 24
+# The first bytes of the files of each extension: (offset, bytes), a finalized upload that
+# doesn't start with the signature of its declared content type is rejected
+DIRECT_UPLOAD_FILE_SIGNATURES = {
+  '.pdf': ((0, b'%PDF-'),),
+  '.jpg': ((0, b'\xff\xd8\xff'),),
+  '.png': ((0, b'\x89PNG\r\n\x1a\n'),),
+  '.webp': ((0, b'RIFF'), (8, b'WEBP')),
+  '.heic': ((4, b'ftyp'),),
+}
+
+# => User Document Blobs
+# The files of the user documents are stored once by their content (users/services/blob.py).
+# The blobs without documents are deleted by collect_document_blobs after this time without changes
+DOCUMENT_BLOB_GC_GRACE_SECONDS = 60 * 60
+DOCUMENT_BLOB_GC_BATCH_SIZE = 500
+# Threads that hash the direct uploads out of the request
+DOCUMENT_BLOB_WORKERS = 2
+
+# => Zip archives of the user documents (utils/zipstream.py)
+# The files are read by chunks while the archive is sent: at most ZIP_STREAM_WORKERS files
+# at the same time and ZIP_STREAM_PREFETCH_CHUNKS chunks ahead of each one (4 MB by response)
+ZIP_STREAM_CHUNK_SIZE = 256 * 1024
+ZIP_STREAM_WORKERS = 4
+ZIP_STREAM_PREFETCH_CHUNKS = 4
+
 # Strings for API responses
 
 REQUEST_SUCCESSFUL = 'Request successful'
 REQUEST_UNSUCCESSFUL = 'Request unsuccessful'
+
+# Cache
+
+# The catalog responses are cached by catalog version, any write (the stock too) creates a new version.
+# The leases counters change with every lease, they are updated when the responses expire
+CATALOG_CACHE_NAMESPACE = 'catalog'
+CATALOG_CACHE_SECONDS = 60 * 10
+# The category tree only changes with the categories
+CATEGORY_CACHE_NAMESPACE = 'categories'
+CATEGORY_TREE_CACHE_SECONDS = 60 * 60 * 24
+# Groups and permissions of each user, a change of the permissions of a group creates a new version
+# for everybody, a change of the groups or permissions of a user only for that user
+PERMISSIONS_CACHE_NAMESPACE = 'permissions'
+PERMISSIONS_CACHE_SECONDS = 60 * 60 * 24
+# The user of each authentication token is cached for this long
+AUTH_TOKEN_CACHE_SECONDS = 60
+# With AUTH_TOKEN_EXPIRATION_SECONDS (settings) the tokens in use are renewed at most once in this time
+AUTH_TOKEN_REFRESH_SECONDS = 60 * 60
+# While a worker builds a cached value the others wait for it up to this time
+CACHE_BUILD_LOCK_SECONDS = 10
+CACHE_BUILD_POLL_SECONDS = 0.05
+
+# Passwords
+
+# Processes that hash the passwords of a bulk onboarding of users, one per core when it is None
+PASSWORD_HASHING_WORKERS = None
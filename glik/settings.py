@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',  # To use TokenAuthentication
     'users',  # Our authentication app with the custom User model
@@ -102,7 +103,8 @@ WSGI_APPLICATION = 'glik.wsgi.application'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # https://www.django-rest-framework.org/api-guide/authentication/#by-exposing-an-api-endpoint
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with the user of the token in the cache
+        'authentication.authentication.CachedTokenAuthentication',
     ],
 
     # https://github.com/vbabiy/djangorestframework-camel-case
@@ -188,6 +190,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # https://docs.djangoproject.com/en/4.2/topics/auth/customizing/#auth-custom-user
 AUTH_USER_MODEL = 'users.User'
 
+# The passwords are hashed with PBKDF2 (users/hashers.py), the iterations are the cost of each login:
+# 600000 is the default of Django 4.2, see benchmark_password_hashing for the logins per second
+# of each cost. The hashes with other iterations are updated on the next login
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS") or 600000)
+PASSWORD_HASHERS = [
+    'users.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Optional expiration of the authentication tokens, the time without using them (sliding)
+AUTH_TOKEN_EXPIRATION_SECONDS = int(os.environ.get("AUTH_TOKEN_EXPIRATION_SECONDS") or 0) or None
+
+# The permissions of the users are read from a cached snapshot (users/services/permission.py)
+AUTHENTICATION_BACKENDS = ['users.backends.CachedPermissionBackend']
+
 #CORS_ALLOWED_ORIGINS = [
 #    os.environ.get("ADMIN_BASE_URL"),
 #    os.environ.get("WEB_BASE_URL"),
@@ -220,5 +240,45 @@ GS_CREDENTIALS = service_account.Credentials.from_service_account_file(
 GS_EXPIRATION = timedelta(minutes=5)
 # Needed for uploading large streams, entirely optional otherwise
 GS_BLOB_CHUNK_SIZE = 1024 * 256 * 40
-STORAGES = {"default": {
-    "BACKEND": "storages.backends.gcloud.GoogleCloudStorage"}}
+# The signed urls of the private files are cached, see utils/storages.py
+# The public files (product images) are served without signature
+STORAGES = {
+    "default": {
+        "BACKEND": "utils.storages.CachedSignedURLGoogleCloudStorage",
+    },
+    "public": {
+        "BACKEND": "utils.storages.PublicGoogleCloudStorage",
+        "OPTIONS": {
+            "bucket_name": os.environ.get("GS_PUBLIC_BUCKET_NAME") or GS_BUCKET_NAME,
+            # Empty when the bucket uses uniform bucket-level access and it is public through IAM
+            "default_acl": os.environ.get("GS_PUBLIC_DEFAULT_ACL", "publicRead") or None,
+        },
+    },
+}
+
+# Uploaded files
+# https://docs.djangoproject.com/en/4.2/ref/settings/#file-upload-handlers
+# The files are hashed while they are received, the user documents are stored by their content
+FILE_UPLOAD_HANDLERS = [
+    "utils.uploads.HashingMemoryFileUploadHandler",
+    "utils.uploads.HashingTemporaryFileUploadHandler",
+]
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# It has to be shared by all the workers: redis when REDIS_URL is defined,
+# otherwise the file system of the machine
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "/tmp/glik_cache"),
+        }
+    }
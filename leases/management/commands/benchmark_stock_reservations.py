@@ -0,0 +1,117 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+import leases.services.stock as stock_service
+from exceptions.custom_exception import CustomException
+from glik.constants import LEASES_STATUS
+from leases.models import Lease, LoanGrantor, StockReservation
+from products.models import Category, Product
+from users.models import User, Address, Company
+
+class Command(BaseCommand):
+  help = 'Create leases of one product from many threads and check that the stock is never oversold'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--workers', type=int, default=32, help='Threads creating leases at the same time')
+    parser.add_argument('--attempts', type=int, default=2000, help='Leases that the threads try to create')
+    parser.add_argument('--stock', type=int, default=500, help='Initial stock of the product')
+    parser.add_argument(
+      '--naive', action='store_true',
+      help='Also run the read-then-write reservation (SELECT stock, UPDATE stock = value - 1) to compare',
+    )
+
+  def handle(self, *args, **options):
+    """
+    The threads use their own connections, so the rows are committed
+    and deleted at the end instead of rolled back
+    """
+    fixtures = self.seed()
+    try:
+      methods = [('conditional update', stock_service.reserve_stock)]
+      if options['naive']:
+        methods.append(('read then write', self.naive_reserve_stock))
+      for label, reserve in methods:
+        Product.objects.filter(id=fixtures['product'].id).update(stock=options['stock'])
+        Lease.objects.filter(product=fixtures['product']).delete()
+        seconds, created, out_of_stock = self.run(fixtures, reserve, options['workers'], options['attempts'])
+        stock = Product.objects.get(id=fixtures['product'].id).stock
+        oversold = created - options['stock']
+        self.stdout.write(
+          f"{label:>18}: {options['attempts'] / seconds:8.1f} attempts/s | {created} leases | "
+          f"{out_of_stock} out of stock | stock {stock} | "
+          f"{StockReservation.objects.filter(product=fixtures['product']).count()} reservations | "
+          f"oversold {max(oversold, 0)}"
+        )
+    finally:
+      fixtures['product'].delete()
+      fixtures['category'].delete()
+      fixtures['user'].delete()
+      fixtures['company'].delete()
+
+  def seed(self):
+    suffix = uuid.uuid4().hex[:8]
+    user = User.objects.create(username=f"benchmark-{suffix}", email=f"benchmark-{suffix}@example.com", country_user_id=f"V-{suffix}")
+    company = Company.objects.create(name=f"benchmark-{suffix}", web_page="", instagram="", facebook="", address="")
+    category = Category.objects.create(name=f"benchmark-{suffix}")
+    return {
+      'user': user,
+      'company': company,
+      'category': category,
+      'address': Address.objects.create(name="Home", description="Home", latitude=10, longitude=-66, user=user),
+      'loan_grantor': LoanGrantor.objects.create(
+        first_name="Jane", last_name="Doe", relationship="Mother", phone_number="1", email="jane@example.com",
+        address_room="1", land_line_number="1", company=company,
+      ),
+      'product': Product.objects.create(
+        internal_id=f"benchmark-{suffix}", name=f"benchmark-{suffix}", description="", category=category,
+        stock=0, lease_price=1200, initial_fee=100, cash_price=1000, brand="", extra={},
+      ),
+    }
+
+  def run(self, fixtures, reserve, workers, attempts):
+    remaining = iter(range(attempts))
+    lock = threading.Lock()
+    results = { 'created': 0, 'out_of_stock': 0 }
+
+    def create_leases():
+      try:
+        while True:
+          with lock:
+            if next(remaining, None) is None:
+              return
+          try:
+            # the same transaction as CreateLeaseSerializer.create: the lease, then the stock
+            with transaction.atomic():
+              lease = Lease.objects.create(
+                status=LEASES_STATUS.PENDING_APPROVAL.value, type='lease', user_score=0, full_product_price=1000,
+                initial_fee=100, monthly_fee=100, fees_number=12, weekly_income=100, lease_reason="Benchmark",
+                user=fixtures['user'], product=fixtures['product'], address=fixtures['address'],
+                loan_grantor=fixtures['loan_grantor'],
+              )
+              reserve(lease)
+            result = 'created'
+          except CustomException:
+            result = 'out_of_stock'
+          with lock:
+            results[result] += 1
+      finally:
+        connection.close()
+
+    threads = [ threading.Thread(target=create_leases) for _ in range(workers) ]
+    start = time.perf_counter()
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return time.perf_counter() - start, results['created'], results['out_of_stock']
+
+  @staticmethod
+  def naive_reserve_stock(lease):
+    stock = Product.objects.get(id=lease.product_id).stock
+    if stock <= 0:
+      raise CustomException(message="The product is out of stock", status_code=409)
+    Product.objects.filter(id=lease.product_id).update(stock=stock - 1)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+import leases.services.stock as stock_service
+
+class Command(BaseCommand):
+  help = 'Give back to the stock the units held by the expired reservations of the leases'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--interval', type=int, default=0,
+      help='Keep running and sweep every this many seconds (0 sweeps once, for cron)',
+    )
+
+  def handle(self, *args, **options):
+    """
+    The reservations expire while the leases wait for approval, this command
+    runs as a background worker with --interval or scheduled without it
+    """
+    while True:
+      released = stock_service.release_expired_reservations()
+      self.stdout.write(f"{released} expired stock reservations released")
+      if not options['interval']:
+        return
+      # a worker that runs for days must not keep a broken connection
+      close_old_connections()
+      time.sleep(options['interval'])
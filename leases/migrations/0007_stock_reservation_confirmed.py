@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leases', '0006_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockreservation',
+            name='confirmed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
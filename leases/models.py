@@ -98,4 +98,19 @@ class PaymentDelay(models.Model):
   id = models.AutoField(primary_key=True)
   created_at = models.DateTimeField()
   fee_number = models.PositiveBigIntegerField()
-  lease = models.ForeignKey(Lease, on_delete=models.CASCADE, related_name='payment_delays_leases')
\ No newline at end of file
+  lease = models.ForeignKey(Lease, on_delete=models.CASCADE, related_name='payment_delays_leases')
+
+class StockReservation(models.Model):
+  """
+  A unit of the stock of a product held by a lease. The reservations of the leases
+  pending approval expire (release_expired_stock_reservations), the approved ones
+  are confirmed and kept. The unit is given back to the stock when the reservation
+  is deleted: the lease is rejected or canceled, or its reservation expired
+  """
+  id = models.AutoField(primary_key=True)
+  lease = models.OneToOneField(Lease, on_delete=models.CASCADE, related_name='stock_reservation')
+  product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+  created_at = models.DateTimeField(auto_now_add=True)
+  expires_at = models.DateTimeField(db_index=True)
+  # the approved leases keep their unit, their reservation doesn't expire
+  confirmed = models.BooleanField(default=False)
@@ -25,6 +25,12 @@ class LeaseAllViewPermission(BasePermission):
       return True
     return False
 
+class LeaseDocumentsPermission(BasePermission):
+  def has_permission(self, request, view):
+    if request.method == 'GET':
+      return request.user.has_perm('lease.view_lease') or Lease.objects.filter(id=view.kwargs['id'], user=request.user).exists()
+    return False
+
 class LoanGrantorViewPermission(BasePermission):
   # used also for loan grantor company
   def has_permission(self, request, view):
@@ -4,7 +4,9 @@ from users.models import User, Address, Company, UserDocument
 from products.models import Product
 from users.serializers import CompanySerializer
 from django.db import transaction
-from glik.constants import LEASES_TYPES
+from glik.constants import LEASES_TYPES, LEASES_STATUS_NOT_COUNTED
+from products.services.product import ProductService
+import leases.services.stock as stock_service
 
 # ===================== #
 #  Models Serializers   #
@@ -96,7 +98,13 @@ class CreateLeaseSerializer(serializers.Serializer):
       # Create lease
       lease_data['loan_grantor'] = loan_grantor
       lease = LeaseSerializer.create(LeaseSerializer(), validated_data=lease_data)  
+      # Count the lease in the best sellers counters of the product
+      if lease.status not in LEASES_STATUS_NOT_COUNTED:
+        ProductService.update_leases_counters(lease.product_id, lease.created_at, 1)
       # Create user document of the lease
       # TODO: Take current active documents of the user and associate them with the lease
+      # Take the unit of stock last, the row of the product stays locked until the commit
+      if lease.status not in LEASES_STATUS_NOT_COUNTED:
+        stock_service.reserve_stock(lease)
       return lease.id
 
@@ -1,6 +1,9 @@
+from django.db import transaction
 from leases.models import Lease
 from exceptions.custom_exception import CustomException
-from glik.constants import LEASES_STATUS
+from glik.constants import LEASES_STATUS, LEASES_STATUS_NOT_COUNTED
+from products.services.product import ProductService
+import leases.services.stock as stock_service
 
 valid_status = [ status.value for status in LEASES_STATUS ]
 
@@ -10,9 +13,26 @@ def update_lease_status( new_status, lease_id ):
   if new_status not in valid_status:
     raise CustomException(message="Invalid status", status_code=400)
 
-  lease = Lease.objects.filter(id=lease_id).first()
-  if lease is None:
-    raise CustomException(message="Lease not found", status_code=404)
-  
-  lease.status = LEASES_STATUS[new_status].value
-  lease.save()
\ No newline at end of file
+  with transaction.atomic():
+    # the lease is locked so concurrent changes of status don't count it twice
+    lease = Lease.objects.select_for_update().filter(id=lease_id).first()
+    if lease is None:
+      raise CustomException(message="Lease not found", status_code=404)
+
+    old_status = lease.status
+    was_counted = lease.status not in LEASES_STATUS_NOT_COUNTED
+    lease.status = LEASES_STATUS[new_status].value
+    lease.save()
+
+    # keep the best sellers counters of the product
+    is_counted = lease.status not in LEASES_STATUS_NOT_COUNTED
+    if was_counted != is_counted:
+      ProductService.update_leases_counters(lease.product_id, lease.created_at, 1 if is_counted else -1)
+
+    # the rejected and canceled leases give back their unit of stock
+    if was_counted and not is_counted:
+      stock_service.release_stock(lease)
+    elif is_counted and not was_counted:
+      stock_service.reserve_stock(lease)
+    elif old_status == LEASES_STATUS.PENDING_APPROVAL.value and lease.status == LEASES_STATUS.ACTIVE.value:
+      stock_service.confirm_stock(lease)
@@ -0,0 +1,76 @@
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from leases.models import StockReservation
+from products.models import Product
+from exceptions.custom_exception import CustomException
+from utils.cache import bump_cache_version
+from glik.constants import LEASES_STATUS, STOCK_RESERVATION_SECONDS, STOCK_RESERVATION_SWEEP_BATCH_SIZE, \
+    CATALOG_CACHE_NAMESPACE
+
+def take_stock( product_id ):
+  """
+  Takes a unit of the stock with one conditional UPDATE (stock = stock - 1 WHERE stock > 0).
+  The row lock of the update orders the concurrent leases of the product, so the stock
+  is never read and written apart and it can't go below 0. The cached catalog shows the
+  stock, a new catalog version is created when the transaction is committed
+  """
+  updated = Product.objects.filter(id=product_id, stock__gt=0).update(stock=F('stock') - 1)
+  if not updated:
+    raise CustomException(message="The product is out of stock", status_code=409)
+  bump_cache_version(CATALOG_CACHE_NAMESPACE)
+
+def give_back_stock( product_id, quantity=1 ):
+  Product.objects.filter(id=product_id).update(stock=F('stock') + quantity)
+  bump_cache_version(CATALOG_CACHE_NAMESPACE)
+
+def reserve_stock( lease ):
+  """
+  Takes the unit of the lease, the leases pending approval hold it until they expire
+  """
+  take_stock(lease.product_id)
+  StockReservation.objects.create(
+    lease=lease, product_id=lease.product_id, confirmed=lease.status != LEASES_STATUS.PENDING_APPROVAL.value,
+    expires_at=timezone.now() + timedelta(seconds=STOCK_RESERVATION_SECONDS),
+  )
+
+def release_stock( lease ):
+  """
+  Gives back the unit held by the lease, pending or approved. Only the transaction that
+  deletes the reservation gives it back, so a release and the sweeper never return it twice
+  """
+  deleted, _ = StockReservation.objects.filter(lease=lease).delete()
+  if deleted:
+    give_back_stock(lease.product_id)
+
+def confirm_stock( lease ):
+  """
+  The approved lease keeps its unit and its reservation, if the
+  reservation already expired the unit is taken again
+  """
+  confirmed = StockReservation.objects.filter(lease=lease).update(confirmed=True)
+  if not confirmed:
+    reserve_stock(lease)
+
+def release_expired_reservations( batch_size=STOCK_RESERVATION_SWEEP_BATCH_SIZE ):
+  """
+  Gives back the units of the expired reservations, it returns how many were released.
+  The reservations locked by a change of status are skipped, that change releases them
+  """
+  released = 0
+  while True:
+    with transaction.atomic():
+      expired = list(
+        StockReservation.objects.select_for_update(skip_locked=True)
+        .filter(confirmed=False, expires_at__lte=timezone.now())
+        .values_list('id', 'product_id')[:batch_size]
+      )
+      if not expired:
+        return released
+      StockReservation.objects.filter(id__in=[ id for id, _ in expired ]).delete()
+      # one update by product
+      for product_id, quantity in Counter(product_id for _, product_id in expired).items():
+        give_back_stock(product_id, quantity)
+      released += len(expired)
@@ -1,3 +1,178 @@
-from django.test import TestCase
+import io
+import tempfile
+import zipfile
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+from exceptions.custom_exception import CustomException
+from leases.models import Lease, LoanGrantor, StockReservation
+from products.models import Category, Product
+from products.services.product import ProductService
+from users.models import User, Address, Company, UserDocument
+from utils.cache import get_cache_version
+from glik.constants import CATALOG_CACHE_NAMESPACE
+import leases.services.lease as lease_service
+import leases.services.stock as stock_service
 
-# Create your tests here.
+class TestLeasesCounters(TestCase):
+  def setUp(self):
+    user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    address = Address.objects.create(name="Home", description="Home", latitude=10, longitude=-66, user=user)
+    company = Company.objects.create(name="Company", web_page="", instagram="", facebook="", address="")
+    loan_grantor = LoanGrantor.objects.create(
+      first_name="Jane", last_name="Doe", relationship="Mother", phone_number="1", email="jane@example.com",
+      address_room="1", land_line_number="1", company=company
+    )
+    category = Category.objects.create(name="Motos")
+    self.product = Product.objects.create(
+      internal_id="moto", name="Moto", description="Moto", category=category, stock=1,
+      lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+    )
+    self.lease = Lease.objects.create(
+      status="PENDING_APPROVAL", type="lease", user_score=0, full_product_price=1000, initial_fee=100,
+      monthly_fee=100, fees_number=12, weekly_income=100, lease_reason="Work", user=user,
+      product=self.product, address=address, loan_grantor=loan_grantor
+    )
+    ProductService.update_leases_counters(self.product.id, self.lease.created_at, 1)
+
+  def test_rejected_leases_are_not_counted(self):
+    lease_service.update_lease_status("REJECTED", self.lease.id)
+    self.product.refresh_from_db()
+    self.assertEqual(self.product.leases_count, 0)
+    self.assertEqual(self.product.leases_count_7d, 0)
+    self.assertFalse(ProductService.get_leases_counters_mismatches(Product.objects.all()).exists())
+
+  def test_rebuild_leases_counters(self):
+    Product.objects.update(leases_count=10, leases_count_30d=10)
+    self.assertTrue(ProductService.get_leases_counters_mismatches(Product.objects.all()).exists())
+    call_command("rebuild_leases_counters")
+    self.product.refresh_from_db()
+    self.assertEqual((self.product.leases_count, self.product.leases_count_30d), (1, 1))
+
+class TestStockReservation(TestCase):
+  def setUp(self):
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.address = Address.objects.create(name="Home", description="Home", latitude=10, longitude=-66, user=self.user)
+    company = Company.objects.create(name="Company", web_page="", instagram="", facebook="", address="")
+    self.loan_grantor = LoanGrantor.objects.create(
+      first_name="Jane", last_name="Doe", relationship="Mother", phone_number="1", email="jane@example.com",
+      address_room="1", land_line_number="1", company=company
+    )
+    category = Category.objects.create(name="Motos")
+    self.product = Product.objects.create(
+      internal_id="moto", name="Moto", description="Moto", category=category, stock=1,
+      lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+    )
+
+  def create_lease(self):
+    lease = Lease.objects.create(
+      status="PENDING_APPROVAL", type="lease", user_score=0, full_product_price=1000, initial_fee=100,
+      monthly_fee=100, fees_number=12, weekly_income=100, lease_reason="Work", user=self.user,
+      product=self.product, address=self.address, loan_grantor=self.loan_grantor
+    )
+    stock_service.reserve_stock(lease)
+    return lease
+
+  def get_stock(self):
+    self.product.refresh_from_db()
+    return self.product.stock
+
+  def test_the_last_unit_is_reserved_once(self):
+    lease = self.create_lease()
+    self.assertEqual(self.get_stock(), 0)
+    self.assertTrue(StockReservation.objects.filter(lease=lease).exists())
+    with self.assertRaises(CustomException):
+      self.create_lease()
+
+  def test_rejected_leases_give_back_the_unit(self):
+    lease = self.create_lease()
+    lease_service.update_lease_status("REJECTED", lease.id)
+    self.assertEqual(self.get_stock(), 1)
+    self.assertFalse(StockReservation.objects.exists())
+    # a second release doesn't give it back again
+    lease_service.update_lease_status("CANCELED", lease.id)
+    self.assertEqual(self.get_stock(), 1)
+
+  def test_approved_leases_keep_the_unit(self):
+    lease = self.create_lease()
+    lease_service.update_lease_status("ACTIVE", lease.id)
+    self.assertEqual(self.get_stock(), 0)
+    self.assertTrue(StockReservation.objects.get(lease=lease).confirmed)
+    # the approved reservations don't expire
+    StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+    self.assertEqual(stock_service.release_expired_reservations(), 0)
+
+  def test_canceled_active_leases_give_back_the_unit(self):
+    lease = self.create_lease()
+    lease_service.update_lease_status("ACTIVE", lease.id)
+    lease_service.update_lease_status("CANCELED", lease.id)
+    self.assertEqual(self.get_stock(), 1)
+    self.assertFalse(StockReservation.objects.exists())
+
+  def test_expired_reservations_are_released(self):
+    lease = self.create_lease()
+    StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+    call_command("release_expired_stock_reservations", stdout=io.StringIO())
+    self.assertEqual(self.get_stock(), 1)
+    self.assertFalse(StockReservation.objects.exists())
+    # the approval takes the unit again, and the cancellation gives it back
+    lease_service.update_lease_status("ACTIVE", lease.id)
+    self.assertEqual(self.get_stock(), 0)
+    lease_service.update_lease_status("CANCELED", lease.id)
+    self.assertEqual(self.get_stock(), 1)
+
+  @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+  def test_the_catalog_cache_follows_the_stock(self):
+    cache.clear()
+    version = get_cache_version(CATALOG_CACHE_NAMESPACE)
+    with self.captureOnCommitCallbacks(execute=True):
+      lease = self.create_lease()
+    reserved_version = get_cache_version(CATALOG_CACHE_NAMESPACE)
+    self.assertNotEqual(reserved_version, version)
+    with self.captureOnCommitCallbacks(execute=True):
+      lease_service.update_lease_status("REJECTED", lease.id)
+    self.assertNotEqual(get_cache_version(CATALOG_CACHE_NAMESPACE), reserved_version)
+
+@override_settings(STORAGES={
+  "default": {"BACKEND": "utils.storages.FileSystemDirectUploadStorage", "OPTIONS": {"location": tempfile.mkdtemp()}},
+  "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class TestLeaseDocuments(TestCase):
+  def setUp(self):
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.rider = User.objects.create(username="rider", email="rider@example.com", country_user_id="V-2")
+    self.reviewer = User.objects.create(username="admin", email="admin@example.com", country_user_id="V-3", is_superuser=True)
+    company = Company.objects.create(name="Company", web_page="", instagram="", facebook="", address="")
+    self.lease = Lease.objects.create(
+      status="PENDING_APPROVAL", type="lease", user_score=0, full_product_price=1000, initial_fee=100,
+      monthly_fee=100, fees_number=12, weekly_income=100, lease_reason="Work", user=self.user, rider=self.rider,
+      product=Product.objects.create(
+        internal_id="moto", name="Moto", description="Moto", category=Category.objects.create(name="Motos"), stock=1,
+        lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+      ),
+      address=Address.objects.create(name="Home", description="Home", latitude=10, longitude=-66, user=self.user),
+      loan_grantor=LoanGrantor.objects.create(
+        first_name="Jane", last_name="Doe", relationship="Mother", phone_number="1", email="jane@example.com",
+        address_room="1", land_line_number="1", company=company
+      ),
+    )
+    for user in (self.user, self.rider):
+      user_document = UserDocument(user=user, name="CI")
+      user_document.document.save(f"{user.username}.pdf", ContentFile(b"%PDF-1.4"), save=False)
+      user_document.save()
+
+  def get_folders(self, user):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get(f"/api/lease/{self.lease.id}/documents")
+    self.assertEqual(response.status_code, 200)
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+    return sorted({ name.split("/")[0] for name in archive.namelist() })
+
+  def test_the_owner_only_gets_its_documents(self):
+    self.assertEqual(self.get_folders(self.reviewer), ["johndoe", "rider"])
+    self.assertEqual(self.get_folders(self.user), ["johndoe"])
@@ -11,6 +11,7 @@ urlpatterns = [
     path('user/<int:id>', views.UserLeasesView.as_view()),
     path('user/all', views.UserLeasesAllView.as_view()),
     path('<int:id>/status', views.LeaseStatusView.as_view()),
+    path('<int:id>/documents', views.LeaseDocumentsView.as_view()),
     path('loan-grantor/<int:pk>', views.LoanGrantorView.as_view({'get': 'retrieve'})),
     path('loan-grantor/all', views.LoanGrantorView.as_view({'post': 'create'})),
     path('loan-grantor/company/<int:pk>', views.LoanGrantorCompanyView.as_view({'get': 'retrieve'})),
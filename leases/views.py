@@ -2,13 +2,15 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from utils.api_response import get_successful_response, get_failed_response \
     , get_paginated_queryset, get_paginated_response_structure
+from utils.streaming import STREAM_RENDERER_CLASSES, is_stream_request, get_stream_response
+from utils.zipstream import ZIP_RENDERER_CLASSES
 from rest_framework import status
 from leases.serializers import LeaseSerializer, CreateLeaseSerializer, LoanGrantorSerializer
 from leases.models import Lease, LoanGrantor
 from django.db.models import Q, F, Count
 from django.contrib.postgres.search import SearchVector, SearchQuery
 from rest_framework.permissions import IsAuthenticated
-from leases.permissions import LeaseViewPermission, LeaseAllViewPermission, LoanGrantorViewPermission
+from leases.permissions import LeaseViewPermission, LeaseAllViewPermission, LoanGrantorViewPermission, LeaseDocumentsPermission
 from django.utils.translation import gettext_lazy as _
 from exceptions.custom_exception import CustomException
 import leases.services.lease as lease_service
@@ -17,7 +19,8 @@ from products.serializers import ProductSerializer
 from products.models import Product
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from users.models import Company
+from users.models import Company, UserDocument
+from users.services.document import DocumentService
 from users.serializers import CompanySerializer
 
 # ========== #
@@ -40,6 +43,7 @@ class LeaseView(APIView):
 
 class LeaseAllView(APIView):  
   permission_classes = [IsAuthenticated, LeaseAllViewPermission]
+  renderer_classes = STREAM_RENDERER_CLASSES
 
   def post(self, request):
     """
@@ -68,15 +72,18 @@ class LeaseAllView(APIView):
   def get(self, request):
     """
     This method is used to get all the leases with 
-    - pagination
+    - pagination (page number, or keyset pagination with ?cursor=)
     - ordering
     - filtering 
     - searching (full text search)
+    - export, with ?format=ndjson|csv&stream=1 all the rows are streamed
     """
     queryset = self.get_filtered_queryset(request)
     ordering = self.get_ordering(request)
     query_object = self.get_query_object(request, queryset)
     leases = query_object.order_by(ordering)
+    if is_stream_request(request):
+      return get_stream_response(request, leases, LeaseSerializer, 'leases')
 
     page_object = get_paginated_queryset(request, leases)
     serialized_data = LeaseSerializer(page_object.object_list, many=True).data
@@ -139,6 +146,26 @@ class LeaseStatusView(APIView):
     new_status = request.data['new_status']      
     lease_service.update_lease_status(new_status, id)
     return get_successful_response(message="Lease status updated successfully")
+
+class LeaseDocumentsView(APIView):
+  permission_classes = [IsAuthenticated, LeaseDocumentsPermission]
+  renderer_classes = ZIP_RENDERER_CLASSES
+
+  def get(self, request, id):
+    """
+    This method is used to download the undeleted documents of the user and the rider
+    of the lease as a zip archive, one folder by user. The Range header resumes a download.
+    The owner of the lease only gets its own documents, the rider is another person
+    """
+    try:
+      lease = Lease.objects.get(id=id)
+    except Lease.DoesNotExist:
+      return get_failed_response(message=_("Lease not found"), status_code=status.HTTP_404_NOT_FOUND)
+    user_ids = [lease.user_id]
+    if lease.rider_id and request.user.has_perm('lease.view_lease'):
+      user_ids.append(lease.rider_id)
+    user_documents = UserDocument.undeleted_objects.filter(user_id__in=user_ids)
+    return DocumentService.get_bundle_response(request, user_documents, f"lease-{id}-documents", folders=True)
   
 
 # ================= #
@@ -161,20 +188,24 @@ class UserLeasesView(APIView):
 
 class UserLeasesAllView(APIView):  
   permission_classes = [IsAuthenticated]
+  renderer_classes = STREAM_RENDERER_CLASSES
 
   def get(self, request):
     """
     This method is used to get all the leases with 
-    - pagination
+    - pagination (page number, or keyset pagination with ?cursor=)
     - ordering
     - filtering 
     - searching (full text search)
+    - export, with ?format=ndjson|csv&stream=1 all the rows (with the product id) are streamed
     """
     queryset = LeaseAllView.get_filtered_queryset(request)
     ordering = LeaseAllView.get_ordering(request)
     query_object = LeaseAllView.get_query_object(request, queryset)
     query_object = query_object.filter(user=request.user) # Filter by user
     leases = query_object.order_by(ordering)
+    if is_stream_request(request):
+      return get_stream_response(request, leases, LeaseSerializer, 'leases')
     
     page_object = get_paginated_queryset(request, leases)
     serialized_data = LeaseSerializer(page_object.object_list, many=True).data
@@ -2,6 +2,7 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from utils.api_response import get_successful_response, get_failed_response \
     , get_paginated_queryset, get_paginated_response_structure
+from utils.streaming import STREAM_RENDERER_CLASSES, is_stream_request, get_stream_response
 from rest_framework import status
 from payments.serializers import PaymentSerializer
 from payments.models import Payment
@@ -43,14 +44,16 @@ class LeasePaymentView(APIView):
 
 class PaymentAllView(APIView):
   permission_classes = [IsAuthenticated, PaymentViewPermission]
+  renderer_classes = STREAM_RENDERER_CLASSES
 
   def get(self, request):
     """
     This method is used to get all the products with 
-    - pagination
+    - pagination (page number, or keyset pagination with ?cursor=)
     - ordering
     - filtering 
     - searching (full text search)
+    - export, with ?format=ndjson|csv&stream=1 all the rows are streamed
     """
     queryset = self.get_filtered_queryset(request)
     ordering = self.get_ordering(request)
@@ -64,6 +67,8 @@ class PaymentAllView(APIView):
         query_object = Payment.objects.filter(queryset)
 
     products = query_object.order_by(ordering)
+    if is_stream_request(request):
+      return get_stream_response(request, products, PaymentSerializer, 'payments')
     page_object = get_paginated_queryset(request, products)
     serialized_data = PaymentSerializer(page_object.object_list, many=True).data
     response = get_paginated_response_structure(page_object, serialized_data)
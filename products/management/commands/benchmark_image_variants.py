@@ -0,0 +1,47 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.services.image import ImageService
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+class Command(BaseCommand):
+  help = 'Measure the throughput of the product image variants pipeline over a folder of images'
+
+  def add_arguments(self, parser):
+    parser.add_argument('folder', help='Folder with sample images')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Number of threads of each run')
+    parser.add_argument('--repeat', type=int, default=1, help='Times each image is processed in a run')
+
+  def handle(self, *args, **options):
+    """
+    Only Pillow is measured, the images are read in memory before the runs
+    and the variants are not stored
+    """
+    images = []
+    for file_name in sorted(os.listdir(options['folder'])):
+      if file_name.lower().endswith(IMAGE_EXTENSIONS):
+        with open(os.path.join(options['folder'], file_name), 'rb') as image_file:
+          images.append(image_file.read())
+    if not images:
+      raise CommandError(f"There are no images in {options['folder']}")
+
+    images = images * options['repeat']
+    input_megabytes = sum(len(image) for image in images) / 1024 / 1024
+    self.stdout.write(f"{len(images)} images, {input_megabytes:.1f} MB")
+
+    for workers in options['workers']:
+      start = time.perf_counter()
+      with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda image: ImageService.create_variants(io.BytesIO(image)), images))
+      elapsed = time.perf_counter() - start
+
+      output_megabytes = sum(len(content) for variants in results for *_, content in variants) / 1024 / 1024
+      self.stdout.write(
+        f"{workers:>2} workers: {len(images) / elapsed:7.2f} images/s | "
+        f"{input_megabytes / elapsed:6.2f} MB/s in | {output_megabytes:.1f} MB of variants"
+      )
@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from glik.constants import LEASE_WEEKS_PERIODS
+from products.models import Product
+from products.services.quote import QuoteService
+
+def legacy_lease_options(product):
+  """
+  Product.lease_options before the quoting engine: float fees, one product at a time
+  """
+  ans = {}
+  for weeks in LEASE_WEEKS_PERIODS:
+    ans[weeks] = {
+      'initial_fee': product.initial_fee,
+      'weekly_fee': product.lease_price / weeks,
+      'total': product.initial_fee + product.lease_price / weeks * weeks
+    }
+  return ans
+
+class Command(BaseCommand):
+  help = 'Compare the lease quoting engine with the per product lease options property'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--products', type=int, default=10000, help='Number of products')
+    parser.add_argument('--incomes', type=int, default=10, help='Number of weekly incomes of the affordability check')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each implementation, the best one is reported')
+
+  def handle(self, *args, **options):
+    # unsaved products, nothing is written in the database
+    products = [
+      Product(id=index, lease_price=random.randint(100, 5_000_000), initial_fee=random.randint(0, 100_000))
+      for index in range(options['products'])
+    ]
+    incomes = [ random.randint(50, 2_000) for _ in range(options['incomes']) ]
+    lease_prices = [ product.lease_price for product in products ]
+    initial_fees = [ product.initial_fee for product in products ]
+
+    runs = [
+      ('per product property (float)', lambda: [ legacy_lease_options(product) for product in products ]),
+      ('quoting engine, lease options', lambda: QuoteService.get_lease_options(products)),
+      (f"quoting engine, arrays x {len(incomes)} incomes", lambda: QuoteService.quote(lease_prices, initial_fees, incomes=incomes)),
+    ]
+    cells = len(products) * len(LEASE_WEEKS_PERIODS)
+    for label, run in runs:
+      elapsed = min(self.measure(run) for _ in range(options['repeat']))
+      self.stdout.write(f"{label:>36}: {elapsed * 1000:9.2f} ms | {cells / elapsed / 1e6:7.2f} M quotes/s")
+
+  @staticmethod
+  def measure(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
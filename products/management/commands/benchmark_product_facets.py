@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from glik.constants import PRODUCT_PRICE_BUCKETS, PRODUCT_FACETS_TIMEOUT_MS
+from products.models import Category, Product
+from products.services.product import ProductService
+
+BRANDS = ['Bera', 'Empire', 'Suzuki', 'Yamaha', 'Honda', 'Haojue', 'Kawasaki', 'Keeway']
+WORDS = ['moto', 'camión', 'bicicleta', 'eléctrica', 'scooter', 'casco', 'repuesto', 'freno', 'motor', 'batería']
+
+class Command(BaseCommand):
+  help = 'Measure the facets of the catalog (one grouped query) against one query per facet'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--products', type=int, default=100000, help='Number of products to generate')
+    parser.add_argument('--categories', type=int, default=30, help='Number of categories to generate')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each case is executed')
+
+  def handle(self, *args, **options):
+    # All the generated rows are discarded at the end of the benchmark
+    with transaction.atomic():
+      categories = self.seed(options['products'], options['categories'])
+      cases = [
+        ('all the products', Product.objects.all()),
+        ('one category', Product.objects.filter(category=categories[0])),
+        ('search "moto"', ProductService.search(Product.objects.all(), 'moto')),
+      ]
+      self.stdout.write(f"Budget: {PRODUCT_FACETS_TIMEOUT_MS} ms")
+      for label, queryset in cases:
+        for method, facets in [('grouping sets', ProductService.get_facets), ('query per facet', self.facets_per_query)]:
+          timings = self.measure(lambda: facets(queryset), options['repeat'])
+          self.stdout.write(
+            f"{label:>17} | {method:>15}: p50 {statistics.median(timings):8.2f} ms | "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms"
+          )
+      transaction.set_rollback(True)
+
+  def seed(self, number_of_products, number_of_categories):
+    self.stdout.write(f"Generating {number_of_products} products...")
+    suffix = time.time()
+    categories = [ Category.objects.create(name=f"benchmark-{index}-{suffix}") for index in range(number_of_categories) ]
+    batch = []
+    for index in range(number_of_products):
+      batch.append(Product(
+        internal_id=f"benchmark-{index}",
+        name=f"{' '.join(random.sample(WORDS, 3))} {index}",
+        description=' '.join(random.choices(WORDS, k=20)),
+        brand=random.choice(BRANDS),
+        category=random.choice(categories),
+        stock=1, lease_price=1000, initial_fee=100, cash_price=random.randint(50, 20000), extra={},
+      ))
+      if len(batch) == 5000:
+        Product.objects.bulk_create(batch)
+        batch = []
+    Product.objects.bulk_create(batch)
+    ProductService.update_search_vector(Product.objects.filter(category__in=categories))
+    with connection.cursor() as cursor:
+      cursor.execute('ANALYZE products_product')
+    return categories
+
+  @staticmethod
+  def measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      run()
+      timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+  @staticmethod
+  def facets_per_query(queryset):
+    queryset = queryset.order_by()
+    brands = list(queryset.values('brand').annotate(count=Count('id')))
+    categories = list(queryset.values('category_id', 'category__name').annotate(count=Count('id')))
+    prices = [
+      queryset.filter(Q(cash_price__gte=minimum) & (Q(cash_price__lt=maximum) if maximum else Q())).count()
+      for minimum, maximum in zip(PRODUCT_PRICE_BUCKETS, PRODUCT_PRICE_BUCKETS[1:] + [None])
+    ]
+    return brands, categories, prices
@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+
+from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from glik.constants import PAGE_SIZE_DEFAULT
+from products.models import Category, Product
+from products.services.product import ProductService
+
+WORDS = [
+  'moto', 'motocicleta', 'camión', 'bicicleta', 'eléctrica', 'scooter', 'casco', 'repuesto',
+  'cadena', 'freno', 'motor', 'batería', 'rueda', 'asiento', 'espejo', 'faro', 'urbana',
+  'deportiva', 'trabajo', 'reparto', 'carga', 'rápida', 'económica', 'potente', 'ligera',
+]
+BRANDS = ['Bera', 'Empire', 'Suzuki', 'Yamaha', 'Honda', 'Haojue', 'Kawasaki', 'Keeway']
+QUERIES = ['moto', 'camion electrica', 'bateria', 'freno deportiva', 'Yamaha', 'repuesto motor']
+
+class Command(BaseCommand):
+  help = 'Compare the catalog search with the on the fly search vector and the stored one'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--products', type=int, default=100000, help='Number of products to generate')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each query is executed')
+
+  def handle(self, *args, **options):
+    # All the generated rows are discarded at the end of the benchmark
+    with transaction.atomic():
+      self.seed(options['products'])
+      for label, search in [('on the fly', self.legacy_search), ('stored', self.stored_search)]:
+        timings = self.measure(search, options['repeat'])
+        self.stdout.write(
+          f"{label:>10}: mean {statistics.mean(timings):8.2f} ms | "
+          f"p50 {statistics.median(timings):8.2f} ms | "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms"
+        )
+      transaction.set_rollback(True)
+
+  def seed(self, number_of_products):
+    self.stdout.write(f"Generating {number_of_products} products...")
+    category = Category.objects.create(name=f"benchmark-{time.time()}")
+    batch = []
+    for index in range(number_of_products):
+      words = random.sample(WORDS, 3)
+      batch.append(Product(
+        internal_id=f"benchmark-{index}",
+        name=f"{' '.join(words)} {index}",
+        description=' '.join(random.choices(WORDS, k=30)),
+        brand=random.choice(BRANDS),
+        category=category,
+        stock=1, lease_price=1000, initial_fee=100, cash_price=1000, extra={},
+      ))
+      if len(batch) == 5000:
+        Product.objects.bulk_create(batch)
+        batch = []
+    Product.objects.bulk_create(batch)
+    ProductService.update_search_vector(Product.objects.filter(category=category))
+    with connection.cursor() as cursor:
+      cursor.execute('ANALYZE products_product')
+
+  def measure(self, search, repeat):
+    timings = []
+    for _ in range(repeat):
+      for query in QUERIES:
+        start = time.perf_counter()
+        queryset = search(query)
+        # same work as a catalog page: total count and the first page
+        queryset.count()
+        list(queryset[:PAGE_SIZE_DEFAULT])
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+  @staticmethod
+  def legacy_search(query):
+    return Product.objects.annotate(
+      search=SearchVector('id', 'name', 'description', 'brand', config='spanish')
+    ).filter(search=SearchQuery(query, config='spanish')).order_by('-id')
+
+  @staticmethod
+  def stored_search(query):
+    return ProductService.search(Product.objects.all(), query).order_by('-search_rank', '-id')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from products.models import ProductImage
+from products.services.image import ImageService
+
+class Command(BaseCommand):
+  help = 'Create the resized variants of the product images'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--all', action='store_true', help='Also the images that already have variants')
+
+  def handle(self, *args, **options):
+    """
+    The variants are created in the upload, this command fills the images
+    uploaded before the pipeline and the ones whose background job failed
+    """
+    product_images = ProductImage.objects.exclude(image__isnull=True).exclude(image='')
+    if not options['all']:
+      product_images = product_images.filter(variants={})
+
+    generated = 0
+    for product_image_id in product_images.values_list('id', flat=True).iterator():
+      try:
+        ImageService.generate_variants(product_image_id)
+        generated += 1
+      except Exception as error:
+        self.stderr.write(f"Product image {product_image_id}: {error}")
+
+    self.stdout.write(self.style.SUCCESS(f"Variants created for {generated} product images"))
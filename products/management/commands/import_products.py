@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from glik.constants import PRODUCT_IMPORT_BATCH_SIZE
+from products.services.product_import import ProductImportService, PRODUCT_IMPORT_FORMATS
+
+class Command(BaseCommand):
+  help = 'Import the products of a csv or jsonl file'
+
+  def add_arguments(self, parser):
+    parser.add_argument('path', help='csv or jsonl file')
+    parser.add_argument('--file-format', choices=PRODUCT_IMPORT_FORMATS, help='By default the extension of the file')
+    parser.add_argument('--upsert', action='store_true', help='Update the products with the same internal id')
+    parser.add_argument('--batch-size', type=int, default=PRODUCT_IMPORT_BATCH_SIZE, help='Rows saved together')
+
+  def handle(self, *args, **options):
+    file_format = ProductImportService.get_file_format(options['path'], options['file_format'])
+    if file_format is None:
+      raise CommandError("Use --file-format, the extension of the file is unknown")
+
+    with open(options['path'], 'rb') as file:
+      result = ProductImportService.import_products(file, file_format, upsert=options['upsert'], batch_size=options['batch_size'])
+
+    for error in result.errors:
+      self.stderr.write(f"Row {error['row']}: {error['errors']}")
+    self.stdout.write(self.style.SUCCESS(
+      f"{result.created} products created, {result.updated} updated, {len(result.errors)} rows with errors"
+    ))
@@ -0,0 +1,40 @@
+import re
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from products.models import ProductImage
+
+# product_images/<internal_id>-<16 hex characters of the sha256>.<extension>
+PUBLISHED_NAME = re.compile(r'-[0-9a-f]{16}(\.\w+)?$')
+
+class Command(BaseCommand):
+  help = 'Copy the product images uploaded to the private storage to the public storage'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--dry-run', action='store_true', help='Only list the images to publish')
+
+  def handle(self, *args, **options):
+    """
+    The images uploaded before the public storage have names without the hash of
+    their content, they are read from the default storage and saved again
+    """
+    published = 0
+    product_images = ProductImage.objects.exclude(image__isnull=True).exclude(image='')
+    for product_image in product_images.iterator():
+      name = product_image.image.name
+      if PUBLISHED_NAME.search(name):
+        continue
+      if options['dry_run']:
+        self.stdout.write(name)
+        continue
+      if not default_storage.exists(name):
+        self.stderr.write(f"{name} doesn't exist in the default storage")
+        continue
+
+      with default_storage.open(name, 'rb') as content:
+        product_image.image.save(name.split('/')[-1], content, save=False)
+      product_image.save(update_fields=['image'])
+      published += 1
+
+    self.stdout.write(self.style.SUCCESS(f"{published} product images published"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Product
+from products.services.product import ProductService
+
+class Command(BaseCommand):
+  help = 'Recompute the leases counters of the products from the lease table'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--check', action='store_true',
+      help='Only report the products whose counters differ from the lease table',
+    )
+
+  def handle(self, *args, **options):
+    """
+    The rolling counters (7 and 30 days) drift while the leases leave their
+    window, so this command should be scheduled at least daily
+    """
+    if options['check']:
+      mismatches = list(ProductService.get_leases_counters_mismatches(Product.objects.all()))
+      for mismatch in mismatches:
+        self.stdout.write(str(mismatch))
+      if mismatches:
+        raise CommandError(f"{len(mismatches)} products have inconsistent leases counters")
+      self.stdout.write(self.style.SUCCESS('The leases counters are consistent'))
+      return
+
+    updated = ProductService.rebuild_leases_counters(Product.objects.all())
+    self.stdout.write(self.style.SUCCESS(f"Leases counters rebuilt for {updated} products"))
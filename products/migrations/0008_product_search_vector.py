@@ -0,0 +1,43 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.operations import UnaccentExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F
+
+
+def fill_search_vector(apps, schema_editor):
+    """
+    Store the search document of the existing products
+    """
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(
+        search_vector=SearchVector(Unaccent(F('name')), weight='A', config='spanish')
+        + SearchVector(Unaccent(F('brand')), weight='B', config='spanish')
+        + SearchVector(Unaccent(F('internal_id')), weight='B', config='spanish')
+        + SearchVector(Unaccent(F('description')), weight='C', config='spanish')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_is_featured'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:31
+
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_leases_counters(apps, schema_editor):
+    """
+    Count the leases of the existing products, rejected and canceled leases excluded
+    """
+    Product = apps.get_model('products', 'Product')
+    Lease = apps.get_model('leases', 'Lease')
+    now = timezone.now()
+    leases = Lease.objects.filter(product=OuterRef('pk')).exclude(status__in=['REJECTED', 'CANCELED'])
+
+    def count(queryset):
+        counts = queryset.order_by().values('product').annotate(count=Count('id')).values('count')
+        return Coalesce(Subquery(counts), 0)
+
+    Product.objects.update(
+        leases_count=count(leases),
+        leases_count_7d=count(leases.filter(created_at__gte=now - timedelta(days=7))),
+        leases_count_30d=count(leases.filter(created_at__gte=now - timedelta(days=30))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_trigram_indexes'),
+        ('leases', '0005_lease_weekly_income'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='leases_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='leases_count_30d',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='leases_count_7d',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_leases_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['leases_count', 'id'], name='product_leases_count_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:35
+
+from django.db import migrations, models
+import utils.storages
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_leases_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(null=True, storage=utils.storages.get_public_storage, upload_to='product_images'),
+        ),
+    ]
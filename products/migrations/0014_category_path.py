@@ -0,0 +1,58 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+def fill_category_path(apps, schema_editor):
+    """
+    Compute the path of the existing categories from the roots to the leaves
+    """
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.order_by('id'))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    visited = set()
+    def fill_subtree(root):
+        pending = [(root, '/', 0)]
+        while pending:
+            category, parent_path, depth = pending.pop()
+            visited.add(category.id)
+            category.path = f"{parent_path}{category.id}/"
+            category.depth = depth
+            pending.extend((child, category.path, depth + 1) for child in children.get(category.id, []) if child.id not in visited)
+
+    for category in children.get(None, []):
+        fill_subtree(category)
+    # the categories in a cycle of parents are unreachable from the roots, one of them becomes a root
+    for category in categories:
+        if category.id not in visited:
+            category.parent = None
+            fill_subtree(category)
+    Category.objects.bulk_update(categories, ['parent', 'path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='/', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_category_path, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
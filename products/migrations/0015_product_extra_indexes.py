@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:54
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_category_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['extra'], name='product_extra_idx', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('color', 'extra'), name='product_extra_color_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('engine_size', 'extra'), name='product_extra_engine_size_idx'),
+        ),
+    ]
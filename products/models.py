@@ -1,10 +1,35 @@
 from django.db import models
-from glik.constants import LEASE_WEEKS_PERIODS
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.fields.json import KT
+from products.services.quote import QuoteService
+from utils.storages import get_public_storage
+from glik.constants import PRODUCT_EXTRA_PROMOTED_KEYS
 
 class Category(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=50, unique=True, null=False)
     parent = models.ForeignKey('self', null=True, on_delete=models.SET_NULL, related_name='children')
+    # materialized path with the ids from the root: /1/5/12/, the subtree of a category
+    # are the categories whose path starts with its path (see CategoryService)
+    path = models.CharField(max_length=255, default='/', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['path'], opclasses=['varchar_pattern_ops'], name='category_path_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the service imports the models
+        from products.services.categoryService import CategoryService
+        super().save(*args, **kwargs)
+        # the path of a new category needs its id, the moves are done by CategoryService.move_category
+        if self.path == '/':
+            self.path = CategoryService.get_path(self)
+            self.depth = self.path.count('/') - 2
+            Category.objects.filter(id=self.id).update(path=self.path, depth=self.depth)
 
 class Product(models.Model):
     id = models.AutoField(primary_key=True)
@@ -19,28 +44,69 @@ class Product(models.Model):
     brand = models.CharField(max_length=50, null=False)
     extra = models.JSONField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_featured = models.BooleanField(default=False)
+    # Weighted full text search document, kept current by ProductService.update_search_vector
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized number of leases (rejected and canceled ones excluded) used for the best sellers
+    leases_count = models.PositiveIntegerField(default=0)
+    leases_count_7d = models.PositiveIntegerField(default=0)
+    leases_count_30d = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+            # trigram indexes used by the autocomplete
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='product_name_trgm_idx'),
+            GinIndex(fields=['brand'], opclasses=['gin_trgm_ops'], name='product_brand_trgm_idx'),
+            models.Index(fields=['leases_count', 'id'], name='product_leases_count_idx'),
+            # containment (@>) filters of the extra attributes, see ProductService.get_extra_filter
+            GinIndex(fields=['extra'], opclasses=['jsonb_path_ops'], name='product_extra_idx'),
+            *[
+                models.Index(KT(f'extra__{key}'), name=f'product_extra_{key}_idx')
+                for key in PRODUCT_EXTRA_PROMOTED_KEYS
+            ],
+        ]
 
     @property
     def lease_options(self):
-        ans = {}
-        for weeks in LEASE_WEEKS_PERIODS:
-            ans[weeks] = {
-                'initial_fee': self.initial_fee,
-                'weekly_fee': self.lease_price / weeks,
-                'total': self.initial_fee + self.lease_price / weeks * weeks
-            }
-        return ans
+        # the lists of products are quoted together, see ProductListSerializer
+        return QuoteService.get_lease_options([self])[self.id]
     
     def get_images(self):
         product_images = self.images.all()        
-        return [ image.image.url for image in product_images ]
+        return [ image.image.url for image in product_images if image.is_uploaded ]
+
+    def get_images_srcset(self):
+        return [ image.get_srcset() for image in self.images.all() if image.image and image.is_uploaded ]
 
 class ProductImage(models.Model):
     id = models.AutoField(primary_key=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', null=False)
-    image = models.ImageField(upload_to='product_images', null=True) # TODO: Make migration for this
+    # public storage: plain urls, the name of the file has the hash of its content
+    image = models.ImageField(upload_to='product_images', storage=get_public_storage, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # resized copies: {format: [{'width': 320, 'height': 240, 'name': 'product_images/variants/...'}]}
+    variants = models.JSONField(default=dict, blank=True)
+    # False while the client uploads the image straight to the storage (ImageService.create_upload)
+    is_uploaded = models.BooleanField(default=True)
 
     def __str__(self) -> str:
         return self.image.url + " " + self.product.name
+
+    def get_srcset(self):
+        """
+        The url of the original image and the variants of each format,
+        the srcset string is ready to use in an <img> or <source> tag
+        """
+        storage = self.image.storage
+        srcset = { 'url': self.image.url, 'variants': {}, 'srcset': {} }
+        for image_format, variants in self.variants.items():
+            srcset['variants'][image_format] = [
+                { 'width': variant['width'], 'height': variant['height'], 'url': storage.url(variant['name']) }
+                for variant in variants
+            ]
+            srcset['srcset'][image_format] = ', '.join(
+                f"{variant['url']} {variant['width']}w" for variant in srcset['variants'][image_format]
+            )
+        return srcset
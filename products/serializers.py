@@ -1,32 +1,50 @@
+import os
 from rest_framework import serializers
 from products.models import Product, Category, ProductImage
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
-from django.db import transaction
-from products.services.product import ProductService
+from django.db import models, transaction
+from products.services.product import ProductService, PRODUCT_SEARCH_FIELDS
+from products.services.image import ImageService
+from products.services.quote import QuoteService
+from products.services.categoryService import CategoryService
 from utils.Serializer_message import SerializerMessage
+from utils.cache import bump_cache_version
+from glik.constants import CATALOG_CACHE_NAMESPACE, PRODUCT_IMAGE_CONTENT_TYPES, PRODUCT_IMAGE_MAX_SIZE, QUOTE_MAX_AMOUNT
 
 # ===================== #
 #  Models Serializers   #
 # ===================== #
 
+class ProductListSerializer(serializers.ListSerializer):
+  """
+  Quotes the lease options of all the products of the list in one pass
+  """
+  def to_representation(self, data):
+    products = list(data.all() if isinstance(data, models.Manager) else data)
+    self.context['lease_options'] = QuoteService.get_lease_options(products)
+    return super().to_representation(products)
+
 class ProductSerializer(serializers.ModelSerializer):
   category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
   description = serializers.CharField(required=True, min_length=3, max_length=500)
   name = serializers.CharField(required=True, min_length=3, max_length=50)
   stock = serializers.IntegerField(required=True, min_value=0)
-  lease_price = serializers.IntegerField(required=True, min_value=0)
-  initial_fee = serializers.IntegerField(required=True, min_value=0)
+  lease_price = serializers.IntegerField(required=True, min_value=0, max_value=QUOTE_MAX_AMOUNT)
+  initial_fee = serializers.IntegerField(required=True, min_value=0, max_value=QUOTE_MAX_AMOUNT)
   cash_price = serializers.IntegerField(required=True, min_value=0)
   brand = serializers.CharField(required=True, min_length=3, max_length=50)
   internal_id = serializers.CharField(required=False, min_length=3, max_length=64)
   created_at = serializers.DateTimeField(required=False)
-  lease_options = serializers.JSONField(required=False)  
+  lease_options = serializers.SerializerMethodField()
   images = serializers.SerializerMethodField()  
+  images_srcset = serializers.SerializerMethodField()
 
   class Meta:
     model = Product
-    fields = ('__all__')
+    exclude = ('search_vector',)
+    read_only_fields = ('leases_count', 'leases_count_7d', 'leases_count_30d')
+    list_serializer_class = ProductListSerializer
   
   # ===================== #
   #  Custom validations   #
@@ -34,6 +52,12 @@ class ProductSerializer(serializers.ModelSerializer):
 
   def get_images(self, obj): return obj.get_images()
 
+  def get_images_srcset(self, obj): return obj.get_images_srcset()
+
+  def get_lease_options(self, obj):
+    lease_options = self.context.get('lease_options', {})
+    return lease_options[obj.id] if obj.id in lease_options else obj.lease_options
+
   def validate_name(self, value):
     if Product.objects.filter(name=value).exists():
       raise serializers.ValidationError(_("Product name already exists"))
@@ -49,8 +73,38 @@ class ProductSerializer(serializers.ModelSerializer):
   def create(self, validated_data):
     validated_data['internal_id'] = slugify(validated_data['name'])
 
-    product = Product.objects.create(**validated_data)
-    return product
+    with transaction.atomic():
+      product = Product.objects.create(**validated_data)
+      ProductService.update_search_vector(Product.objects.filter(id=product.id))
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
+      return product
+
+  def update(self, instance, validated_data):
+    with transaction.atomic():
+      product = super().update(instance, validated_data)
+      # only the changes in the searchable fields modify the search document
+      if any(field in validated_data for field in PRODUCT_SEARCH_FIELDS):
+        ProductService.update_search_vector(Product.objects.filter(id=product.id))
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
+      return product
+
+class ProductImportSerializer(serializers.Serializer):
+  """
+  Row of a bulk import, it only validates the values of the row: the uniqueness
+  and the categories are validated by batch in ProductImportService
+  """
+  internal_id = serializers.CharField(required=False, min_length=3, max_length=64)
+  name = serializers.CharField(required=True, min_length=3, max_length=50)
+  description = serializers.CharField(required=True, min_length=3, max_length=500)
+  # id or name of the category
+  category = serializers.CharField(required=True, max_length=50)
+  brand = serializers.CharField(required=True, min_length=3, max_length=50)
+  stock = serializers.IntegerField(required=True, min_value=0)
+  lease_price = serializers.IntegerField(required=True, min_value=0, max_value=QUOTE_MAX_AMOUNT)
+  initial_fee = serializers.IntegerField(required=True, min_value=0, max_value=QUOTE_MAX_AMOUNT)
+  cash_price = serializers.IntegerField(required=True, min_value=0)
+  extra = serializers.JSONField(required=False, default=dict)
+  is_featured = serializers.BooleanField(required=False, default=False)
 
 class CategorySerializer(serializers.ModelSerializer):
   name = serializers.CharField(required=True, min_length=3, max_length=50)  
@@ -67,6 +121,37 @@ class CategorySerializer(serializers.ModelSerializer):
       raise serializers.ValidationError(_("Category name already exists"))
     return value
 
+  def validate_parent(self, value):
+    if value and self.instance and CategoryService.is_descendant(value, self.instance):
+      raise serializers.ValidationError(_("A category can't be moved inside itself"))
+    return value
+
+  # ================== #
+  # Custom operation   #
+  # ================== #
+
+  def create(self, validated_data):
+    category = super().create(validated_data)
+    CategoryService.invalidate_cache()
+    return category
+
+  def update(self, instance, validated_data):
+    old_parent_id = instance.parent_id
+    with transaction.atomic():
+      category = super().update(instance, validated_data)
+      if category.parent_id != old_parent_id:
+        CategoryService.move_category(category)
+    CategoryService.invalidate_cache()
+    return category
+
+class ProductImageUploadSerializer(serializers.Serializer):
+  """
+  Start of a direct upload of a product image, the file goes straight to the storage
+  """
+  product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+  content_type = serializers.ChoiceField(choices=list(PRODUCT_IMAGE_CONTENT_TYPES))
+  size = serializers.IntegerField(min_value=1, max_value=PRODUCT_IMAGE_MAX_SIZE)
+
 class ProductImageSerializer(SerializerMessage, serializers.ModelSerializer):
   product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
   image = serializers.ImageField(required=True)
@@ -74,6 +159,7 @@ class ProductImageSerializer(SerializerMessage, serializers.ModelSerializer):
   class Meta:
     model = ProductImage
     fields = ('__all__')
+    read_only_fields = ('variants', 'is_uploaded')
 
   # =================== #
   #  Custom operations  #
@@ -84,14 +170,22 @@ class ProductImageSerializer(SerializerMessage, serializers.ModelSerializer):
     image = validated_data['image']
 
     with transaction.atomic():
-      last_product_image = ProductService.get_last_product_image(product) 
-      last_product_image_number = int(last_product_image.split('_')[-1]) if last_product_image else 0
-      image.name = product.internal_id + "_" + str(last_product_image_number + 1)
+      # the storage adds the hash of the content: product_images/<internal_id>-<hash>.<extension>
+      extension = os.path.splitext(image.name)[1].lower()
+      image.name = product.internal_id + extension
       product_image = ProductImage.objects.create(image=image, product=product)
+      ImageService.schedule_variants(product_image.id)
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
       return product_image 
   
   def update(self, instance, validated_data):
     # delete current image and create a new one
-    instance.image.delete()
+    if ProductService.is_image_file_shared(instance):
+      instance.image = None
+      instance.save(update_fields=['image'])
+    else:
+      # the variants are made from the same content, so they aren't shared either
+      ImageService.delete_variants(instance)
+      instance.image.delete()
     return self.create(validated_data)  
   
@@ -1,9 +1,85 @@
+from django.db import transaction
+from django.db.models import F, Q, Value, CharField
+from django.db.models.functions import Concat, Substr, Now
+from rest_framework import status
 from products.models import Category
+from exceptions.custom_exception import CustomException
+from utils.cache import bump_cache_version
+from glik.constants import CATALOG_CACHE_NAMESPACE, CATEGORY_CACHE_NAMESPACE
 
 class CategoryService:
   def delete_category( id: int ):
     """
-    This method is used to delete a category
+    This method is used to delete a category, its children become root categories
     """
-    queryset = Category.objects.get(id=id)
-    Category.delete(queryset)
+    with transaction.atomic():
+      queryset = Category.objects.select_for_update().get(id=id)
+      CategoryService.move_subtree(queryset.path, '/', -queryset.depth - 1, exclude_id=queryset.id)
+      Category.delete(queryset)
+    CategoryService.invalidate_cache()
+
+  def invalidate_cache():
+    bump_cache_version(CATALOG_CACHE_NAMESPACE)
+    bump_cache_version(CATEGORY_CACHE_NAMESPACE)
+
+  # ===================== #
+  #  Materialized path    #
+  # ===================== #
+
+  def get_path(category):
+    parent_path = category.parent.path if category.parent else '/'
+    return f"{parent_path}{category.id}/"
+
+  def move_category(category):
+    """
+    This method is used to update the path of a category and its subtree after its parent changes
+    """
+    old_path, old_depth = category.path, category.depth
+    category.path = CategoryService.get_path(category)
+    category.depth = category.path.count('/') - 2
+    CategoryService.move_subtree(old_path, category.path, category.depth - old_depth)
+
+  def move_subtree(old_path, new_path, depth_delta, exclude_id=None):
+    """
+    Replaces the prefix old_path of the paths of a subtree with new_path in one update.
+    The update doesn't set auto_now, updated_at is the version of the ETags of the categories
+    """
+    queryset = Category.objects.filter(path__startswith=old_path)
+    if exclude_id is not None:
+      queryset = queryset.exclude(id=exclude_id)
+    queryset.update(
+      path=Concat(Value(new_path), Substr('path', len(old_path) + 1), output_field=CharField()),
+      depth=F('depth') + depth_delta,
+      updated_at=Now(),
+    )
+
+  def is_descendant(category, ancestor):
+    return category.path.startswith(ancestor.path)
+
+  def get_subtree_filter(category_id, field='category'):
+    """
+    Filter of the rows of a category or any of its descendants, example:
+    Product.objects.filter(CategoryService.get_subtree_filter(1))
+    """
+    try:
+      category_id = int(category_id)
+    except (TypeError, ValueError):
+      raise CustomException("category must be a number", status.HTTP_400_BAD_REQUEST)
+
+    path = Category.objects.filter(id=category_id).values_list('path', flat=True).first()
+    if path is None:
+      return Q(pk__in=[])
+    return Q(**{ f"{field}__path__startswith": path })
+
+  def get_tree():
+    """
+    This method is used to get all the categories as a tree, in one query
+    """
+    nodes = {}
+    roots = []
+    for category in Category.objects.order_by('depth', 'name').values('id', 'name', 'parent_id', 'path', 'depth'):
+      node = { **category, 'children': [] }
+      nodes[category['id']] = node
+      parent = nodes.get(category['parent_id'])
+      (parent['children'] if parent else roots).append(node)
+    return roots
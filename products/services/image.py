@@ -0,0 +1,162 @@
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from products.models import ProductImage
+from exceptions.custom_exception import CustomException
+from utils.cache import bump_cache_version
+from utils.storages import has_file_signature
+from glik.constants import PRODUCT_IMAGE_WIDTHS, PRODUCT_IMAGE_FORMATS, PRODUCT_IMAGE_WORKERS, CATALOG_CACHE_NAMESPACE, \
+    PRODUCT_IMAGE_CONTENT_TYPES, PRODUCT_IMAGE_MAX_SIZE, DIRECT_UPLOAD_SECONDS, DIRECT_UPLOAD_PENDING_SECONDS
+
+# Pillow releases the GIL while it resizes and encodes, so threads are enough
+executor = ThreadPoolExecutor(max_workers=PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-images')
+logger = logging.getLogger(__name__)
+
+class ImageService:
+
+  def get_variant_widths(original_width):
+    """
+    The images are never enlarged, a small image only has a variant with its own width
+    """
+    widths = [ width for width in PRODUCT_IMAGE_WIDTHS if width < original_width ]
+    return widths or [original_width]
+
+  def create_variants(image_file):
+    """
+    Returns the resized copies of an image as (format, width, height, content) tuples
+    """
+    with Image.open(image_file) as original:
+      # the jpeg decoder can scale down while it decodes (by 1/2, 1/4 or 1/8), it is much faster.
+      # Both sides are kept over the largest width because the exif orientation can swap them
+      largest_width = max(PRODUCT_IMAGE_WIDTHS)
+      original.draft('RGB', (largest_width, largest_width))
+      # the photos of the phones are rotated with the exif orientation
+      original = ImageOps.exif_transpose(original)
+      has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+      original = original.convert('RGBA' if has_alpha else 'RGB')
+
+      variants = []
+      for width in ImageService.get_variant_widths(original.width):
+        height = max(round(original.height * width / original.width), 1)
+        resized = original.resize((width, height), Image.LANCZOS, reducing_gap=3.0) if width != original.width else original
+
+        for image_format, (pillow_format, quality) in PRODUCT_IMAGE_FORMATS.items():
+          image = resized
+          if pillow_format == 'JPEG' and has_alpha:
+            # jpeg has no transparency, it is filled with white
+            image = Image.new('RGB', resized.size, (255, 255, 255))
+            image.paste(resized, mask=resized.getchannel('A'))
+          content = io.BytesIO()
+          image.save(content, pillow_format, quality=quality, optimize=True)
+          variants.append((image_format, width, height, content.getvalue()))
+      return variants
+
+  def generate_variants(product_image_id):
+    """
+    Creates and stores the variants of a product image, the catalog responses
+    are invalidated so the products include them
+    """
+    product_image = ProductImage.objects.get(id=product_image_id)
+    storage = product_image.image.storage
+    stem = os.path.splitext(os.path.basename(product_image.image.name))[0]
+
+    with product_image.image.open('rb') as image_file:
+      variants = ImageService.create_variants(image_file)
+
+    stored_variants = {}
+    for image_format, width, height, content in variants:
+      name = storage.save(f"product_images/variants/{stem}-{width}w.{image_format}", ContentFile(content))
+      stored_variants.setdefault(image_format, []).append({ 'width': width, 'height': height, 'name': name })
+
+    ProductImage.objects.filter(id=product_image_id).update(variants=stored_variants)
+    bump_cache_version(CATALOG_CACHE_NAMESPACE)
+    return stored_variants
+
+  def generate_variants_in_background(product_image_id):
+    def generate():
+      try:
+        ImageService.generate_variants(product_image_id)
+      except Exception:
+        # the images without variants can be processed again with generate_product_image_variants
+        logger.exception("The variants of the product image %s were not created", product_image_id)
+      finally:
+        close_old_connections()
+    executor.submit(generate)
+
+  def schedule_variants(product_image_id):
+    """
+    The variants are created in a thread of the pool once the image is committed,
+    the request doesn't wait for them
+    """
+    transaction.on_commit(lambda: ImageService.generate_variants_in_background(product_image_id))
+
+  def delete_variants(product_image):
+    storage = product_image.image.storage
+    for variants in product_image.variants.values():
+      for variant in variants:
+        storage.delete(variant['name'])
+
+  # ================ #
+  #  Direct uploads  #
+  # ================ #
+
+  def create_upload(product, content_type, size):
+    """
+    This method is used to create a pending image and the session where the client uploads
+    it straight to the storage. The content isn't known yet, so the name has a random part
+    instead of its hash: product_images/<internal_id>-<16 hex characters>.<extension>
+    """
+    storage = ProductImage._meta.get_field('image').storage
+    name = f"product_images/{product.internal_id}-{uuid.uuid4().hex[:16]}{PRODUCT_IMAGE_CONTENT_TYPES[content_type]}"
+    product_image = ProductImage.objects.create(product=product, image=name, is_uploaded=False)
+    return {
+      'id': product_image.id,
+      'upload': storage.get_upload_session(name, content_type, size),
+      'expires_at': timezone.now() + timedelta(seconds=DIRECT_UPLOAD_SECONDS),
+    }
+
+  def finalize_upload(product_image):
+    """
+    This method is used to confirm the uploaded image, then it is part of
+    the product and its variants are created
+    """
+    if product_image.is_uploaded:
+      return product_image
+    storage = product_image.image.storage
+    size = storage.finalize_upload(product_image.image.name)
+    if size is None:
+      raise CustomException(message="The image wasn't uploaded", status_code=409)
+    if size > PRODUCT_IMAGE_MAX_SIZE:
+      storage.delete(product_image.image.name)
+      product_image.delete()
+      raise CustomException(message=f"The image is larger than {PRODUCT_IMAGE_MAX_SIZE} bytes", status_code=400)
+    if not has_file_signature(storage, product_image.image.name):
+      storage.delete(product_image.image.name)
+      product_image.delete()
+      raise CustomException(message="The image isn't of its content type", status_code=400)
+
+    with transaction.atomic():
+      product_image.is_uploaded = True
+      product_image.save(update_fields=['is_uploaded'])
+      ImageService.schedule_variants(product_image.id)
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
+    return product_image
+
+  def delete_expired_uploads():
+    """
+    Deletes the pending images that weren't finalized in time and their files, it returns how many
+    """
+    expired = ProductImage.objects.filter(is_uploaded=False, created_at__lte=timezone.now() - timedelta(seconds=DIRECT_UPLOAD_PENDING_SECONDS))
+    deleted = 0
+    for product_image in expired.iterator():
+      product_image.image.delete(save=False)
+      product_image.delete()
+      deleted += 1
+    return deleted
@@ -1,6 +1,254 @@
+import json
+import math
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank, TrigramWordSimilarity
+from datetime import timedelta
+from django.db import connection, models, transaction, OperationalError
+from psycopg.errors import QueryCanceled
+from django.db.models import F, Q, Value, Count, OuterRef, Subquery, Func
+from django.db.models.functions import Greatest, Coalesce, Cast
+from django.db.models.fields.json import KT
+from django.db.models.lookups import Exact
+from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
+from products.models import Product, ProductImage
+from leases.models import Lease
+from glik.constants import SUGGEST_SIMILARITY_THRESHOLD, LEASES_STATUS_NOT_COUNTED, LEASES_COUNT_WINDOWS, \
+  PRODUCT_PRICE_BUCKETS, PRODUCT_FACETS_TIMEOUT_MS, PRODUCT_EXTRA_PROMOTED_KEYS, PRODUCT_EXTRA_FILTERS_MAX, \
+  PRODUCT_EXTRA_FILTER_VALUES_MAX
+from exceptions.custom_exception import CustomException
+
+# Fields of the product that are part of the search document
+PRODUCT_SEARCH_FIELDS = ('name', 'brand', 'internal_id', 'description')
+
 class ProductService:
 
-  def get_last_product_image(product):
-    queryset = product.images.all().order_by('-created_at').first()
-    last_product_image = queryset.image.name if queryset else None
-    return last_product_image
+  def is_image_file_shared(product_image):
+    """
+    The images are stored by content, so the same file can be used by several products
+    """
+    return ProductImage.objects.filter(image=product_image.image.name).exclude(id=product_image.id).exists()
+
+  def get_search_document():
+    """
+    Weighted search document of a product, the accents are removed so
+    "camión" and "camion" match the same products
+    """
+    return SearchVector(Unaccent(F('name')), weight='A', config='spanish') \
+      + SearchVector(Unaccent(F('brand')), weight='B', config='spanish') \
+      + SearchVector(Unaccent(F('internal_id')), weight='B', config='spanish') \
+      + SearchVector(Unaccent(F('description')), weight='C', config='spanish')
+
+  def update_search_vector(queryset):
+    """
+    This method is used to store the search document of the products in the queryset
+    """
+    return queryset.update(search_vector=ProductService.get_search_document())
+
+  def search(queryset, search_param):
+    """
+    This method is used to filter the queryset with the stored search document,
+    the products are annotated with their rank as search_rank
+    """
+    query = SearchQuery(Unaccent(Value(search_param)), config='spanish')
+    return queryset.annotate(search_rank=SearchRank(F('search_vector'), query)) \
+      .filter(search_vector=query)
+
+  def get_facets(queryset):
+    """
+    Counts of the products of the queryset by brand, category and price bucket in one
+    grouped query (GROUPING SETS). It returns None when it doesn't finish in PRODUCT_FACETS_TIMEOUT_MS
+    """
+    facets_queryset = queryset.order_by().values(
+      facet_brand=F('brand'),
+      facet_category_id=F('category_id'),
+      facet_category_name=F('category__name'),
+      facet_price_bucket=Func(
+        F('cash_price'), Cast(Value(PRODUCT_PRICE_BUCKETS), ArrayField(models.BigIntegerField())),
+        function='width_bucket', output_field=models.IntegerField()
+      ),
+    )
+    sql, params = facets_queryset.query.sql_with_params()
+    facets_sql = f"""
+      SELECT facet_brand, facet_category_id, facet_category_name, facet_price_bucket,
+        GROUPING(facet_brand), GROUPING(facet_category_id), COUNT(*)
+      FROM ({sql}) AS facets
+      GROUP BY GROUPING SETS ((facet_brand), (facet_category_id, facet_category_name), (facet_price_bucket))
+      ORDER BY COUNT(*) DESC, 1, 3, 4
+    """
+
+    try:
+      with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(PRODUCT_FACETS_TIMEOUT_MS)])
+        cursor.execute(facets_sql, params)
+        rows = cursor.fetchall()
+    except OperationalError as error:
+      # canceled by the statement timeout, the page doesn't wait for the facets
+      if isinstance(error.__cause__, QueryCanceled):
+        return None
+      raise
+
+    facets = { 'brand': [], 'category': [], 'price': [] }
+    for brand, category_id, category_name, bucket, brand_grouping, category_grouping, count in rows:
+      if not brand_grouping:
+        facets['brand'].append({ 'value': brand, 'count': count })
+      elif not category_grouping:
+        facets['category'].append({ 'id': category_id, 'name': category_name, 'count': count })
+      else:
+        facets['price'].append({ **ProductService.get_price_bucket_limits(bucket), 'count': count })
+    facets['price'].sort(key=lambda bucket: bucket['min'])
+    return facets
+
+  def get_price_bucket_limits(bucket):
+    """
+    Limits of a bucket of width_bucket: 1 is [PRODUCT_PRICE_BUCKETS[0], PRODUCT_PRICE_BUCKETS[1])
+    """
+    bucket = max(bucket, 1)
+    maximum = PRODUCT_PRICE_BUCKETS[bucket] if bucket < len(PRODUCT_PRICE_BUCKETS) else None
+    return { 'min': PRODUCT_PRICE_BUCKETS[bucket - 1], 'max': maximum }
+
+  def suggest(search_param, limit):
+    """
+    This method is used to get the products whose name or brand resemble the
+    search param, the word similarity allows typos and incomplete words
+    """
+    queryset = Product.objects.filter(
+      Q(name__trigram_word_similar=search_param) | Q(brand__trigram_word_similar=search_param)
+    ).annotate(
+      similarity=Greatest(
+        TrigramWordSimilarity(search_param, 'name'),
+        TrigramWordSimilarity(search_param, 'brand'),
+      )
+    ).order_by('-similarity', 'name').values('internal_id', 'name')[:limit]
+
+    # the threshold is only changed for this transaction
+    with transaction.atomic(), connection.cursor() as cursor:
+      cursor.execute(
+        "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+        [str(SUGGEST_SIMILARITY_THRESHOLD)]
+      )
+      return list(queryset)
+
+  def get_extra_value(value):
+    """
+    The query params are text, 150 or true are also looked for as json: {"engine_size": 150}.
+    NaN, Infinity and the numbers that overflow (1e400) are not valid jsonb, they are only text
+    """
+    try:
+      parsed = json.loads(value, parse_constant=ProductService.reject_json_constant)
+    except ValueError:
+      return [value]
+    if isinstance(parsed, float) and not math.isfinite(parsed):
+      return [value]
+    return [value] if parsed == value or isinstance(parsed, (dict, list)) else [value, parsed]
+
+  def reject_json_constant(constant):
+    raise ValueError(f"{constant} is not valid json")
+
+  def merge_extra_document(document, other):
+    for key, value in other.items():
+      if isinstance(value, dict) and isinstance(document.get(key), dict):
+        ProductService.merge_extra_document(document[key], value)
+      else:
+        document[key] = value
+
+  def get_extra_filter(params):
+    """
+    This method is used to filter by the attributes of Product.extra with the params
+    extra__<key>=value, nested keys are separated by __ (extra__engine__size=150).
+    The filters are containments (extra @> '{"color": "red"}') that use the GIN index
+    of extra, the promoted keys compare their text value with their own b-tree index.
+    The values of a repeated param are alternatives: extra__color=red&extra__color=blue
+    """
+    keys = [ key for key in params if key.startswith('extra__') and len(key) > len('extra__') ]
+    if len(keys) > PRODUCT_EXTRA_FILTERS_MAX:
+      raise CustomException(f"Only {PRODUCT_EXTRA_FILTERS_MAX} extra filters are allowed", 400)
+    if sum(len(params.getlist(key)) for key in keys) > PRODUCT_EXTRA_FILTER_VALUES_MAX:
+      raise CustomException(f"Only {PRODUCT_EXTRA_FILTER_VALUES_MAX} extra filter values are allowed", 400)
+
+    contained = {}
+    queryset = Q()
+    for key in keys:
+      path = key[len('extra__'):].split('__')
+      values = params.getlist(key)
+      if len(path) == 1 and path[0] in PRODUCT_EXTRA_PROMOTED_KEYS:
+        alternatives = [ Q(Exact(KT(key), value)) for value in values ]
+      else:
+        documents = []
+        for value in values:
+          for candidate in ProductService.get_extra_value(value):
+            document = candidate
+            for name in reversed(path):
+              document = { name: document }
+            documents.append(document)
+        # a single document (one value that is only text) is merged with the others,
+        # postgres estimates one containment of all the attributes better than several
+        # of them. A number or a boolean is also looked for as text, its two documents
+        # stay an alternative of two containments
+        if len(documents) == 1:
+          ProductService.merge_extra_document(contained, documents[0])
+          continue
+        alternatives = [ Q(extra__contains=document) for document in documents ]
+
+      alternative_filter = Q()
+      for alternative in alternatives:
+        alternative_filter |= alternative
+      queryset &= alternative_filter
+
+    if contained:
+      queryset &= Q(extra__contains=contained)
+    return queryset
+
+  # ================== #
+  #  Leases counters   #
+  # ================== #
+
+  def update_leases_counters(product_id, lease_created_at, delta):
+    """
+    This method is used to add delta to the leases counters of a product,
+    the rolling counters only change if the lease was created inside their window
+    """
+    now = timezone.now()
+    counters = ['leases_count'] + [
+      field for field, days in LEASES_COUNT_WINDOWS.items()
+      if lease_created_at >= now - timedelta(days=days)
+    ]
+    changes = {
+      field: Greatest(F(field) + delta, 0, output_field=models.PositiveIntegerField())
+      for field in counters
+    }
+    Product.objects.filter(id=product_id).update(**changes)
+
+  def get_real_leases_counters():
+    """
+    This method returns the expressions that count the leases of each product in the lease table
+    """
+    now = timezone.now()
+    leases = Lease.objects.filter(product=OuterRef('pk')).exclude(status__in=LEASES_STATUS_NOT_COUNTED)
+
+    def count(queryset):
+      counts = queryset.order_by().values('product').annotate(count=Count('id')).values('count')
+      return Coalesce(Subquery(counts), 0)
+
+    counters = { 'leases_count': count(leases) }
+    for field, days in LEASES_COUNT_WINDOWS.items():
+      counters[field] = count(leases.filter(created_at__gte=now - timedelta(days=days)))
+    return counters
+
+  def rebuild_leases_counters(queryset):
+    """
+    This method is used to recompute the leases counters of the products in one update
+    """
+    return queryset.update(**ProductService.get_real_leases_counters())
+
+  def get_leases_counters_mismatches(queryset):
+    """
+    This method returns the products whose stored counters differ from the lease table
+    """
+    counters = ProductService.get_real_leases_counters()
+    real_counters = { 'real_' + field: expression for field, expression in counters.items() }
+    mismatch = Q()
+    for field in counters:
+      mismatch |= ~Q(**{ field: F('real_' + field) })
+    return queryset.annotate(**real_counters).filter(mismatch) \
+      .values('id', 'internal_id', *counters.keys(), *real_counters.keys())
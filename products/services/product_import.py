@@ -0,0 +1,222 @@
+import codecs
+import csv
+import json
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import serializers
+from products.models import Category, Product
+from products.serializers import ProductImportSerializer
+from products.services.product import ProductService
+from utils.cache import bump_cache_version
+from glik.constants import PRODUCT_IMPORT_BATCH_SIZE, CATALOG_CACHE_NAMESPACE
+
+# Columns written by the import, in the order of copy_products
+PRODUCT_COPY_COLUMNS = (
+  'internal_id', 'name', 'description', 'category_id', 'brand', 'stock', 'lease_price', 'initial_fee',
+  'cash_price', 'extra', 'is_featured', 'created_at', 'updated_at', 'leases_count', 'leases_count_7d', 'leases_count_30d',
+)
+# An upsert keeps the creation date and the leases counters of the product
+PRODUCT_UPSERT_COLUMNS = (
+  'name', 'description', 'category_id', 'brand', 'stock', 'lease_price', 'initial_fee',
+  'cash_price', 'extra', 'is_featured', 'updated_at',
+)
+PRODUCT_IMPORT_FORMATS = ('csv', 'jsonl')
+
+class ProductImportResult:
+  """
+  Summary of an import, the errors are by row number (the line of the file)
+  """
+  def __init__(self):
+    self.created = 0
+    self.updated = 0
+    self.errors = []
+
+  def add_error(self, row_number, errors):
+    self.errors.append({ 'row': row_number, 'errors': errors })
+
+  def get_structure(self):
+    return {
+      'created': self.created,
+      'updated': self.updated,
+      'failed': len(self.errors),
+      'errors': sorted(self.errors, key=lambda error: error['row']),
+    }
+
+class ProductImportService:
+
+  def get_file_format(file_name, file_format=None):
+    file_format = (file_format or file_name.rsplit('.', 1)[-1]).lower()
+    if file_format == 'ndjson':
+      file_format = 'jsonl'
+    return file_format if file_format in PRODUCT_IMPORT_FORMATS else None
+
+  def read_rows(file, file_format):
+    """
+    Yields (row number, row) reading the file line by line, the rows that
+    can't be parsed are yielded as (row number, None)
+    """
+    lines = codecs.iterdecode(file, 'utf-8-sig')
+    if file_format == 'csv':
+      reader = csv.DictReader(lines)
+      for row in reader:
+        # the empty cells are missing values, the json is written as text
+        row = { key: value for key, value in row.items() if key and value not in ('', None) }
+        if 'extra' in row:
+          try:
+            row['extra'] = json.loads(row['extra'])
+          except ValueError:
+            row['extra'] = None
+        yield reader.line_num, row
+      return
+
+    for line_number, line in enumerate(lines, start=1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError:
+        row = None
+      yield line_number, row if isinstance(row, dict) else None
+
+  def import_products(file, file_format, upsert=False, batch_size=PRODUCT_IMPORT_BATCH_SIZE):
+    """
+    This method is used to import the products of a csv or jsonl file by batches,
+    the rows with errors are reported and skipped, the others are saved
+    """
+    result = ProductImportResult()
+    # one serializer validates all the rows, creating its fields for each row is the slowest part
+    serializer = ProductImportSerializer()
+    batch = []
+    for row_number, row in ProductImportService.read_rows(file, file_format):
+      if row is None:
+        result.add_error(row_number, { 'row': ['Invalid row'] })
+        continue
+      try:
+        data = serializer.run_validation(row)
+      except serializers.ValidationError as error:
+        result.add_error(row_number, error.detail)
+        continue
+      batch.append((row_number, data))
+      if len(batch) >= batch_size:
+        ProductImportService.import_batch(batch, upsert, result)
+        batch = []
+    if batch:
+      ProductImportService.import_batch(batch, upsert, result)
+
+    if result.created or result.updated:
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
+    return result
+
+  def import_batch(batch, upsert, result):
+    """
+    Validates the uniqueness and the categories of a batch with one query each
+    and saves the valid rows together
+    """
+    for _, data in batch:
+      data['internal_id'] = data.get('internal_id') or slugify(data['name'])
+
+    categories = ProductImportService.get_categories([ data['category'] for _, data in batch ])
+    internal_ids = [ data['internal_id'] for _, data in batch ]
+    names = [ data['name'] for _, data in batch ]
+    existing = {
+      internal_id: name
+      for internal_id, name in Product.objects.filter(Q(internal_id__in=internal_ids) | Q(name__in=names)).values_list('internal_id', 'name')
+    }
+    existing_names = { name: internal_id for internal_id, name in existing.items() }
+
+    products = {}
+    seen_names = set()
+    for row_number, data in batch:
+      internal_id, name = data['internal_id'], data['name']
+      errors = {}
+      if data['category'] not in categories:
+        errors['category'] = ['Category not found']
+      if internal_id in products:
+        errors['internal_id'] = ['Repeated in the file']
+      elif internal_id in existing and not upsert:
+        errors['internal_id'] = ['Product already exists']
+      if name in seen_names:
+        errors['name'] = ['Repeated in the file']
+      elif name in existing_names and existing_names[name] != internal_id:
+        errors['name'] = ['Product name already exists']
+      if errors:
+        result.add_error(row_number, errors)
+        continue
+
+      seen_names.add(name)
+      products[internal_id] = (row_number, Product(**{ **data, 'category': categories[data['category']] }))
+
+    failed = ProductImportService.save_products(list(products.values()), upsert, result)
+    for internal_id in products:
+      if internal_id in failed:
+        continue
+      if internal_id in existing:
+        result.updated += 1
+      else:
+        result.created += 1
+
+  def save_products(rows, upsert, result):
+    """
+    Saves the rows with one COPY, it returns the internal ids of the rows that couldn't be saved
+    """
+    if not rows:
+      return set()
+    try:
+      with transaction.atomic():
+        ProductImportService.copy_products([ product for _, product in rows ], upsert)
+        ProductService.update_search_vector(Product.objects.filter(internal_id__in=[ product.internal_id for _, product in rows ]))
+      return set()
+    except IntegrityError:
+      pass
+
+    # a conflict with a product saved after the validation of the batch,
+    # the rows are saved one by one to find it
+    if len(rows) == 1:
+      row_number, product = rows[0]
+      result.add_error(row_number, { 'row': ['The product conflicts with an existing one'] })
+      return { product.internal_id }
+    failed = set()
+    for row in rows:
+      failed |= ProductImportService.save_products([row], upsert, result)
+    return failed
+
+  def copy_products(products, upsert):
+    """
+    The products are copied (COPY, no sql literals) to a temporary table and inserted from it,
+    with ON CONFLICT (internal_id) DO UPDATE when upsert
+    """
+    quote_name = connection.ops.quote_name
+    now = timezone.now()
+    table = quote_name(Product._meta.db_table)
+    columns = ', '.join(quote_name(column) for column in PRODUCT_COPY_COLUMNS)
+    with connection.cursor() as cursor:
+      cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS product_import ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA")
+      cursor.execute("TRUNCATE product_import")
+      with cursor.cursor.copy(f"COPY product_import ({columns}) FROM STDIN") as copy:
+        for product in products:
+          copy.write_row((
+            product.internal_id, product.name, product.description, product.category_id, product.brand,
+            product.stock, product.lease_price, product.initial_fee, product.cash_price,
+            json.dumps(product.extra), product.is_featured, now, now, 0, 0, 0,
+          ))
+
+      conflict = ''
+      if upsert:
+        updates = ', '.join(f"{quote_name(column)} = EXCLUDED.{quote_name(column)}" for column in PRODUCT_UPSERT_COLUMNS)
+        conflict = f"ON CONFLICT ({quote_name('internal_id')}) DO UPDATE SET {updates}"
+      cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM product_import {conflict}")
+
+  def get_categories(references):
+    """
+    Categories of the references (id or name) with one query, by reference
+    """
+    references = set(references)
+    # isdigit accepts digits that int doesn't parse (²)
+    ids = [ int(reference) for reference in references if reference.isdecimal() and reference.isascii() ]
+    categories = {}
+    for category in Category.objects.filter(Q(id__in=ids) | Q(name__in=references)).only('id', 'name'):
+      categories[category.name] = category
+      categories[str(category.id)] = category
+    return categories
@@ -0,0 +1,136 @@
+import numpy as np
+from exceptions.custom_exception import CustomException
+from glik.constants import LEASE_WEEKS_PERIODS, LEASE_MAX_WEEKLY_FEE_INCOME_PERCENT, QUOTE_MAX_AMOUNT
+
+class Quote:
+  """
+  Result of a quote of N products, M periods (weeks) and K weekly incomes,
+  all the money is in integer units of the prices:
+  - initial_fee: (N,)
+  - weekly_fee, last_weekly_fee, total: (N, M), the last fee has the remainder of the division
+  - affordable: (N, M, K), the last (largest) weekly fee fits in the weekly income
+  """
+  def __init__(self, periods, incomes, initial_fee, weekly_fee, last_weekly_fee, total, affordable):
+    self.periods = periods
+    self.incomes = incomes
+    self.initial_fee = initial_fee
+    self.weekly_fee = weekly_fee
+    self.last_weekly_fee = last_weekly_fee
+    self.total = total
+    self.affordable = affordable
+
+class QuoteService:
+
+  def is_affordable(weekly_fee, incomes):
+    """
+    The weekly fee can take up to LEASE_MAX_WEEKLY_FEE_INCOME_PERCENT of the weekly income,
+    compared in integers: weekly_fee * 100 <= income * percent
+    """
+    return weekly_fee[..., None] * 100 <= incomes * LEASE_MAX_WEEKLY_FEE_INCOME_PERCENT
+
+  def quote(lease_prices, initial_fees, periods=LEASE_WEEKS_PERIODS, incomes=()):
+    """
+    Quotes all the products for all the periods and incomes in one vectorized pass.
+    The weekly fee is rounded down to the unit and the last one carries the remainder,
+    so the fees add up to the lease price and the total is initial_fee + lease_price
+    """
+    lease_prices = np.asarray(lease_prices, dtype=np.int64)
+    initial_fees = np.asarray(initial_fees, dtype=np.int64)
+    periods = np.asarray(periods, dtype=np.int64)
+    incomes = np.asarray(incomes, dtype=np.int64)
+
+    # lease_price / weeks without floats, (N, 1) and (1, M) -> (N, M)
+    weekly_fee, remainder = np.divmod(lease_prices[:, None], periods[None, :])
+    last_weekly_fee = weekly_fee + remainder
+    total = np.broadcast_to((initial_fees + lease_prices)[:, None], weekly_fee.shape)
+    affordable = QuoteService.is_affordable(last_weekly_fee, incomes)
+    return Quote(periods, incomes, initial_fees, weekly_fee, last_weekly_fee, total, affordable)
+
+  def get_lease_options(products):
+    """
+    Lease options of each product, by id: {id: {weeks: {initial_fee, weekly_fee, last_weekly_fee, total}}}
+    """
+    products = list(products)
+    if not products:
+      return {}
+    QuoteService.validate_amounts([ amount for product in products for amount in (product.lease_price, product.initial_fee) ])
+    quote = QuoteService.quote(
+      [ product.lease_price for product in products ],
+      [ product.initial_fee for product in products ],
+    )
+    periods = quote.periods.tolist()
+    initial_fees = quote.initial_fee.tolist()
+    weekly_fees = quote.weekly_fee.tolist()
+    last_weekly_fees = quote.last_weekly_fee.tolist()
+    totals = quote.total.tolist()
+    return {
+      product.id: {
+        weeks: { 'initial_fee': initial_fee, 'weekly_fee': weekly_fee, 'last_weekly_fee': last_weekly_fee, 'total': total }
+        for weeks, weekly_fee, last_weekly_fee, total in zip(periods, weekly_fee_row, last_weekly_fee_row, total_row)
+      }
+      for product, initial_fee, weekly_fee_row, last_weekly_fee_row, total_row
+      in zip(products, initial_fees, weekly_fees, last_weekly_fees, totals)
+    }
+
+  def validate_amounts(amounts):
+    """
+    numpy doesn't check the overflows of int64 (and a value out of range raises
+    OverflowError), the amounts of a quote are limited to QUOTE_MAX_AMOUNT
+    """
+    if any(amount > QUOTE_MAX_AMOUNT for amount in amounts):
+      raise CustomException(f"The prices and incomes of a quote can't be larger than {QUOTE_MAX_AMOUNT}", 400)
+
+  def get_quote_structure(products, periods, incomes):
+    """
+    Quote of each product and of the basket (all the products leased together)
+    for the api/product/quote endpoint, products are dicts with the prices
+    """
+    QuoteService.validate_amounts([ *incomes, *(product[key] for product in products for key in ('lease_price', 'initial_fee')) ])
+    quote = QuoteService.quote(
+      [ product['lease_price'] for product in products ],
+      [ product['initial_fee'] for product in products ],
+      periods, incomes,
+    )
+    basket_initial_fee = int(quote.initial_fee.sum())
+    basket_weekly_fee = quote.weekly_fee.sum(axis=0)
+    basket_last_weekly_fee = quote.last_weekly_fee.sum(axis=0)
+    basket_total = quote.total.sum(axis=0)
+    basket_affordable = QuoteService.is_affordable(basket_last_weekly_fee, quote.incomes)
+
+    def get_options(initial_fee, weekly_fees, last_weekly_fees, totals, affordable):
+      return [
+        {
+          'weeks': weeks,
+          'initial_fee': initial_fee,
+          'weekly_fee': weekly_fee,
+          'last_weekly_fee': last_weekly_fee,
+          'total': total,
+          'affordable': row_affordable,
+        }
+        for weeks, weekly_fee, last_weekly_fee, total, row_affordable
+        in zip(quote.periods.tolist(), weekly_fees, last_weekly_fees, totals, affordable)
+      ]
+
+    initial_fees = quote.initial_fee.tolist()
+    weekly_fees = quote.weekly_fee.tolist()
+    last_weekly_fees = quote.last_weekly_fee.tolist()
+    totals = quote.total.tolist()
+    affordable = quote.affordable.tolist()
+    return {
+      'periods': quote.periods.tolist(),
+      'incomes': quote.incomes.tolist(),
+      'products': [
+        {
+          'internal_id': product['internal_id'],
+          'name': product['name'],
+          'options': get_options(initial_fees[row], weekly_fees[row], last_weekly_fees[row], totals[row], affordable[row]),
+        }
+        for row, product in enumerate(products)
+      ],
+      'basket': {
+        'options': get_options(
+          basket_initial_fee, basket_weekly_fee.tolist(), basket_last_weekly_fee.tolist(),
+          basket_total.tolist(), basket_affordable.tolist(),
+        ),
+      },
+    }
@@ -1,3 +1,526 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from unittest import mock
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from products.models import Category, Product, ProductImage
+from products.serializers import ProductSerializer, CategorySerializer
+from products.services.categoryService import CategoryService
+from products.services.product import ProductService
+from users.models import User
+from utils.storages import get_content_addressed_name, FileSystemDirectUploadStorage
+from utils.cache import get_or_build
+from products.services.image import ImageService
+from products.services.quote import QuoteService
+from exceptions.custom_exception import CustomException
 
-# Create your tests here.
+# the responses of the catalog are cached, each test class starts with an empty cache
+local_memory_cache = override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+
+@local_memory_cache
+class TestProductSearch(TestCase):
+  product_data = {
+    "name": "Camión eléctrico",
+    "description": "Camión de carga para reparto urbano",
+    "brand": "Empire",
+    "stock": 1,
+    "lease_price": 1200,
+    "initial_fee": 100,
+    "cash_price": 1000,
+    "extra": {},
+  }
+
+  def setUp(self):
+    cache.clear()
+    category = Category.objects.create(name="Camiones")
+    serializer = ProductSerializer(data={**self.product_data, "category": category.id})
+    serializer.is_valid(raise_exception=True)
+    self.product = serializer.save()
+
+  def test_search_ignores_accents(self):
+    client = APIClient()
+    response = client.get("/api/product/all", {"search": "camion electrico"})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data["data"]["total_elements"], 1)
+
+  def test_search_document_follows_updates(self):
+    serializer = ProductSerializer(self.product, data={"brand": "Yamaha"}, partial=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+    client = APIClient()
+    response = client.get("/api/product/all", {"search": "yamaha"})
+    self.assertEqual(response.data["data"]["total_elements"], 1)
+    response = client.get("/api/product/all", {"search": "empire"})
+    self.assertEqual(response.data["data"]["total_elements"], 0)
+
+@local_memory_cache
+class TestProductSuggest(TestCase):
+  def setUp(self):
+    cache.clear()
+    category = Category.objects.create(name="Motos")
+    for name, brand in [("Yamaha YBR 125", "Yamaha"), ("Bera SBR", "Bera"), ("Empire Horse", "Empire")]:
+      serializer = ProductSerializer(data={
+        "name": name, "description": "Moto de trabajo", "brand": brand, "category": category.id,
+        "stock": 1, "lease_price": 1200, "initial_fee": 100, "cash_price": 1000, "extra": {},
+      })
+      serializer.is_valid(raise_exception=True)
+      serializer.save()
+
+  def test_suggest_tolerates_typos(self):
+    client = APIClient()
+    response = client.get("/api/product/suggest", {"search": "yamaja"})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data["data"][0], {"internal_id": "yamaha-ybr-125", "name": "Yamaha YBR 125"})
+    self.assertIn("max-age", response["Cache-Control"])
+
+  def test_suggest_ignores_short_searches(self):
+    client = APIClient()
+    response = client.get("/api/product/suggest", {"search": "y"})
+    self.assertEqual(response.data["data"], [])
+
+@local_memory_cache
+class TestProductCursorPagination(TestCase):
+  def setUp(self):
+    cache.clear()
+    category = Category.objects.create(name="Motos")
+    for index in range(7):
+      Product.objects.create(
+        internal_id=f"moto-{index}", name=f"Moto {index}", description="Moto", category=category,
+        stock=1, lease_price=1200, initial_fee=100, cash_price=1000 + index % 3, brand="Bera", extra={}
+      )
+
+  def get_page(self, client, params):
+    response = client.get("/api/product/all", {"page_size": 3, "ordering": "cash_price", **params})
+    self.assertEqual(response.status_code, 200)
+    return response.data["data"]
+
+  def test_cursor_pages_cover_all_products_once(self):
+    client = APIClient()
+    page = self.get_page(client, {"cursor": ""})
+    self.assertNotIn("total_elements", page)
+    self.assertIsNone(page["previous_cursor"])
+
+    seen = [product["id"] for product in page["results"]]
+    pages = [seen[:]]
+    while page["next_cursor"]:
+      page = self.get_page(client, {"cursor": page["next_cursor"]})
+      pages.append([product["id"] for product in page["results"]])
+      seen += pages[-1]
+    expected = list(Product.objects.order_by("cash_price", "id").values_list("id", flat=True))
+    self.assertEqual(seen, expected)
+
+    # going back returns the same previous page
+    page = self.get_page(client, {"cursor": page["previous_cursor"]})
+    self.assertEqual([product["id"] for product in page["results"]], pages[-2])
+
+  def test_cursor_keeps_the_microseconds(self):
+    # the products of the same millisecond, in the opposite order of their ids
+    created_at = timezone.now().replace(microsecond=1000)
+    for index, product in enumerate(Product.objects.order_by("-id")):
+      Product.objects.filter(id=product.id).update(created_at=created_at + timedelta(microseconds=index))
+
+    client = APIClient()
+    page = self.get_page(client, {"cursor": "", "ordering": "created_at"})
+    seen = [product["id"] for product in page["results"]]
+    # 7 products in pages of 3, a truncated cursor returns the same page again
+    for _ in range(2):
+      page = self.get_page(client, {"cursor": page["next_cursor"], "ordering": "created_at"})
+      seen += [product["id"] for product in page["results"]]
+    self.assertIsNone(page["next_cursor"])
+    self.assertEqual(seen, list(Product.objects.order_by("created_at").values_list("id", flat=True)))
+
+  def test_invalid_cursor(self):
+    client = APIClient()
+    response = client.get("/api/product/all", {"cursor": "not-a-cursor"})
+    self.assertEqual(response.status_code, 400)
+
+  def test_page_size_is_limited(self):
+    with mock.patch("utils.api_response.PAGE_SIZE_MAX", 4):
+      page = self.get_page(APIClient(), {"page_size": 1000})
+    self.assertEqual(page["page_size"], 4)
+    self.assertEqual(len(page["results"]), 4)
+
+  def test_stream_ndjson_and_csv(self):
+    client = APIClient()
+    response = client.get("/api/product/all", {"format": "ndjson", "stream": 1, "ordering": "id"})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response["Content-Type"], "application/x-ndjson")
+    rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    self.assertEqual([row["internalId"] for row in rows], [f"moto-{index}" for index in range(7)])
+
+    response = client.get("/api/product/all", {"format": "csv", "stream": 1, "ordering": "id"})
+    lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+    self.assertIn("internalId", lines[0])
+    self.assertEqual(len(lines), 8)
+
+class TestProductImagePublicStorage(TestCase):
+  def test_names_depend_on_the_content(self):
+    name = get_content_addressed_name("product_images/moto.JPG", ContentFile(b"image"))
+    self.assertRegex(name, r"^product_images/moto-[0-9a-f]{16}\.jpg$")
+    self.assertEqual(name, get_content_addressed_name("product_images/moto.JPG", ContentFile(b"image")))
+    self.assertNotEqual(name, get_content_addressed_name("product_images/moto.JPG", ContentFile(b"other")))
+
+  def test_urls_are_not_signed(self):
+    storage = ProductImage._meta.get_field("image").storage
+    url = storage.url("product_images/moto-0123456789abcdef.jpg")
+    self.assertTrue(url.endswith("/product_images/moto-0123456789abcdef.jpg"))
+    self.assertNotIn("Signature", url)
+
+  def test_upload_sessions_limit_the_size_and_only_create(self):
+    storage = ProductImage._meta.get_field("image").storage
+    session = storage.get_upload_session("product_images/moto-0123456789abcdef.jpg", "image/jpeg", 10)
+    self.assertEqual(session["headers"]["x-goog-content-length-range"], "0,10")
+    self.assertEqual(session["headers"]["x-goog-if-generation-match"], "0")
+    # the storage rejects the requests without the same headers
+    signed_headers = parse_qs(urlparse(session["url"]).query)["X-Goog-SignedHeaders"][0].split(";")
+    self.assertTrue({"x-goog-content-length-range", "x-goog-if-generation-match"} <= set(signed_headers))
+
+@local_memory_cache
+class TestCatalogCache(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.category = Category.objects.create(name="Motos")
+    self.product = Product.objects.create(
+      internal_id="moto", name="Moto", description="Moto", category=self.category, stock=1,
+      lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+    )
+
+  def test_cached_until_the_next_write(self):
+    client = APIClient()
+    client.get("/api/product/all", {"page_size": 5, "ordering": "-id"})
+    with self.assertNumQueries(0):
+      response = client.get("/api/product/all", {"ordering": "-id", "page_size": 5})
+    self.assertEqual(response.json()["data"]["results"][0]["stock"], 1)
+
+    with self.captureOnCommitCallbacks(execute=True):
+      serializer = ProductSerializer(self.product, data={"stock": 7}, partial=True)
+      serializer.is_valid(raise_exception=True)
+      serializer.save()
+    response = client.get("/api/product/all", {"ordering": "-id", "page_size": 5})
+    self.assertEqual(response.json()["data"]["results"][0]["stock"], 7)
+
+  def test_not_modified_with_the_etag(self):
+    client = APIClient()
+    response = client.get("/api/product/name/moto")
+    etag = response["ETag"]
+    response = client.get("/api/product/name/moto", HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(response["ETag"], etag)
+
+    with self.captureOnCommitCallbacks(execute=True):
+      serializer = ProductSerializer(self.product, data={"stock": 7}, partial=True)
+      serializer.is_valid(raise_exception=True)
+      serializer.save()
+    response = client.get("/api/product/name/moto", HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertNotEqual(response["ETag"], etag)
+
+  def test_concurrent_misses_build_once(self):
+    builds = []
+    def build():
+      builds.append(1)
+      threading.Event().wait(0.2)
+      return "value"
+
+    results = []
+    threads = [ threading.Thread(target=lambda: results.append(get_or_build("key", build, 60))) for _ in range(4) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    self.assertEqual(results, ["value"] * 4)
+    self.assertEqual(len(builds), 1)
+
+class TestProductImageVariants(TestCase):
+  @staticmethod
+  def get_image(width, height, mode="RGB"):
+    content = io.BytesIO()
+    Image.new(mode, (width, height)).save(content, "PNG")
+    content.seek(0)
+    return content
+
+  def test_variants_of_each_width_and_format(self):
+    variants = ImageService.create_variants(self.get_image(1200, 800, "RGBA"))
+    sizes = sorted((image_format, width, height) for image_format, width, height, _ in variants)
+    self.assertEqual(sizes, [
+      ("jpeg", 320, 213), ("jpeg", 640, 427), ("jpeg", 1024, 683),
+      ("webp", 320, 213), ("webp", 640, 427), ("webp", 1024, 683),
+    ])
+    with Image.open(io.BytesIO(variants[1][3])) as image:
+      self.assertEqual(image.format, "JPEG")
+
+  def test_small_images_are_not_enlarged(self):
+    variants = ImageService.create_variants(self.get_image(200, 100))
+    self.assertEqual([ width for _, width, _, _ in variants ], [200, 200])
+
+  def test_srcset(self):
+    product_image = ProductImage(image="product_images/moto-0123456789abcdef.jpg", variants={
+      "webp": [
+        {"width": 320, "height": 240, "name": "product_images/variants/moto-320w-0123456789abcdef.webp"},
+        {"width": 640, "height": 480, "name": "product_images/variants/moto-640w-0123456789abcdef.webp"},
+      ],
+    })
+    srcset = product_image.get_srcset()["srcset"]["webp"]
+    self.assertRegex(srcset, r"^\S+moto-320w-0123456789abcdef\.webp 320w, \S+moto-640w-0123456789abcdef\.webp 640w$")
+
+@local_memory_cache
+class TestProductImageDirectUpload(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.admin = User.objects.create(username="admin", email="admin@example.com", country_user_id="V-1", is_superuser=True)
+    self.product = Product.objects.create(
+      internal_id="moto", name="Moto", description="Moto", category=Category.objects.create(name="Motos"), stock=1,
+      lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+    )
+    # the local storage stands in for the bucket, the client writes the file in the path of the session
+    storage = FileSystemDirectUploadStorage(location=tempfile.mkdtemp(), base_url="/media/")
+    patcher = mock.patch.object(ProductImage._meta.get_field("image"), "storage", storage)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_upload_and_finalize(self):
+    client = APIClient()
+    client.force_authenticate(self.admin)
+    response = client.post("/api/product/image/upload", {"product": self.product.id, "contentType": "image/png", "size": 10}, format="json")
+    self.assertEqual(response.status_code, 201)
+    upload = response.json()["data"]
+    self.assertRegex(upload["upload"]["url"], r"/product_images/moto-[0-9a-f]{16}\.png$")
+
+    # not part of the product until it is finalized
+    finalize = f"/api/product/image/{upload['id']}/finalize"
+    self.assertEqual(client.post(finalize).status_code, 409)
+    self.assertEqual(client.get("/api/product/name/moto").json()["data"]["images"], [])
+
+    Path(urlparse(upload["upload"]["url"]).path).write_bytes(TestProductImageVariants.get_image(10, 10).read())
+    with mock.patch.object(ImageService, "schedule_variants") as schedule_variants, self.captureOnCommitCallbacks(execute=True):
+      response = client.post(finalize)
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.json()["data"]["isUploaded"])
+    schedule_variants.assert_called_once_with(upload["id"])
+    self.assertEqual(len(client.get("/api/product/name/moto").json()["data"]["images"]), 1)
+
+  def test_content_of_another_type(self):
+    client = APIClient()
+    client.force_authenticate(self.admin)
+    upload = client.post("/api/product/image/upload", {"product": self.product.id, "contentType": "image/jpeg", "size": 100}, format="json").json()["data"]
+    Path(urlparse(upload["upload"]["url"]).path).write_bytes(TestProductImageVariants.get_image(10, 10).read())
+    self.assertEqual(client.post(f"/api/product/image/{upload['id']}/finalize").status_code, 400)
+    self.assertFalse(ProductImage.objects.filter(id=upload["id"]).exists())
+
+@local_memory_cache
+class TestCategoryTree(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.vehicles = self.create_category("Vehicles")
+    self.motorcycles = self.create_category("Motorcycles", self.vehicles)
+    self.scooters = self.create_category("Scooters", self.motorcycles)
+    self.tools = self.create_category("Tools")
+    Product.objects.create(
+      internal_id="scooter", name="Scooter", description="Scooter", category=self.scooters, stock=1,
+      lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra={}
+    )
+
+  @staticmethod
+  def create_category(name, parent=None):
+    serializer = CategorySerializer(data={"name": name, "parent": parent.id if parent else None})
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+  def get_products(self, category):
+    response = APIClient().get("/api/product/all", {"category": category.id})
+    return [ product["internalId"] for product in response.json()["data"]["results"] ]
+
+  def test_filter_includes_the_subcategories(self):
+    self.assertEqual(self.scooters.path, f"/{self.vehicles.id}/{self.motorcycles.id}/{self.scooters.id}/")
+    self.assertEqual(self.get_products(self.vehicles), ["scooter"])
+    self.assertEqual(self.get_products(self.tools), [])
+
+  def test_move_and_delete_update_the_subtree(self):
+    updated_at = self.scooters.updated_at
+    with self.captureOnCommitCallbacks(execute=True):
+      serializer = CategorySerializer(self.motorcycles, data={"parent": self.tools.id}, partial=True)
+      serializer.is_valid(raise_exception=True)
+      serializer.save()
+    self.scooters.refresh_from_db()
+    self.assertEqual((self.scooters.path, self.scooters.depth), (f"/{self.tools.id}/{self.motorcycles.id}/{self.scooters.id}/", 2))
+    # the version of the ETag of the moved categories
+    self.assertNotEqual(self.scooters.updated_at, updated_at)
+    self.assertEqual(self.get_products(self.tools), ["scooter"])
+
+    with self.captureOnCommitCallbacks(execute=True):
+      CategoryService.delete_category(self.motorcycles.id)
+    self.scooters.refresh_from_db()
+    self.assertEqual((self.scooters.parent, self.scooters.path, self.scooters.depth), (None, f"/{self.scooters.id}/", 0))
+
+  def test_category_can_not_be_moved_inside_itself(self):
+    serializer = CategorySerializer(self.vehicles, data={"parent": self.scooters.id}, partial=True)
+    self.assertFalse(serializer.is_valid())
+
+  def test_tree(self):
+    with self.assertNumQueries(1):
+      response = APIClient().get("/api/product/category/tree")
+    tree = response.json()["data"]
+    self.assertEqual([ category["name"] for category in tree ], ["Tools", "Vehicles"])
+    self.assertEqual(tree[1]["children"][0]["children"][0]["name"], "Scooters")
+
+@local_memory_cache
+class TestProductQuote(TestCase):
+  def setUp(self):
+    cache.clear()
+    category = Category.objects.create(name="Motos")
+    for internal_id, lease_price in (("moto", 1000), ("casco", 120)):
+      Product.objects.create(
+        internal_id=internal_id, name=internal_id, description=internal_id, category=category, stock=1,
+        lease_price=lease_price, initial_fee=100, cash_price=lease_price, brand="Bera", extra={}
+      )
+
+  def test_last_fee_carries_the_remainder(self):
+    lease_options = Product.objects.get(internal_id="moto").lease_options
+    self.assertEqual(lease_options[12], {"initial_fee": 100, "weekly_fee": 83, "last_weekly_fee": 87, "total": 1100})
+    self.assertEqual(lease_options[24], {"initial_fee": 100, "weekly_fee": 41, "last_weekly_fee": 57, "total": 1100})
+
+  def test_quote_of_products_and_basket(self):
+    response = APIClient().get("/api/product/quote", {"products": "moto,casco", "periods": "12", "incomes": "250,300"})
+    self.assertEqual(response.status_code, 200)
+    data = response.json()["data"]
+    self.assertEqual(data["products"][0]["options"][0], {
+      "weeks": 12, "initialFee": 100, "weeklyFee": 83, "lastWeeklyFee": 87, "total": 1100, "affordable": [False, True]
+    })
+    self.assertEqual(data["basket"]["options"][0], {
+      "weeks": 12, "initialFee": 200, "weeklyFee": 93, "lastWeeklyFee": 97, "total": 1320, "affordable": [False, False]
+    })
+
+  def test_unknown_products(self):
+    response = APIClient().get("/api/product/quote", {"products": "moto,bicicleta"})
+    self.assertEqual(response.status_code, 404)
+
+  def test_amounts_out_of_range(self):
+    response = APIClient().get("/api/product/quote", {"products": "moto", "incomes": str(2 ** 63)})
+    self.assertEqual(response.status_code, 400)
+    Product.objects.filter(internal_id="casco").update(lease_price=2 ** 63 - 1)
+    response = APIClient().get("/api/product/quote", {"products": "moto,casco"})
+    self.assertEqual(response.status_code, 400)
+    with self.assertRaises(CustomException):
+      QuoteService.get_lease_options(Product.objects.all())
+
+@local_memory_cache
+class TestProductExtraFilter(TestCase):
+  def setUp(self):
+    cache.clear()
+    category = Category.objects.create(name="Motos")
+    extras = [
+      {"color": "red", "engine_size": 150, "abs": True, "wheels": {"size": 17}},
+      {"color": "blue", "engine_size": 125, "abs": False, "wheels": {"size": 14}},
+      {"color": "red", "engine_size": "125", "abs": False, "wheels": {"size": 17}},
+    ]
+    for index, extra in enumerate(extras):
+      Product.objects.create(
+        internal_id=f"moto-{index}", name=f"Moto {index}", description="Moto", category=category,
+        stock=1, lease_price=1200, initial_fee=100, cash_price=1000, brand="Bera", extra=extra
+      )
+
+  def get_internal_ids(self, params):
+    response = APIClient().get("/api/product/all", {"ordering": "internal_id", **params})
+    self.assertEqual(response.status_code, 200)
+    return [product["internal_id"] for product in response.data["data"]["results"]]
+
+  def test_filter_by_extra_attributes(self):
+    self.assertEqual(self.get_internal_ids({"extra__color": "red"}), ["moto-0", "moto-2"])
+    self.assertEqual(self.get_internal_ids({"extra__color": ["red", "blue"], "extra__abs": "false"}), ["moto-1", "moto-2"])
+    self.assertEqual(self.get_internal_ids({"extra__wheels__size": "17", "extra__abs": "true"}), ["moto-0"])
+    # numbers and their text match the same
+    self.assertEqual(self.get_internal_ids({"extra__engine_size": "125"}), ["moto-1", "moto-2"])
+    self.assertEqual(self.get_internal_ids({"extra__color": "green"}), [])
+    # the values that aren't valid jsonb are only text
+    for value in ("NaN", "-Infinity", "1e400"):
+      self.assertEqual(self.get_internal_ids({"extra__wheels__size": value}), [])
+
+  def test_number_of_extra_filter_values_is_limited(self):
+    response = APIClient().get("/api/product/all", {"extra__color": [str(index) for index in range(21)]})
+    self.assertEqual(response.status_code, 400)
+
+@local_memory_cache
+class TestProductFacets(TestCase):
+  def setUp(self):
+    cache.clear()
+    motos = Category.objects.create(name="Motos")
+    cascos = Category.objects.create(name="Cascos")
+    for index, (category, brand, cash_price) in enumerate([
+      (motos, "Bera", 1200), (motos, "Bera", 3000), (motos, "Yamaha", 6000), (cascos, "Bera", 80),
+    ]):
+      Product.objects.create(
+        internal_id=f"product-{index}", name=f"Product {index}", description="Product", category=category, stock=1,
+        lease_price=cash_price, initial_fee=0, cash_price=cash_price, brand=brand, extra={}
+      )
+    self.motos = motos
+
+  def test_facets_of_the_filtered_products(self):
+    response = APIClient().get("/api/product/all", {"facets": "1", "category": self.motos.id})
+    facets = response.json()["data"]["facets"]
+    self.assertEqual(facets["brand"], [{"value": "Bera", "count": 2}, {"value": "Yamaha", "count": 1}])
+    self.assertEqual(facets["category"], [{"id": self.motos.id, "name": "Motos", "count": 3}])
+    self.assertEqual(facets["price"], [
+      {"min": 1000, "max": 2500, "count": 1}, {"min": 2500, "max": 5000, "count": 1}, {"min": 5000, "max": 10000, "count": 1},
+    ])
+
+  def test_without_facets_param(self):
+    response = APIClient().get("/api/product/all")
+    self.assertNotIn("facets", response.json()["data"])
+
+  def test_facets_that_time_out_are_not_cached(self):
+    client = APIClient()
+    with mock.patch.object(ProductService, "get_facets", return_value=None) as get_facets:
+      self.assertIsNone(client.get("/api/product/all", {"facets": "1"}).json()["data"]["facets"])
+      client.get("/api/product/all", {"facets": "1"})
+    self.assertEqual(get_facets.call_count, 2)
+    self.assertIsNotNone(client.get("/api/product/all", {"facets": "1"}).json()["data"]["facets"])
+
+@local_memory_cache
+class TestProductImport(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.category = Category.objects.create(name="Motos")
+    self.client = APIClient()
+    self.client.force_authenticate(User.objects.create(username="admin", is_superuser=True, country_user_id="V-1"))
+
+  def import_file(self, name, content, **data):
+    response = self.client.post("/api/product/import", {"file": SimpleUploadedFile(name, content.encode()), **data}, format="multipart")
+    self.assertEqual(response.status_code, 200)
+    return response.json()["data"]
+
+  def test_import_reports_the_rows_with_errors(self):
+    content = (
+      "name,description,category,brand,stock,lease_price,initial_fee,cash_price,extra\n"
+      "Moto eléctrica,Moto eléctrica urbana,Motos,Bera,3,1200,100,1000,\"{\"\"color\"\": \"\"red\"\"}\"\n"
+      "Moto eléctrica,Repetida,Motos,Bera,3,1200,100,1000,\n"
+      f"Scooter,Scooter urbano,{self.category.id},Bera,3,900,100,800,\n"
+      "Casco,Casco integral,Cascos,Bera,3,100,10,90,\n"
+      "Bicicleta,Bicicleta,Motos,Bera,-1,100,10,90,\n"
+      "Patineta,Patineta,²,Bera,3,100,10,90,\n"
+      "Patines,Patines,99999999999999999999,Bera,3,100,10,90,\n"
+    )
+    data = self.import_file("products.csv", content)
+    self.assertEqual((data["created"], data["updated"], data["failed"]), (2, 0, 5))
+    self.assertEqual([ error["row"] for error in data["errors"] ], [3, 5, 6, 7, 8])
+    product = Product.objects.get(internal_id="moto-electrica")
+    self.assertEqual(product.extra, {"color": "red"})
+    self.assertTrue(ProductService.search(Product.objects.all(), "electrica").exists())
+
+  def test_upsert_by_internal_id(self):
+    row = '{"internal_id": "scooter", "name": "Scooter", "description": "Scooter", "category": "Motos", "brand": "Bera", "stock": %d, "lease_price": 900, "initial_fee": 100, "cash_price": 800}\n'
+    self.import_file("products.jsonl", row % 1)
+    data = self.import_file("products.jsonl", row % 5)
+    self.assertEqual((data["created"], data["failed"]), (0, 1))
+    data = self.import_file("products.jsonl", row % 5, upsert="true")
+    self.assertEqual((data["created"], data["updated"]), (0, 1))
+    self.assertEqual(Product.objects.get(internal_id="scooter").stock, 5)
@@ -8,15 +8,24 @@ from . import views
 urlpatterns = [
     path('name/<str:id>', views.ProductView.as_view()),
     path('all', views.ProductAllView.as_view(), name='products'),
+    path('suggest', views.ProductSuggestView.as_view()),
+    path('quote', views.ProductQuoteView.as_view()),
+    path('import', views.ProductImportView.as_view()),
     path('image/all', views.ProductImageUploadView.as_view({'post': 'create', 'get': 'list'})),
     path('image/<int:pk>', views.ProductImageUploadView.as_view({'get': 'retrieve', 'delete': 'destroy', 'patch': 'partial_update'})),
+    path('image/upload', views.ProductImageDirectUploadView.as_view()),
+    path('image/<int:id>/finalize', views.ProductImageFinalizeView.as_view()),
     path('category/<int:id>', views.CategoryView.as_view()), 
     path('category/all', views.CategoryAllView.as_view()), 
+    path('category/tree', views.CategoryTreeView.as_view()),
 ]
 
 # public endpoints
 # * get all the products
 # * get a product by id
+# * suggest products
+# * quote products
 # * get all the categories
+# * get the tree of categories
 # * get a category by id
 
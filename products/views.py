@@ -2,12 +2,12 @@ from django.shortcuts import render
 from rest_framework.views import APIView, View
 from utils.api_response import get_failed_response, get_successful_response, get_paginated_queryset, \
     get_paginated_response_structure, custom_handler
-from products.serializers import ProductSerializer, CategorySerializer, ProductImageSerializer
+from utils.streaming import STREAM_RENDERER_CLASSES, is_stream_request, get_stream_response
+from products.serializers import ProductSerializer, CategorySerializer, ProductImageSerializer, ProductImageUploadSerializer
 from products.models import Product, Category
-from django.db.models import Q, F, Count
-from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.db.models import Q, F
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from products.permissions import ProductViewPermission, CategoryViewPermission
 from django.utils.translation import gettext_lazy as _
 from django.http import HttpResponse
@@ -20,6 +20,16 @@ from rest_framework import viewsets
 from requests import ConnectionError
 from exceptions.custom_exception import CustomException
 from products.services.categoryService import CategoryService
+from products.services.product import ProductService
+from products.services.image import ImageService
+from products.services.quote import QuoteService
+from products.services.product_import import ProductImportService, PRODUCT_IMPORT_FORMATS
+from django.utils.cache import patch_cache_control
+from utils.cache import get_request_cache_key, get_or_build_with_etag, bump_cache_version
+from utils.etag import get_conditional_successful_response, get_version_etag
+from glik.constants import SUGGEST_MIN_LENGTH, SUGGEST_LIMIT_DEFAULT, SUGGEST_LIMIT_MAX, SUGGEST_CACHE_SECONDS, \
+    CATALOG_CACHE_NAMESPACE, CATALOG_CACHE_SECONDS, CATEGORY_CACHE_NAMESPACE, CATEGORY_TREE_CACHE_SECONDS, \
+    LEASE_WEEKS_PERIODS, QUOTE_MAX_PRODUCTS, QUOTE_MAX_INCOMES
 
 # ============ #
 #   Products   #
@@ -30,12 +40,18 @@ class ProductView(APIView):
 
   def get(self, request, id):
     """
-    This method is used to get the product information
+    This method is used to get the product information, the response is
+    cached until the next write in the catalog (If-None-Match returns 304)
     """
+    key = get_request_cache_key(CATALOG_CACHE_NAMESPACE, request, 'product', id)
+    cached = get_or_build_with_etag(key, lambda: self.get_product_data(id), CATALOG_CACHE_SECONDS)
+    return get_conditional_successful_response(request, cached['etag'], lambda: cached['data'], message=_("Product information"))
+
+  @staticmethod
+  def get_product_data(id):
     try: 
       queryset = Product.objects.get(internal_id=id)
-      serializer = ProductSerializer(queryset)
-      return get_successful_response(data=serializer.data, message=_("Product information"))
+      return ProductSerializer(queryset).data
     except Product.DoesNotExist:
       raise CustomException("Product not found", status.HTTP_404_NOT_FOUND)
 
@@ -62,12 +78,14 @@ class ProductView(APIView):
     """
     try: 
       Product.objects.get(internal_id=id).delete()
+      bump_cache_version(CATALOG_CACHE_NAMESPACE)
       return get_successful_response(message=_("Product deleted successfully"))
     except Product.DoesNotExist:
       raise CustomException("Product not found", status.HTTP_404_NOT_FOUND)
 
 class ProductAllView(APIView):
   permission_classes = [IsAuthenticatedOrReadOnly, ProductViewPermission]
+  renderer_classes = STREAM_RENDERER_CLASSES
 
   def post(self, request):    
     """
@@ -85,51 +103,78 @@ class ProductAllView(APIView):
   def get(self, request):
     """
     This method is used to get all the products with 
-    - pagination
+    - pagination (page number, or keyset pagination with ?cursor=)
     - ordering
     - filtering 
     - searching (full text search)
+    - facets, with ?facets=1 the counts by brand, category and price of the filtered
+      products are returned in "facets" (null when they take too long)
+    - export, with ?format=ndjson|csv&stream=1 all the rows are streamed
+    The responses are cached until the next write in the catalog (If-None-Match returns 304),
+    the exports are not cached
     """
-    queryset = self.get_filtered_queryset(request)
-    ordering = self.get_ordering(request)
-
-    # search section
-    search_param = request.query_params.get('search', None)
-    if search_param:
-        query_object = Product.objects.annotate(
-            search=SearchVector('id', 'name', 'description', 'brand', config='spanish')
-        ).filter(queryset) \
-        .filter(search=SearchQuery(search_param, config='spanish'))
-    else:
-        query_object = Product.objects.filter(queryset)
+    if is_stream_request(request):
+      products = self.get_products_queryset(request)[1]
+      return get_stream_response(request, products, ProductSerializer, 'products')
 
-    # variable to allow order products by the number of leases
-    query_object = query_object.annotate(leases_count=Count('leases_products'))
+    key = get_request_cache_key(CATALOG_CACHE_NAMESPACE, request, 'products')
+    cached = get_or_build_with_etag(
+      key, lambda: self.get_products_data(request), CATALOG_CACHE_SECONDS,
+      # the facets that took too long are computed again by the next request
+      is_cacheable=lambda data: 'facets' not in data or data['facets'] is not None,
+    )
+    return get_conditional_successful_response(request, cached['etag'], lambda: cached['data'])
 
-    # ordering section
-    products = query_object.order_by(ordering)
+  def get_products_data(self, request):
+    query_object, products = self.get_products_queryset(request)
 
     # pagination section and response
     page_object = get_paginated_queryset(request, products)
     serialized_data = ProductSerializer(page_object.object_list, many=True).data
     response = get_paginated_response_structure(page_object, serialized_data)
 
-    return get_successful_response(data=response)
+    # facets section, same filters and search of the page
+    if request.query_params.get('facets', None) in ('1', 'true'):
+      response['facets'] = ProductService.get_facets(query_object)
+    return response
+
+  def get_products_queryset(self, request):
+    """
+    Returns the filtered products (for the facets) and the same products sorted
+    """
+    queryset = self.get_filtered_queryset(request)
+    ordering = self.get_ordering(request)
+
+    # search section
+    search_param = request.query_params.get('search', None)
+    query_object = Product.objects.filter(queryset).prefetch_related('images')
+    if search_param:
+        query_object = ProductService.search(query_object, search_param)
+
+    # ordering section, the search results are sorted by relevance by default
+    if search_param and not request.query_params.get('ordering', None):
+        products = query_object.order_by('-search_rank', ordering)
+    else:
+        products = query_object.order_by(ordering)
+    return query_object, products
     
   @staticmethod
   def get_filtered_queryset(request):
     queryset = Q()
 
-    # category filter
+    # category filter, it includes the products of the subcategories
     category_param = request.query_params.get('category', None)
     if category_param:
-      queryset &= Q(category__id=category_param)
+      queryset &= CategoryService.get_subtree_filter(category_param)
 
     # is featured filter
     is_featured_param = request.query_params.get('is_featured', None)
     if is_featured_param:
       queryset &= Q(is_featured=is_featured_param)
 
+    # extra attributes filter: ?extra__color=red&extra__engine_size=150
+    queryset &= ProductService.get_extra_filter(request.query_params)
+
     return queryset
 
   @staticmethod
@@ -139,8 +184,9 @@ class ProductAllView(APIView):
     They have to be in snake case.
     Example: /api/products/all?ordering=-id
 
-    To sort by the number of leases, you can use the ordering parameter
+    To sort by the number of leases (best sellers), you can use the ordering parameter
     Example: /api/products/all?ordering=-leases_count
+    Also the leases of the last 7 or 30 days: ordering=-leases_count_7d
     """
     default_ordering = '-id'
     ordering_param = request.query_params.get('ordering', None)
@@ -152,9 +198,6 @@ class ProductAllView(APIView):
 
     valid_ordering_filters = Product._meta.fields 
     valid_ordering_filters = [field.name for field in valid_ordering_filters]
-    valid_ordering_filters.append('leases_count')
-
-    # best sellers ordering
 
     if ordering_param and ordering_param in valid_ordering_filters:
       ordering_param = sorting + ordering_param
@@ -162,10 +205,147 @@ class ProductAllView(APIView):
 
     return default_ordering
 
+class ProductImportView(APIView):
+  permission_classes = [IsAuthenticatedOrReadOnly, ProductViewPermission]
+
+  def post(self, request):
+    """
+    This method is used to import products from a csv or jsonl file (multipart "file"),
+    the rows with errors are reported by row number and the rest are saved.
+    - fileFormat: csv or jsonl, by default the extension of the file
+    - upsert: true to update the products with the same internal id instead of reporting them
+    The columns are the fields of a product, category can be the id or the name
+    """
+    file = request.FILES.get('file', None)
+    if file is None:
+      raise CustomException("file is required", status.HTTP_400_BAD_REQUEST)
+    file_format = ProductImportService.get_file_format(file.name, request.data.get('file_format', None))
+    if file_format is None:
+      raise CustomException("The file format must be one of " + ", ".join(PRODUCT_IMPORT_FORMATS), status.HTTP_400_BAD_REQUEST)
+
+    upsert = str(request.data.get('upsert', 'false')).lower() in ('1', 'true')
+    result = ProductImportService.import_products(file, file_format, upsert=upsert)
+    return get_successful_response(message=_("Products imported"), data=result.get_structure())
+
+class ProductSuggestView(APIView):
+  permission_classes = [IsAuthenticatedOrReadOnly, ProductViewPermission]
+
+  def get(self, request):
+    """
+    This method is used to autocomplete the search box, it returns the
+    internal id and name of the products that resemble the search param
+    Example: /api/product/suggest?search=yamaha&limit=5
+    """
+    search_param = request.query_params.get('search', '').strip()
+    try:
+      limit = min(int(request.query_params.get('limit', SUGGEST_LIMIT_DEFAULT)), SUGGEST_LIMIT_MAX)
+    except ValueError:
+      raise CustomException("limit must be a number", status.HTTP_400_BAD_REQUEST)
+
+    suggestions = []
+    if len(search_param) >= SUGGEST_MIN_LENGTH and limit > 0:
+      suggestions = ProductService.suggest(search_param, limit)
+
+    response = get_successful_response(data=suggestions)
+    patch_cache_control(response, public=True, max_age=SUGGEST_CACHE_SECONDS)
+    return response
+
+class ProductQuoteView(APIView):
+  permission_classes = [IsAuthenticatedOrReadOnly, ProductViewPermission]
+
+  def get(self, request):
+    """
+    This method is used to quote the lease of some products, alone and together (basket),
+    for some periods and check if the weekly fee is affordable with some weekly incomes
+    Example: /api/product/quote?products=yamaha-ybr-125,casco&periods=12,24&incomes=150,300
+    The periods are LEASE_WEEKS_PERIODS by default
+    """
+    internal_ids = self.get_list_param(request, 'products')
+    periods = self.get_integer_list_param(request, 'periods') or LEASE_WEEKS_PERIODS
+    incomes = self.get_integer_list_param(request, 'incomes')
+
+    if not internal_ids:
+      raise CustomException("products is required", status.HTTP_400_BAD_REQUEST)
+    if len(internal_ids) > QUOTE_MAX_PRODUCTS or len(incomes) > QUOTE_MAX_INCOMES:
+      raise CustomException("Too many products or incomes", status.HTTP_400_BAD_REQUEST)
+    if any(weeks not in LEASE_WEEKS_PERIODS for weeks in periods):
+      raise CustomException("periods must be in " + str(LEASE_WEEKS_PERIODS), status.HTTP_400_BAD_REQUEST)
+
+    products = {
+      product['internal_id']: product
+      for product in Product.objects.filter(internal_id__in=internal_ids).values('internal_id', 'name', 'lease_price', 'initial_fee')
+    }
+    missing = [ internal_id for internal_id in internal_ids if internal_id not in products ]
+    if missing:
+      raise CustomException("Product not found", status.HTTP_404_NOT_FOUND, errors=missing)
+
+    quote = QuoteService.get_quote_structure([ products[internal_id] for internal_id in internal_ids ], periods, incomes)
+    return get_successful_response(data=quote)
+
+  @staticmethod
+  def get_list_param(request, name):
+    """
+    The lists can be comma separated (products=a,b) or repeated (products=a&products=b)
+    """
+    values = []
+    for value in request.query_params.getlist(name):
+      values.extend(item.strip() for item in value.split(',') if item.strip())
+    # the repeated values are quoted once
+    return list(dict.fromkeys(values))
+
+  @staticmethod
+  def get_integer_list_param(request, name):
+    try:
+      values = [ int(value) for value in ProductQuoteView.get_list_param(request, name) ]
+    except ValueError:
+      raise CustomException(name + " must be a list of numbers", status.HTTP_400_BAD_REQUEST)
+    if any(value < 0 for value in values):
+      raise CustomException(name + " must be positive numbers", status.HTTP_400_BAD_REQUEST)
+    return values
+
 class ProductImageUploadView(viewsets.ModelViewSet):
   permission_classes = [IsAuthenticatedOrReadOnly, ProductViewPermission]
   serializer_class = ProductImageSerializer
-  queryset = ProductImage.objects.all()
+  # the direct uploads that aren't finalized are left out
+  queryset = ProductImage.objects.filter(is_uploaded=True)
+
+  def perform_destroy(self, instance):
+    super().perform_destroy(instance)
+    bump_cache_version(CATALOG_CACHE_NAMESPACE)
+
+class ProductImageDirectUploadView(APIView):
+  permission_classes = [IsAuthenticated, ProductViewPermission]
+
+  def post(self, request):
+    """
+    This method is used to start the direct upload of a product image, the client uploads
+    the image to the storage with the session of the response and then finalizes it
+    - product: id of the product
+    - contentType and size of the image
+    """
+    serializer = ProductImageUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+      return get_failed_response(errors=serializer.errors, message=_("Validation error"))
+
+    upload = ImageService.create_upload(serializer.validated_data['product'], serializer.validated_data['content_type'], serializer.validated_data['size'])
+    return get_successful_response(data=upload, message=_("Product image upload started"), status_code=status.HTTP_201_CREATED)
+
+class ProductImageFinalizeView(APIView):
+  permission_classes = [IsAuthenticated, ProductViewPermission]
+
+  def post(self, request, id):
+    """
+    This method is used to confirm the direct upload of a product image
+    """
+    try:
+      product_image = ProductImage.objects.get(id=id)
+    except ProductImage.DoesNotExist:
+      return get_failed_response(message=_("Product image not found"), status_code=status.HTTP_404_NOT_FOUND)
+
+    product_image = ImageService.finalize_upload(product_image)
+    # the serializer already returns the message and the data, like the upload through api/product/image/all
+    representation = ProductImageSerializer(product_image, context={'request': request}).data
+    return get_successful_response(data=representation['data'], message=representation['message'])
 
 # ============ #
 #  Categories  #
@@ -176,12 +356,14 @@ class CategoryView(APIView):
 
   def get(self, request, id):
     """
-    This method is used to get the category information
+    This method is used to get the category information (If-None-Match returns 304)
     """
     try:
       queryset = Category.objects.get(id=id)
-      serializer = CategorySerializer(queryset)
-      return get_successful_response(data=serializer.data, message=_("Category information"))
+      etag = get_version_etag(queryset.id, queryset.updated_at)
+      return get_conditional_successful_response(
+        request, etag, lambda: CategorySerializer(queryset).data, message=_("Category information")
+      )
     except Category.DoesNotExist:
       return get_failed_response(message=_("Category not found"), status_code=status.HTTP_404_NOT_FOUND)
 
@@ -226,14 +408,29 @@ class CategoryAllView(APIView):
     category = serializer.save()
     return get_successful_response(message=_("Category created successfully"), status_code=status.HTTP_201_CREATED, data=category.id)
 
-  def get(request, id):
+  def get(self, request):
     """
-    This method is used to get all the categories
+    This method is used to get all the categories, the response is
+    cached until the next write in the catalog (If-None-Match returns 304)
     """
-    try:
-      # the child array is empty 
-      queryset = Category.objects.filter( children__isnull=True )
-      serialized_data = CategorySerializer(queryset, many=True).data
-      return get_successful_response(data=serialized_data)
-    except Category.DoesNotExist:
-      return get_failed_response(message=_("Categories not found"), status_code=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+    key = get_request_cache_key(CATALOG_CACHE_NAMESPACE, request, 'categories')
+    cached = get_or_build_with_etag(key, self.get_categories_data, CATALOG_CACHE_SECONDS)
+    return get_conditional_successful_response(request, cached['etag'], lambda: cached['data'])
+
+  @staticmethod
+  def get_categories_data():
+    # the child array is empty 
+    queryset = Category.objects.filter( children__isnull=True )
+    return CategorySerializer(queryset, many=True).data
+
+class CategoryTreeView(APIView):
+  permission_classes = [IsAuthenticatedOrReadOnly, CategoryViewPermission]
+
+  def get(self, request):
+    """
+    This method is used to get all the categories as a tree, each category has its children.
+    The response is cached until the next change in the categories (If-None-Match returns 304)
+    """
+    key = get_request_cache_key(CATEGORY_CACHE_NAMESPACE, request, 'tree')
+    cached = get_or_build_with_etag(key, CategoryService.get_tree, CATEGORY_TREE_CACHE_SECONDS)
+    return get_conditional_successful_response(request, cached['etag'], lambda: cached['data'])
@@ -0,0 +1,24 @@
+from django.contrib.auth.backends import ModelBackend
+from users.services.permission import PermissionService
+
+class CachedPermissionBackend(ModelBackend):
+  """
+  ModelBackend that reads the permissions from the snapshot of the user,
+  the permission checks don't query the database while the snapshot is cached
+  """
+
+  def get_user_permissions(self, user_obj, obj=None):
+    if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+      return set()
+    return PermissionService.get_snapshot(user_obj)['user_permissions']
+
+  def get_group_permissions(self, user_obj, obj=None):
+    if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+      return set()
+    return PermissionService.get_snapshot(user_obj)['group_permissions']
+
+  def get_all_permissions(self, user_obj, obj=None):
+    if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+      return set()
+    snapshot = PermissionService.get_snapshot(user_obj)
+    return snapshot['user_permissions'] | snapshot['group_permissions']
@@ -0,0 +1,24 @@
+"""
+Password hashers of the users, configured in PASSWORD_HASHERS (glik/settings.py)
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from authentication.services.security import Security_service
+
+def hash_password( raw_password ):
+  """
+  The hash that User.set_password stores, used by the processes of the bulk onboarding
+  """
+  return make_password(Security_service().encrypt(raw_password))
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+  """
+  PBKDF2 with the iterations of PASSWORD_HASH_ITERATIONS. The algorithm is the same as
+  the default hasher, so the existing hashes are valid and the ones with other
+  iterations are hashed again on the next login (check_password)
+  """
+
+  @property
+  def iterations(self):
+    return settings.PASSWORD_HASH_ITERATIONS
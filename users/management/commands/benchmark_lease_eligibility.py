@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from glik.constants import GROUPS, DOCUMENT_TYPES, DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE, DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE
+from users.models import User, UserDocument, get_document_types_mask
+from users.services.user import UserService
+
+class Command(BaseCommand):
+  help = 'Compare the lease eligibility with the documents walk (signed urls) and with User.document_types'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=2000, help='Customers to generate')
+    parser.add_argument('--documents', type=int, default=6, help='Documents of each customer')
+    parser.add_argument('--sample', type=int, default=100, help='Users checked one by one, their snapshots have to fit in the cache')
+
+  def handle(self, *args, **options):
+    """
+    The generated rows are discarded at the end of the benchmark. The urls of the
+    documents are signed with the storage of the settings, locally
+    """
+    with transaction.atomic():
+      prefix = self.seed(options['users'], options['documents'])
+      ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+      sample = random.sample(ids, min(options['sample'], len(ids)))
+
+      for label, check in [('documents walk', self.legacy_can_create_leases), ('document types', lambda user: user.can_create_leases)]:
+        # warm up, the first check of each user caches its permission snapshot
+        for user_id in sample:
+          check(User.objects.get(id=user_id))
+        timings, queries = [], []
+        for user_id in sample:
+          # a new instance, like the user of each request
+          user = User.objects.get(id=user_id)
+          counter = []
+          with connection.execute_wrapper(lambda execute, *args: counter.append(1) or execute(*args)):
+            start = time.perf_counter()
+            check(user)
+            timings.append((time.perf_counter() - start) * 1000)
+          queries.append(len(counter))
+        self.stdout.write(
+          f"{label:>15}: {statistics.mean(timings):7.2f} ms/user | p50 {statistics.median(timings):7.2f} ms | "
+          f"{statistics.mean(queries):.1f} queries/user"
+        )
+
+      start = time.perf_counter()
+      eligible = sum(1 for user in User.objects.filter(id__in=ids) if self.legacy_can_create_leases(user)[0])
+      loop = time.perf_counter() - start
+      start = time.perf_counter()
+      eligible_query = User.objects.filter(UserService.get_lease_eligibility_filter(), id__in=ids).count()
+      query = time.perf_counter() - start
+      self.stdout.write(f"eligible customers, loop: {loop * 1000:9.1f} ms ({eligible}) | query: {query * 1000:7.1f} ms ({eligible_query})")
+      transaction.set_rollback(True)
+
+  def seed(self, number_of_users, number_of_documents):
+    self.stdout.write(f"Generating {number_of_users} customers with {number_of_documents} documents...")
+    prefix = f"benchmark-{uuid.uuid4().hex[:6]}"
+    documents = {}
+    users = []
+    for index in range(number_of_users):
+      names = random.sample(DOCUMENT_TYPES, number_of_documents)
+      users.append(User(
+        username=f"{prefix}-{index}", email=f"{prefix}-{index}@example.com", country_user_id=f"{prefix[-6:]}{index}",
+        document_types=get_document_types_mask(names), password='',
+      ))
+      documents[users[-1].username] = names
+    User.objects.bulk_create(users, batch_size=5000)
+    User.groups.through.objects.bulk_create([ User.groups.through(user_id=user.id, group_id=GROUPS['CUSTOMER']['id']) for user in users ])
+    UserDocument.objects.bulk_create([
+      UserDocument(user=user, name=name, document=f"user_documents/{user.id}_{name}_1")
+      for user in users for name in documents[user.username]
+    ], batch_size=5000)
+    with connection.cursor() as cursor:
+      cursor.execute('ANALYZE users_user')
+      cursor.execute('ANALYZE users_userdocument')
+    return prefix
+
+  @staticmethod
+  def legacy_can_create_leases(user):
+    # a signed url for each document, including the deleted ones, and a query for the group
+    documents = { document.name: document.document.url for document in user.documents.all() }
+    def validate_document_list(document_matrix):
+      for document_group in document_matrix:
+        if not any(document in documents for document in document_group):
+          return False, "You need one of the following documents: " + ", ".join(document_group) + "."
+      return True, "Documents are valid"
+    if user.type == 'natural':
+      if not user.groups.filter(name=GROUPS['CUSTOMER']['name']).exists():
+        return False, "User is not a customer"
+      return validate_document_list(DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE)
+    return validate_document_list(DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE)
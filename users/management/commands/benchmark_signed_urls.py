@@ -0,0 +1,59 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from google.cloud.storage.blob import Blob
+from storages.backends.gcloud import GoogleCloudStorage
+
+from users.models import UserDocument
+from users.serializers import DocumentSerializer
+from utils.storages import CachedSignedURLGoogleCloudStorage
+
+class Command(BaseCommand):
+  help = 'Count the url signatures per request serializing user documents, with and without the signed url cache'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--documents', type=int, default=10, help='Documents serialized in each request')
+    parser.add_argument('--requests', type=int, default=200, help='Number of simulated requests')
+
+  def handle(self, *args, **options):
+    # The signatures are computed locally with the service account key, nothing is uploaded
+    bucket_name = settings.GS_BUCKET_NAME or 'benchmark'
+    field = UserDocument._meta.get_field('document')
+    original_storage = field.storage
+    storages = [
+      ('signed on every access', GoogleCloudStorage(bucket_name=bucket_name)),
+      ('cached signed urls', CachedSignedURLGoogleCloudStorage(bucket_name=bucket_name)),
+    ]
+
+    try:
+      for label, storage in storages:
+        field.storage = storage
+        # the documents keep the storage of the field when they are created
+        documents = [
+          UserDocument(id=index, user_id=1, name='CI', document=f"user_documents/1_CI_{index}")
+          for index in range(options['documents'])
+        ]
+        cache.delete_many([
+          CachedSignedURLGoogleCloudStorage.get_signed_url_cache_key(storage, document.document.name)
+          for document in documents
+        ])
+        signatures, elapsed = self.run_requests(documents, options['requests'])
+        self.stdout.write(
+          f"{label:>24}: {signatures / options['requests']:6.2f} signatures/request | "
+          f"{elapsed * 1000 / options['requests']:7.3f} ms/request"
+        )
+    finally:
+      field.storage = original_storage
+
+  @staticmethod
+  def run_requests(documents, number_of_requests):
+    generate_signed_url = Blob.generate_signed_url
+    with mock.patch.object(Blob, 'generate_signed_url', autospec=True, side_effect=generate_signed_url) as signer:
+      start = time.perf_counter()
+      for _ in range(number_of_requests):
+        DocumentSerializer(documents, many=True).data
+      elapsed = time.perf_counter() - start
+    return signer.call_count, elapsed
@@ -0,0 +1,56 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from glik.constants import GROUPS
+from users.serializers import UserSerializer
+from users.services.user_onboarding import UserOnboardingService
+
+class Command(BaseCommand):
+  help = 'Compare the creation of users one by one (UserSerializer) with the bulk onboarding'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=10000, help='Users of the bulk onboarding')
+    parser.add_argument('--sample', type=int, default=100, help='Users created one by one, the time is extrapolated to --users')
+    parser.add_argument('--iterations', type=int, help='PASSWORD_HASH_ITERATIONS of the run, by default the one of the settings')
+
+  def handle(self, *args, **options):
+    """
+    The users are discarded at the end of the benchmark. The password hashes take most of the
+    time, without --iterations it is the cost of the settings
+    """
+    settings = { 'PASSWORD_HASH_ITERATIONS': options['iterations'] } if options['iterations'] else {}
+    with override_settings(**settings), transaction.atomic():
+      start = time.perf_counter()
+      for row in self.get_rows(options['sample']):
+        serializer = UserSerializer(data=row)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+      one_by_one = (time.perf_counter() - start) / options['sample'] * options['users']
+
+      rows = self.get_rows(options['users'])
+      start = time.perf_counter()
+      result = UserOnboardingService.onboard_users(rows)
+      bulk = time.perf_counter() - start
+      transaction.set_rollback(True)
+
+    self.stdout.write(f"one by one: {one_by_one:8.1f} s for {options['users']} users (extrapolated from {options['sample']})")
+    self.stdout.write(
+      f"      bulk: {bulk:8.1f} s for {options['users']} users | {options['users'] / bulk:7.1f} users/s | "
+      f"{len(result.users)} created, {len(result.errors)} errors"
+    )
+
+  @staticmethod
+  def get_rows(number_of_users):
+    prefix = uuid.uuid4().hex[:6]
+    return [
+      {
+        'username': f"{prefix}-{index}", 'email': f"{prefix}-{index}@example.com", 'password': 'benchmark-password',
+        'country_user_id': f"{prefix}{index}", 'first_name': 'Juan', 'last_name': 'Pérez',
+        'groups': [GROUPS['CUSTOMER']['id']], 'customer': { 'instagram': f"@{prefix}{index}" },
+      }
+      for index in range(number_of_users)
+    ]
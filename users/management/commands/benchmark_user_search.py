@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+
+from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from glik.constants import PAGE_SIZE_DEFAULT
+from users.models import User
+from users.services.user import UserService
+
+FIRST_NAMES = ['Juan', 'María', 'José', 'Ana', 'Luis', 'Carmen', 'Carlos', 'Rosa', 'Pedro', 'Andrés', 'Gabriela', 'Jesús']
+LAST_NAMES = ['Pérez', 'González', 'Rodríguez', 'Hernández', 'García', 'Martínez', 'López', 'Díaz', 'Ramírez', 'Torres']
+QUERIES = ['maria', 'jose perez', 'gonz', 'carlos.diaz', '4567', 'V-1234', 'andres ramirez']
+
+class Command(BaseCommand):
+  help = 'Compare the admin search of users with the on the fly search vector and the stored one'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=1000000, help='Number of users to generate')
+    parser.add_argument('--repeat', type=int, default=10, help='Times each query is executed')
+
+  def handle(self, *args, **options):
+    # All the generated rows are discarded at the end of the benchmark
+    with transaction.atomic():
+      self.seed(options['users'])
+      for label, search in [('on the fly', self.legacy_search), ('stored', self.stored_search)]:
+        timings = self.measure(search, options['repeat'])
+        self.stdout.write(
+          f"{label:>10}: mean {statistics.mean(timings):8.2f} ms | "
+          f"p50 {statistics.median(timings):8.2f} ms | "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms"
+        )
+      transaction.set_rollback(True)
+
+  def seed(self, number_of_users):
+    self.stdout.write(f"Generating {number_of_users} users...")
+    prefix = f"benchmark-{int(time.time())}"
+    batch = []
+    for index in range(number_of_users):
+      first_name, last_name = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+      batch.append(User(
+        username=f"{prefix}-{index}",
+        first_name=first_name,
+        last_name=last_name,
+        email=f"{first_name.lower()}.{last_name.lower()}{index}@example.com",
+        phone_number=f"+58 4{random.randint(10, 26)}-{random.randint(1000000, 9999999)}",
+        country_user_id=f"B-{index}",
+        password='',
+      ))
+      if len(batch) == 10000:
+        User.objects.bulk_create(batch)
+        batch = []
+    User.objects.bulk_create(batch)
+    # bulk_create doesn't send post_save
+    UserService.update_search_vector(User.objects.filter(username__startswith=prefix))
+    with connection.cursor() as cursor:
+      cursor.execute('ANALYZE users_user')
+
+  def measure(self, search, repeat):
+    timings = []
+    for _ in range(repeat):
+      for query in QUERIES:
+        start = time.perf_counter()
+        queryset = search(query)
+        # same work as a page of the admin list: total count and the first page
+        queryset.count()
+        list(queryset[:PAGE_SIZE_DEFAULT])
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+  @staticmethod
+  def legacy_search(query):
+    return User.objects.annotate(
+      search=SearchVector('id', 'first_name', 'last_name', 'email', 'phone_number', 'country_user_id', config='spanish')
+    ).filter(search=SearchQuery(query, config='spanish')).order_by('-id')
+
+  @staticmethod
+  def stored_search(query):
+    return UserService.search(User.objects.all(), query).order_by('-id')
@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.services.blob import BlobService
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+  help = 'Delete the blobs of the user documents that no document references'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--interval', type=int, default=0,
+      help='Keep running and collect every this many seconds (0 collects once, for cron)',
+    )
+
+  def handle(self, *args, **options):
+    """
+    The deleted documents release their blobs, this command runs as a
+    background worker with --interval or scheduled without it
+    """
+    while True:
+      try:
+        deleted = BlobService.collect_garbage()
+        self.stdout.write(f"{deleted} unreferenced document blobs deleted")
+      except Exception:
+        if not options['interval']:
+          raise
+        # the worker keeps running, the next collection tries again
+        logger.exception("The unreferenced document blobs were not collected")
+      if not options['interval']:
+        return
+      # a worker that runs for days must not keep a broken connection
+      close_old_connections()
+      time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.services.image import ImageService
+from users.services.document import DocumentService
+
+class Command(BaseCommand):
+  help = 'Delete the direct uploads of user documents and product images that were never finalized'
+
+  def handle(self, *args, **options):
+    documents = DocumentService.delete_expired_uploads()
+    images = ImageService.delete_expired_uploads()
+    self.stdout.write(self.style.SUCCESS(f"{documents} user documents and {images} product images deleted"))
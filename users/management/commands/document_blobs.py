@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from users.models import UserDocument
+from users.services.blob import BlobService
+
+class Command(BaseCommand):
+  help = 'Show the storage saved by the blobs of the user documents'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--adopt', action='store_true',
+      help='First store as blobs the files of the documents without blob (uploaded before the blobs)',
+    )
+
+  def handle(self, *args, **options):
+    if options['adopt']:
+      adopted = 0
+      for user_document_id in UserDocument.objects.filter(blob__isnull=True, is_uploaded=True).values_list('id', flat=True).iterator():
+        try:
+          adopted += BlobService.adopt(user_document_id) is not None
+        except Exception as error:
+          self.stderr.write(f"The user document {user_document_id} was not adopted: {error}")
+      self.stdout.write(f"{adopted} user documents stored as blobs")
+
+    savings = BlobService.get_savings()
+    self.stdout.write(
+      f"{savings['documents']} documents ({savings['documents_with_blob']} with blob) | "
+      f"{savings['blobs']} blobs ({savings['unreferenced_blobs']} unreferenced) | "
+      f"referenced {savings['referenced_bytes'] / 1024 ** 2:.1f} MB | "
+      f"stored {savings['stored_bytes'] / 1024 ** 2:.1f} MB | "
+      f"saved {savings['saved_bytes'] / 1024 ** 2:.1f} MB ({savings['saved_ratio']:.1%})"
+    )
@@ -0,0 +1,47 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from glik.constants import USER_ONBOARDING_BATCH_SIZE
+from users.services.user_onboarding import UserOnboardingService
+
+class Command(BaseCommand):
+  help = 'Create the users of a json (list of users, like api/user/onboarding) or csv file'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      'path',
+      help='json or csv file, the columns of the csv are the fields of a user and groups has the ids separated by commas '
+      '("1,2"). The customer (nested) can only be given in the json',
+    )
+    parser.add_argument('--group', type=int, action='append', default=[], help='Group (id) of the users without groups')
+    parser.add_argument('--batch-size', type=int, default=USER_ONBOARDING_BATCH_SIZE, help='Users saved together')
+
+  def handle(self, *args, **options):
+    with open(options['path'], encoding='utf-8-sig') as file:
+      if options['path'].lower().endswith('.csv'):
+        rows = [ self.get_csv_user(row) for row in csv.DictReader(file) ]
+      else:
+        try:
+          rows = json.load(file)
+        except ValueError as error:
+          raise CommandError(f"Invalid json: {error}")
+    if not isinstance(rows, list):
+      raise CommandError("The json must be a list of users")
+
+    result = UserOnboardingService.onboard_users(rows, groups=options['group'], batch_size=options['batch_size'], processes=True)
+
+    for error in result.errors:
+      self.stderr.write(f"Row {error['row']}: {error['errors']}")
+    self.stdout.write(self.style.SUCCESS(f"{len(result.users)} users created, {len(result.errors)} rows with errors"))
+
+  def get_csv_user(self, row):
+    """
+    The empty cells are missing values, groups is a list of ids in the json: "1,2" is ["1", "2"]
+    (UserOnboardingSerializer validates the ids)
+    """
+    user = { key: value for key, value in row.items() if key and value not in ('', None) }
+    if 'groups' in user:
+      user['groups'] = [ group.strip() for group in user['groups'].split(',') if group.strip() ]
+    return user
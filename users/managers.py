@@ -4,3 +4,8 @@ class SoftDeleteManager(models.Manager):
   def get_queryset(self):
     return super().get_queryset().filter(is_deleted=False)
 
+class UploadedManager(SoftDeleteManager):
+  # the direct uploads are pending until the client finalizes them
+  def get_queryset(self):
+    return super().get_queryset().filter(is_uploaded=True)
+
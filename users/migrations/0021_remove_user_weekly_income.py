@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    User.weekly_income moved to Lease, but 0020 left the column NOT NULL without a default and
+    no user can be inserted. The field only leaves the state of the model: the column and its
+    values are kept and it accepts nulls. The name is the one of the migration that makemigrations
+    generated in the deploys (entrypoint.sh), so it isn't applied again where it already ran
+    """
+
+    dependencies = [
+        ('users', '0020_user_weekly_income'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE users_user ALTER COLUMN weekly_income DROP NOT NULL',
+                    migrations.RunSQL.noop,
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='user',
+                    name='weekly_income',
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_remove_user_weekly_income'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customeruser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
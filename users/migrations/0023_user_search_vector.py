@@ -0,0 +1,55 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:56
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, Value
+
+
+def fill_search_vector(apps, schema_editor):
+    """
+    Store the search document of the existing users
+    """
+    User = apps.get_model('users', 'User')
+    User.objects.update(
+        search_vector=SearchVector(Unaccent(F('first_name')), Unaccent(F('last_name')), weight='A', config='simple')
+        + SearchVector('username', 'email', Func(F('email'), Value('@.'), Value('  '), function='translate'), weight='B', config='simple')
+        + SearchVector('phone_number', 'country_user_id', 'rif', weight='B', config='simple')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_customeruser_updated_at_user_updated_at'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='user',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='user_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['country_user_id'], name='user_country_user_id_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['rif'], name='user_rif_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone_number'], name='user_phone_number_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 07:15
+
+from django.contrib.postgres.aggregates import BitOr
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+# DOCUMENT_TYPES when the field was added, the position is the bit of the type
+DOCUMENT_TYPES = [ 'CI', 'RIF', 'PASSPORT', 'DRIVER_LICENSE', 'SERVICE_STATEMENT', 'RESIDENCE_PERMIT', 'BANK_ACCOUNT_STATEMENT', 'PAYROLL', 'COMMERCIAL_REGISTER', 'CONSTITUTIVE_DOCUMENT', 'OTHER' , 'WORK_STATEMENT']
+
+
+def fill_document_types(apps, schema_editor):
+    """
+    Store the types of the undeleted documents of the existing users
+    """
+    User = apps.get_model('users', 'User')
+    UserDocument = apps.get_model('users', 'UserDocument')
+    bit = Case(
+        *[When(name=name, then=Value(1 << index)) for index, name in enumerate(DOCUMENT_TYPES)],
+        default=Value(0),
+    )
+    document_types = UserDocument.objects.filter(user=OuterRef('pk'), is_deleted=False) \
+        .values('user').annotate(document_types=BitOr(bit)).values('document_types')
+    User.objects.update(document_types=Coalesce(Subquery(document_types), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_user_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='document_types',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_document_types, migrations.RunPython.noop),
+    ]
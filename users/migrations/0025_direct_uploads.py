@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_user_document_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdocument',
+            name='is_uploaded',
+            field=models.BooleanField(default=True),
+        ),
+    ]
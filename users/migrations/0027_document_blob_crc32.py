@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0026_document_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentblob',
+            name='crc32',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
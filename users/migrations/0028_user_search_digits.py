@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2026-10-18 08:04
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0027_document_blob_crc32'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_country_user_id_trgm_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_rif_trgm_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_phone_number_trgm_idx',
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(models.Func(models.F('country_user_id'), models.Value('\\D'), models.Value(''), models.Value('g'), function='regexp_replace', output_field=models.CharField()), name='gin_trgm_ops'), name='user_id_digits_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(models.Func(models.F('rif'), models.Value('\\D'), models.Value(''), models.Value('g'), function='regexp_replace', output_field=models.CharField()), name='gin_trgm_ops'), name='user_rif_digits_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(models.Func(models.F('phone_number'), models.Value('\\D'), models.Value(''), models.Value('g'), function='regexp_replace', output_field=models.CharField()), name='gin_trgm_ops'), name='user_phone_digits_trgm_idx'),
+        ),
+    ]
@@ -1,10 +1,30 @@
 from typing import Optional
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group
+from django.contrib.auth.hashers import check_password
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from authentication.services.security import Security_service
+from users.services.permission import PermissionService
 import django.utils.timezone as timezone
-from .managers import SoftDeleteManager
-from glik.constants import DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE, DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE, USER_TYPES_OPTIONS, GROUPS
+from .managers import SoftDeleteManager, UploadedManager
+from glik.constants import DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE, DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE, USER_TYPES_OPTIONS, GROUPS, \
+    DOCUMENT_TYPES_BITS
+
+def get_document_types_mask(document_types):
+    """
+    Bits of the document types in User.document_types, the unknown types have no bit
+    """
+    return sum(DOCUMENT_TYPES_BITS.get(document_type, 0) for document_type in set(document_types))
+
+def get_digits(field):
+    """
+    Digits of a text field, the ids and phones are searched without their format: V-12.345.678 -> 12345678
+    """
+    return models.Func(
+        models.F(field), models.Value(r'\D'), models.Value(''), models.Value('g'),
+        function='regexp_replace', output_field=models.CharField(),
+    )
 
 class UserContact(models.Model):
     """
@@ -44,6 +64,21 @@ class User(AbstractUser):
     type = models.CharField(max_length=10, choices=USER_TYPES_OPTIONS, default='natural')
     # Internal fields of the model
     forgot_password_token = models.CharField(max_length=100, blank=True, null=True, unique=True, help_text="Token to reset password")
+    updated_at = models.DateTimeField(auto_now=True)
+    # Search document of the admin search, kept current by UserService.update_search_vector (users/signals.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Types of the undeleted documents of the user (bits of DOCUMENT_TYPES_BITS), kept current by
+    # DocumentService.update_document_types (users/signals.py)
+    document_types = models.IntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            GinIndex(fields=['search_vector'], name='user_search_vector_idx'),
+            # trigram indexes of the digits, used to find a part of an id number or phone
+            GinIndex(OpClass(get_digits('country_user_id'), name='gin_trgm_ops'), name='user_id_digits_trgm_idx'),
+            GinIndex(OpClass(get_digits('rif'), name='gin_trgm_ops'), name='user_rif_digits_trgm_idx'),
+            GinIndex(OpClass(get_digits('phone_number'), name='gin_trgm_ops'), name='user_phone_digits_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.username + " | " + self.get_full_name() 
@@ -52,6 +87,15 @@ class User(AbstractUser):
         security_service = Security_service()
         return super().set_password(security_service.encrypt(raw_password))
 
+    def check_password(self, raw_password: str) -> bool:
+        # The login sends the password already encrypted by Security_service, the hash is
+        # updated with it (new iterations or hasher) without encrypting it again like set_password
+        def setter(raw_password):
+            super(User, self).set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return check_password(raw_password, self.password, setter)
+
     # Partial update used in serizalizers 
     def update(self, **kwargs):
         for key, value in kwargs.items():
@@ -65,40 +109,40 @@ class User(AbstractUser):
             documents[document.name] = document.document.url
         return documents
     
-    def validate_document_list( self, documents, DOCUMENT_MATRIX ):
+    def validate_document_types( self, DOCUMENT_MATRIX ):
         for document_group in DOCUMENT_MATRIX:
-            have_one = False
-            for document in document_group:
-                if document in documents:
-                    have_one = True
-                    break
-            if not have_one:
+            if not self.document_types & get_document_types_mask(document_group):
                 return False, "You need one of the following documents: " + ", ".join(document_group) + "."
         return True, "Documents are valid"
     
+    @property
+    def group_names(self):
+        # from the permission snapshot, no queries once it is cached
+        return PermissionService.get_snapshot(self)['groups'].values()
+
     @property
     def is_admin(self):
-        return self.groups.filter(name='admin').exists()
+        return 'admin' in self.group_names
 
     @property
     def is_customer(self):
-        return self.groups.filter(name=GROUPS['CUSTOMER']['name']).exists()
+        return GROUPS['CUSTOMER']['name'] in self.group_names
     
     @property
     def can_create_leases(self):
-       documents = self.dictionary_of_documents       
+       # the documents and the groups are in the user and its permission snapshot, no queries once it is cached
        if self.type == 'natural':
             # Only customers can create leases
             if not self.is_customer: return False, "User is not a customer"
             # Validate all the documents
-            ok, message = self.validate_document_list(documents, DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE)
+            ok, message = self.validate_document_types(DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE)
             if not ok: return False, message
             # Validate all the customer information
             # null_fields = self.customer.null_fields
             # if len(null_fields) > 0: return False, "The following fields are required: " + ", ".join(null_fields.keys())
             return True, "Documents are valid"
        elif self.type == 'juridic':
-            return self.validate_document_list(documents, DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE)
+            return self.validate_document_types(DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE)
        else:
             return False, "User type is not valid"
        
@@ -119,6 +163,7 @@ class CustomerUser(models.Model):
     have_consignment = models.BooleanField(null=True)
     # Internal fields of the model
     score = models.IntegerField(default=0, help_text="Credit score")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.user.username + " | " + self.user.get_full_name()
@@ -218,6 +263,28 @@ class UserCompany(models.Model):
             ),
         ]
 
+class DocumentBlob(models.Model):
+  """
+  A file of the user documents stored once by its content (users/services/blob.py),
+  the documents with the same file reference the same blob
+  """
+  id = models.AutoField(primary_key=True)
+  sha256 = models.CharField(max_length=64, unique=True)
+  file = models.FileField(upload_to='user_documents/blobs', max_length=200)
+  size = models.BigIntegerField()
+  # checksum of the zip archives of the documents (DocumentService.get_bundle_response)
+  crc32 = models.BigIntegerField(null=True, blank=True)
+  # documents (deleted ones included) with this file, the collector deletes the blobs without documents
+  reference_count = models.IntegerField(default=0)
+  created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    indexes = [
+      # the collector only looks for the blobs without documents
+      models.Index(fields=['updated_at'], condition=models.Q(reference_count=0), name='document_blob_unreferenced_idx'),
+    ]
+
 class UserDocument(models.Model):
   id = models.AutoField(primary_key=True)
   user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents', null=False)
@@ -225,9 +292,13 @@ class UserDocument(models.Model):
   name = models.CharField(max_length=75)
   is_deleted = models.BooleanField(default=False)    
   document = models.FileField(upload_to='user_documents', null=False)
+  # False while the client uploads the file straight to the storage (DocumentService.create_upload)
+  is_uploaded = models.BooleanField(default=True)
+  # the stored file, the documents uploaded before the blobs don't have one until they are hashed
+  blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, related_name='documents', null=True, blank=True)
 
   objects = models.Manager()
-  undeleted_objects = SoftDeleteManager()
+  undeleted_objects = UploadedManager()
 
   def soft_delete(self):
     self.is_deleted = True
@@ -2,9 +2,9 @@ from rest_framework import serializers
 from users.models import UserContact, User, UserCompany, Company, Address, UserDocument, CustomerUser
 from django.contrib.auth.models import Group
 from django.db import transaction
-from glik.constants import DOCUMENT_TYPES
+from glik.constants import DOCUMENT_TYPES, USER_TYPES_OPTIONS, USER_DOCUMENT_CONTENT_TYPES, USER_DOCUMENT_MAX_SIZE
 from django.utils.translation import gettext_lazy as _
-from users.services.document import DocumentService
+from users.services.blob import BlobService
 
 # ===================== #
 #  Models Serializers   #
@@ -131,7 +131,7 @@ class UserSerializer(serializers.ModelSerializer):
 
   class Meta:
     model = User
-    fields = ('__all__')
+    exclude = ('search_vector', 'document_types')
     depth = 1
 
   # ==================== #
@@ -210,6 +210,26 @@ class UserSerializer(serializers.ModelSerializer):
     instance.delete()
     return instance
 
+class UserOnboardingSerializer(serializers.Serializer):
+  """
+  User of a bulk onboarding, it only validates the values of the user: the uniqueness
+  and the groups are validated by batch in UserOnboardingService
+  """
+  username = serializers.CharField(required=True, max_length=150)
+  email = serializers.EmailField(required=True, max_length=254)
+  password = serializers.CharField(required=True, write_only=True)
+  country_user_id = serializers.CharField(required=True, max_length=10)
+  rif = serializers.CharField(required=False, allow_null=True, max_length=10)
+  first_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+  last_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+  phone_number = serializers.CharField(required=False, allow_null=True, max_length=20)
+  passport_number = serializers.CharField(required=False, allow_null=True, max_length=100)
+  nationality = serializers.CharField(required=False, allow_null=True, max_length=100)
+  birth_date = serializers.DateTimeField(required=False, allow_null=True)
+  type = serializers.ChoiceField(required=False, choices=USER_TYPES_OPTIONS)
+  groups = serializers.ListField(required=False, child=serializers.IntegerField())
+  customer = UserCustomSerializer(many=False, required=False)
+
 # ==================== # 
 #  Other serializers   #
 # ==================== #
@@ -227,10 +247,12 @@ class DocumentSerializer(serializers.ModelSerializer):
   user = serializers.PrimaryKeyRelatedField(many=False, queryset=User.objects.all(), required=False)
   created_at = serializers.DateTimeField(read_only=True, required=False)
   is_deleted = serializers.BooleanField(required=False, default=False, read_only=True)
+  is_uploaded = serializers.BooleanField(read_only=True)
 
   class Meta:
     model = UserDocument
-    fields = ('__all__')
+    # the blobs are shared by the documents of different users
+    exclude = ('blob',)
   
   # ==================== #
   #  Custom validations  #
@@ -248,16 +270,31 @@ class DocumentSerializer(serializers.ModelSerializer):
 
   def create(self, validated_data):
     validated_data['is_deleted'] = False 
-    user_document = UserDocument(**validated_data)
+    document = validated_data.pop('document')
 
     with transaction.atomic():
-      # Create name of the document
-      user_id = validated_data['user'].id
-      user_document.document.name = DocumentService.get_internal_name( user_id, validated_data['name'] )
+      # The file is stored once by its content, a file that is already stored isn't uploaded again
+      blob = BlobService.store(document)
+      user_document = UserDocument(**validated_data, blob=blob)
+      user_document.document.name = blob.file.name
 
       user_document.save()
       return user_document
 
+class DocumentUploadSerializer(serializers.Serializer):
+  """
+  Start of a direct upload of a user document, the file goes straight to the storage
+  """
+  name = serializers.ChoiceField(choices=DOCUMENT_TYPES)
+  content_type = serializers.ChoiceField(choices=list(USER_DOCUMENT_CONTENT_TYPES))
+  size = serializers.IntegerField(min_value=1, max_value=USER_DOCUMENT_MAX_SIZE)
+
+class DocumentFinalizeSerializer(serializers.Serializer):
+  """
+  Confirmation of a direct upload, replaces is the id of the document that the new one replaces
+  """
+  replaces = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+
 class GroupSerializer(serializers.ModelSerializer):
   class Meta:
     model = Group
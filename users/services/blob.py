@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q, Count, Sum, Exists, OuterRef
+from django.utils import timezone
+from users.models import DocumentBlob, UserDocument
+from glik.constants import DOCUMENT_BLOB_GC_GRACE_SECONDS, DOCUMENT_BLOB_GC_BATCH_SIZE, DOCUMENT_BLOB_WORKERS
+
+# Hashing a direct upload reads it back from the bucket, it is done out of the request
+executor = ThreadPoolExecutor(max_workers=DOCUMENT_BLOB_WORKERS, thread_name_prefix='document-blobs')
+logger = logging.getLogger(__name__)
+
+class BlobService:
+  """
+  The files of the user documents are stored once by their content (sha256), the documents
+  with the same file reference the same blob. DocumentBlob.reference_count is the number of
+  documents of a blob, the deleted documents release it and the collector deletes the blobs
+  that nothing references
+  """
+
+  def get_storage():
+    return DocumentBlob._meta.get_field('file').storage
+
+  def get_blob_name(sha256, name=''):
+    """
+    user_documents/blobs/3f/3f1b...c2.pdf, the extension of the first upload gives the content type of the object
+    """
+    extension = os.path.splitext(name)[1].lower()
+    return f"user_documents/blobs/{sha256[:2]}/{sha256}{extension}"
+
+  def get_checksums(file):
+    """
+    The sha256 and the crc32 of the content, read once by chunks
+    """
+    sha256, crc32 = hashlib.sha256(), 0
+    file.seek(0)
+    for chunk in file.chunks():
+      sha256.update(chunk)
+      crc32 = zlib.crc32(chunk, crc32)
+    file.seek(0)
+    return sha256.hexdigest(), crc32
+
+  def reference(sha256, crc32, size, save_file):
+    """
+    Adds a document to the blob of the content. save_file stores the content
+    and returns its name, it is only called when the content isn't stored
+    """
+    storage = BlobService.get_storage()
+    with transaction.atomic():
+      # the lock keeps the collector from deleting the blob that gets a new document
+      blob = DocumentBlob.objects.select_for_update().filter(sha256=sha256).first()
+      if blob is None:
+        try:
+          with transaction.atomic():
+            blob = DocumentBlob(sha256=sha256, crc32=crc32, size=size, reference_count=1)
+            blob.file.name = save_file()
+            blob.save()
+            return blob
+        except IntegrityError:
+          # the same content was stored at the same time
+          blob = DocumentBlob.objects.select_for_update().get(sha256=sha256)
+
+      if blob.reference_count <= 0 and not storage.exists(blob.file.name):
+        # the collector deleted the object but not the row
+        blob.file.name = save_file()
+      if blob.crc32 is None:
+        blob.crc32 = crc32
+      blob.reference_count = F('reference_count') + 1
+      blob.save(update_fields=['file', 'crc32', 'reference_count', 'updated_at'])
+      blob.refresh_from_db(fields=['reference_count'])
+      return blob
+
+  def store(file):
+    """
+    This method is used to store an uploaded file, the upload handlers hashed it
+    while it was received (utils/uploads.py). A file that is already stored isn't
+    uploaded again
+    """
+    if getattr(file, 'sha256', None):
+      sha256, crc32 = file.sha256, file.crc32
+    else:
+      sha256, crc32 = BlobService.get_checksums(file)
+    storage = BlobService.get_storage()
+    name = BlobService.get_blob_name(sha256, file.name)
+
+    def save_file():
+      # an object left by a failed transaction has the same content
+      if storage.exists(name):
+        return name
+      file.seek(0)
+      return storage.save(name, file)
+    return BlobService.reference(sha256, crc32, file.size, save_file)
+
+  def release(blob_id):
+    """
+    A document of the blob was deleted, the blob without documents is deleted by the collector
+    """
+    DocumentBlob.objects.filter(id=blob_id).update(reference_count=F('reference_count') - 1, updated_at=timezone.now())
+
+  # =================== #
+  #  Uploaded objects   #
+  # =================== #
+
+  def adopt(user_document_id):
+    """
+    This method is used to store the file of a document without blob (the direct uploads and the
+    documents uploaded before the blobs) as a blob. The object is hashed from the storage, when the
+    content is already stored the document references that blob and its own object is deleted
+    """
+    user_document = UserDocument.objects.filter(id=user_document_id, blob__isnull=True, is_uploaded=True).first()
+    if user_document is None:
+      return None
+    name = user_document.document.name
+    storage = user_document.document.storage
+    with storage.open(name, 'rb') as file:
+      sha256, crc32 = BlobService.get_checksums(file)
+      size = file.size
+
+    with transaction.atomic():
+      # the document could be adopted or deleted while it was hashed
+      if not UserDocument.objects.select_for_update().filter(id=user_document_id, blob__isnull=True).exists():
+        return None
+      blob = BlobService.reference(sha256, crc32, size, lambda: name)
+      UserDocument.objects.filter(id=user_document_id).update(document=blob.file.name, blob=blob)
+      if blob.file.name != name and not UserDocument.objects.filter(document=name).exists():
+        transaction.on_commit(lambda: storage.delete(name))
+    return blob
+
+  def adopt_in_background(user_document_id):
+    def adopt():
+      try:
+        BlobService.adopt(user_document_id)
+      except Exception:
+        # the documents without blob can be adopted again with document_blobs --adopt
+        logger.exception("The file of the user document %s was not stored as a blob", user_document_id)
+      finally:
+        close_old_connections()
+    executor.submit(adopt)
+
+  def schedule_adopt(user_document_id):
+    """
+    The document is adopted in a thread of the pool once it is committed, the request doesn't wait for it
+    """
+    transaction.on_commit(lambda: BlobService.adopt_in_background(user_document_id))
+
+  # ====================== #
+  #  Garbage collection    #
+  # ====================== #
+
+  def collect_garbage(batch_size=DOCUMENT_BLOB_GC_BATCH_SIZE):
+    """
+    Deletes the blobs without documents and their objects, it returns how many.
+    The blobs are kept a while after their last document is deleted, a new upload of the
+    same content reuses them. The rows are locked, so a blob that gets a document isn't deleted.
+    The count is only trusted with the documents: a wrong count never deletes a referenced file
+    """
+    deleted = 0
+    failed_ids = []
+    storage = BlobService.get_storage()
+    while True:
+      with transaction.atomic():
+        blobs = list(DocumentBlob.objects.select_for_update(skip_locked=True).filter(
+          ~Exists(UserDocument.objects.filter(blob=OuterRef('pk'))),
+          reference_count__lte=0, updated_at__lte=timezone.now() - timedelta(seconds=DOCUMENT_BLOB_GC_GRACE_SECONDS),
+        ).exclude(id__in=failed_ids).order_by('id')[:batch_size])
+        if not blobs:
+          return deleted
+        # the objects first: a blob row without object is stored again by the next upload (BlobService.reference)
+        deleted_ids = []
+        for blob in blobs:
+          try:
+            storage.delete(blob.file.name)
+            deleted_ids.append(blob.id)
+          except Exception:
+            # the blob is kept, the next collection tries again
+            logger.exception("The object %s of the document blob %s was not deleted", blob.file.name, blob.id)
+            failed_ids.append(blob.id)
+        DocumentBlob.objects.filter(id__in=deleted_ids).delete()
+        deleted += len(deleted_ids)
+
+  # =========== #
+  #  Metrics    #
+  # =========== #
+
+  def get_savings():
+    """
+    Storage used by the documents: the bytes of their files and the bytes stored once by content
+    """
+    documents = UserDocument.objects.aggregate(
+      documents=Count('id'), documents_with_blob=Count('blob_id'), referenced_bytes=Sum('blob__size', default=0),
+    )
+    blobs = DocumentBlob.objects.aggregate(
+      blobs=Count('id'), stored_bytes=Sum('size', default=0),
+      unreferenced_blobs=Count('id', filter=Q(reference_count__lte=0)),
+    )
+    saved_bytes = documents['referenced_bytes'] - blobs['stored_bytes']
+    return {
+      **documents,
+      **blobs,
+      'saved_bytes': saved_bytes,
+      'saved_ratio': saved_bytes / documents['referenced_bytes'] if documents['referenced_bytes'] else 0,
+    }
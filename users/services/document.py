@@ -1,11 +1,133 @@
-from users.models import UserDocument 
+import os
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from users.models import User, UserDocument, get_document_types_mask
+from users.services.blob import BlobService
+from authentication.services.token import TokenService
+from exceptions.custom_exception import CustomException
+from utils.etag import get_version_etag
+from utils.zipstream import ZipEntry, get_zip_response
+from utils.storages import has_file_signature
+from glik.constants import USER_DOCUMENT_CONTENT_TYPES, USER_DOCUMENT_MAX_SIZE, DIRECT_UPLOAD_SECONDS, DIRECT_UPLOAD_PENDING_SECONDS
 
 class DocumentService:
-  def get_last_user_doc( user, document_type ):
-    last_user_doc = UserDocument.undeleted_objects.filter(user=user).order_by('-created_at') .first()
-    return last_user_doc if last_user_doc else None
-  
-  def get_internal_name( user_id, document_type ):
-    last_user_doc = DocumentService.get_last_user_doc( user_id, document_type )    
-    last_user_doc_number = int(last_user_doc.document.name.split('_')[-1]) if last_user_doc else 0    
-    return str(user_id) + "_" + document_type + "_" + str(last_user_doc_number + 1)
\ No newline at end of file
+  def get_internal_name( user_id, document_type, extension='' ):
+    # unique, the object of a document can be the file of a blob that other documents still reference
+    return str(user_id) + "_" + document_type + "_" + uuid.uuid4().hex[:16] + extension
+
+  def update_document_types( user_id ):
+    """
+    This method is used to store the types of the undeleted documents of the user (User.document_types).
+    The user is locked first, so the documents read are the ones of the transactions
+    that updated it before, two uploads at the same time don't lose a type.
+    The update doesn't send post_save, the cached user of its tokens is invalidated here
+    """
+    with transaction.atomic():
+      if not User.objects.select_for_update().filter(id=user_id).exists():
+        return
+      document_types = UserDocument.undeleted_objects.filter(user_id=user_id).values_list('name', flat=True).distinct()
+      User.objects.filter(id=user_id).update(document_types=get_document_types_mask(document_types))
+      TokenService.invalidate_user(user_id)
+
+  # ================ #
+  #  Direct uploads  #
+  # ================ #
+
+  def create_upload( user_id, document_type, content_type, size ):
+    """
+    This method is used to create a pending document and the session where the client
+    uploads its file straight to the storage, the document counts once it is finalized
+    """
+    storage = UserDocument._meta.get_field('document').storage
+    user_document = UserDocument(user_id=user_id, name=document_type, is_uploaded=False)
+    # the extension of the content type, the downloads and the archives of the documents keep it
+    extension = USER_DOCUMENT_CONTENT_TYPES[content_type]
+    user_document.document.name = 'user_documents/' + DocumentService.get_internal_name(user_id, document_type, extension)
+    user_document.save()
+    return {
+      'id': user_document.id,
+      'upload': storage.get_upload_session(user_document.document.name, content_type, size),
+      'expires_at': timezone.now() + timedelta(seconds=DIRECT_UPLOAD_SECONDS),
+    }
+
+  def finalize_upload( user_document, replaced_document=None ):
+    """
+    This method is used to confirm the file of a pending document, the
+    replaced document is deleted once the new one is uploaded. The file
+    is stored as a blob in the background (BlobService.adopt)
+    """
+    if user_document.is_uploaded:
+      return user_document
+    storage = user_document.document.storage
+    size = storage.finalize_upload(user_document.document.name)
+    if size is None:
+      raise CustomException(message="The file of the document wasn't uploaded", status_code=409)
+    if size > USER_DOCUMENT_MAX_SIZE:
+      storage.delete(user_document.document.name)
+      user_document.delete()
+      raise CustomException(message=f"The file of the document is larger than {USER_DOCUMENT_MAX_SIZE} bytes", status_code=400)
+    if not has_file_signature(storage, user_document.document.name):
+      storage.delete(user_document.document.name)
+      user_document.delete()
+      raise CustomException(message="The file of the document isn't of its content type", status_code=400)
+
+    with transaction.atomic():
+      if replaced_document is not None:
+        replaced_document.soft_delete()
+      user_document.is_uploaded = True
+      user_document.save(update_fields=['is_uploaded'])
+      BlobService.schedule_adopt(user_document.id)
+    return user_document
+
+  def delete_expired_uploads():
+    """
+    Deletes the pending documents that weren't finalized in time and their files, it returns how many
+    """
+    expired = UserDocument.objects.filter(is_uploaded=False, blob__isnull=True, created_at__lte=timezone.now() - timedelta(seconds=DIRECT_UPLOAD_PENDING_SECONDS))
+    deleted = 0
+    for user_document in expired.iterator():
+      user_document.document.delete(save=False)
+      user_document.delete()
+      deleted += 1
+    return deleted
+
+  # =========== #
+  #  Bundles    #
+  # =========== #
+
+  def get_bundle_entries( user_documents, folders=False ):
+    """
+    Files of the zip archive of the documents: CI_12.pdf, or johndoe/CI_12.pdf with folders.
+    The documents with blob have their size and crc32, the others are asked to the storage
+    """
+    entries = []
+    for user_document in user_documents:
+      extension = os.path.splitext(user_document.document.name)[1].lower()
+      name = f"{user_document.name}_{user_document.id}{extension}"
+      if folders:
+        name = f"{user_document.user.username}/{name}"
+      storage = user_document.document.storage
+      blob = user_document.blob
+      entries.append(ZipEntry(
+        name, storage, user_document.document.name,
+        blob.size if blob else storage.size(user_document.document.name),
+        crc32=blob.crc32 if blob else None,
+        modified=user_document.created_at,
+      ))
+    return entries
+
+  def get_bundle_response( request, user_documents, file_name, folders=False ):
+    """
+    This method is used to send the undeleted documents as a zip archive, it is
+    built while it is sent and the downloads can be resumed (utils/zipstream.py)
+    """
+    user_documents = list(user_documents.select_related('blob', 'user').order_by('user_id', 'name', 'id'))
+    if not user_documents:
+      raise CustomException(message="There are no documents", status_code=404)
+    etag = get_version_etag(*[
+      (user_document.id, user_document.document.name, user_document.blob.sha256 if user_document.blob else None)
+      for user_document in user_documents
+    ])
+    return get_zip_response(request, DocumentService.get_bundle_entries(user_documents, folders), file_name, etag)
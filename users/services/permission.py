@@ -0,0 +1,51 @@
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from utils.cache import get_cache_version, bump_cache_version
+from glik.constants import PERMISSIONS_CACHE_NAMESPACE, PERMISSIONS_CACHE_SECONDS
+
+class PermissionService:
+
+  def get_user_namespace(user_id):
+    return f"{PERMISSIONS_CACHE_NAMESPACE}:user:{user_id}"
+
+  def get_snapshot_key(user):
+    # the join date tells apart the users of a database that was created again with the same ids
+    return (
+      f"{PERMISSIONS_CACHE_NAMESPACE}:{get_cache_version(PERMISSIONS_CACHE_NAMESPACE)}:"
+      f"{user.id}:{user.date_joined.timestamp()}:{get_cache_version(PermissionService.get_user_namespace(user.id))}"
+    )
+
+  def get_snapshot(user):
+    """
+    This method returns the groups ({id: name}) and the permissions ("app_label.codename")
+    of the user. It is loaded once per request (kept in the user of the request) and
+    cached across requests until the groups or the permissions change (users/signals.py)
+    """
+    snapshot = getattr(user, '_permission_snapshot', None)
+    if snapshot is None:
+      key = PermissionService.get_snapshot_key(user)
+      snapshot = cache.get(key)
+      if snapshot is None:
+        snapshot = PermissionService.load_snapshot(user)
+        cache.set(key, snapshot, PERMISSIONS_CACHE_SECONDS)
+      user._permission_snapshot = snapshot
+    return snapshot
+
+  def load_snapshot(user):
+    def get_names(permissions):
+      return { f"{app_label}.{codename}" for app_label, codename in permissions.values_list('content_type__app_label', 'codename') }
+
+    # the superusers have all the permissions, like in ModelBackend
+    user_permissions = Permission.objects.all() if user.is_superuser else Permission.objects.filter(user=user)
+    group_permissions = Permission.objects.all() if user.is_superuser else Permission.objects.filter(group__user=user)
+    return {
+      'groups': dict(user.groups.values_list('id', 'name')),
+      'user_permissions': get_names(user_permissions),
+      'group_permissions': get_names(group_permissions),
+    }
+
+  def invalidate_user(user_id):
+    bump_cache_version(PermissionService.get_user_namespace(user_id))
+
+  def invalidate_all():
+    bump_cache_version(PERMISSIONS_CACHE_NAMESPACE)
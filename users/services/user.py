@@ -0,0 +1,75 @@
+import re
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.db.models import F, Q, Value, Func, Exists, OuterRef
+from django.db.models.lookups import GreaterThan, Contains
+from users.models import User, get_document_types_mask, get_digits
+from glik.constants import USER_SEARCH_ID_MIN_DIGITS, GROUPS, DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE, \
+    DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE
+
+# Fields of the user that are part of the search document
+USER_SEARCH_FIELDS = ('first_name', 'last_name', 'username', 'email', 'phone_number', 'country_user_id', 'rif')
+
+# An identification number, with or without its letter: V-12.345.678, 12345678, J-4123, or a phone: +58 (412) 555-0001
+ID_SEARCH = re.compile(r'[A-Za-z+]?[-\s.()\d]*\d[-\s.()\d]*')
+
+class UserService:
+
+  def get_search_document():
+    """
+    Search document of a user, the names weigh more than the contact and identification fields.
+    The 'simple' config doesn't stem, so the names and the numbers are kept as they are written
+    """
+    # the parts of the email are also words: juan.perez@mail.com -> juan perez mail com
+    email_words = Func(F('email'), Value('@.'), Value('  '), function='translate')
+    return SearchVector(Unaccent(F('first_name')), Unaccent(F('last_name')), weight='A', config='simple') \
+      + SearchVector('username', 'email', email_words, weight='B', config='simple') \
+      + SearchVector('phone_number', 'country_user_id', 'rif', weight='B', config='simple')
+
+  def update_search_vector(queryset):
+    """
+    This method is used to store the search document of the users in the queryset
+    """
+    return queryset.update(search_vector=UserService.get_search_document())
+
+  def search(queryset, search_param):
+    """
+    This method is used to filter the users with the stored search document, every word
+    of the search is a prefix (juan per -> juan:* & per:*). The searches that look like
+    an identification number also match a part of the ids and the phone: only their digits
+    are compared (V-12.345 finds V-12345678), with the trigram indexes of the digits
+    """
+    words = re.findall(r'[^\W_]+', search_param)
+    if not words:
+      return queryset.none()
+    query = SearchQuery(Unaccent(Value(' & '.join(f"{word}:*" for word in words))), config='simple', search_type='raw')
+    search_filter = Q(search_vector=query)
+
+    search_param = search_param.strip()
+    digits = re.sub(r'\D', '', search_param)
+    if ID_SEARCH.fullmatch(search_param) and len(digits) >= USER_SEARCH_ID_MIN_DIGITS:
+      for field in ('country_user_id', 'rif', 'phone_number'):
+        search_filter |= Q(Contains(get_digits(field), digits))
+    return queryset.filter(search_filter)
+
+  def get_documents_filter(document_matrix):
+    """
+    The users with one of the documents of each group of the matrix (User.document_types)
+    """
+    documents_filter = Q()
+    for document_group in document_matrix:
+      documents_filter &= Q(GreaterThan(F('document_types').bitand(get_document_types_mask(document_group)), 0))
+    return documents_filter
+
+  def get_lease_eligibility_filter():
+    """
+    This method is used to filter the users that can create leases, the same rules
+    as User.can_create_leases: the natural users are customers with the documents of
+    a personal lease and the juridic users have the documents of a juridic lease
+    """
+    is_customer = Exists(User.groups.through.objects.filter(user=OuterRef('pk'), group_id=GROUPS['CUSTOMER']['id']))
+    return (
+      Q(is_customer, type='natural') & UserService.get_documents_filter(DOCUMENTS_NEEDED_FOR_PERSONAL_LEASE)
+    ) | (
+      Q(type='juridic') & UserService.get_documents_filter(DOCUMENTS_NEEDED_FOR_JURIDIC_LEASE)
+    )
@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.models import Group
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+from users.hashers import hash_password
+from users.models import User, CustomerUser, UserContact
+from users.serializers import UserOnboardingSerializer
+from users.services.user import UserService
+from glik.constants import USER_ONBOARDING_BATCH_SIZE, PASSWORD_HASHING_WORKERS
+
+# Unique fields of the users, validated with one query for all the rows, and their errors
+USER_ONBOARDING_UNIQUE_FIELDS = {
+  'username': 'Username already exists',
+  'email': 'Email already exists',
+  'country_user_id': 'country_user_id already exists',
+  'rif': 'rif already exists',
+}
+
+class UserOnboardingResult:
+  """
+  Summary of an onboarding, the created users and the errors are by row number (position in the list)
+  """
+  def __init__(self):
+    self.users = []
+    self.errors = []
+
+  def add_user(self, row_number, user_id):
+    self.users.append({ 'row': row_number, 'id': user_id })
+
+  def add_error(self, row_number, errors):
+    self.errors.append({ 'row': row_number, 'errors': errors })
+
+  def get_structure(self):
+    return {
+      'created': len(self.users),
+      'failed': len(self.errors),
+      'users': sorted(self.users, key=lambda user: user['row']),
+      'errors': sorted(self.errors, key=lambda error: error['row']),
+    }
+
+class UserOnboardingService:
+
+  def onboard_users(rows, groups=None, batch_size=USER_ONBOARDING_BATCH_SIZE, processes=False):
+    """
+    This method is used to create the users of a list (customers or the employees of a company),
+    the rows with errors are reported and skipped, the others are saved.
+    The groups are the ones of the rows that don't have groups. With processes the
+    passwords are hashed in a process for each core (onboard_users command), not in a request
+    """
+    result = UserOnboardingResult()
+    # one serializer validates all the rows, creating its fields for each row is the slowest part
+    serializer = UserOnboardingSerializer()
+    valid = []
+    for row_number, row in enumerate(rows, start=1):
+      if not isinstance(row, dict):
+        result.add_error(row_number, { 'row': ['Invalid row'] })
+        continue
+      try:
+        data = serializer.run_validation(row)
+      except serializers.ValidationError as error:
+        result.add_error(row_number, error.detail)
+        continue
+      if 'groups' not in data:
+        data['groups'] = list(groups or [])
+      valid.append((row_number, data))
+
+    valid = UserOnboardingService.validate_uniqueness(valid, result)
+    passwords = UserOnboardingService.hash_passwords([ data.pop('password') for _, data in valid ], processes)
+    for (_, data), password in zip(valid, passwords):
+      data['password'] = password
+
+    for start in range(0, len(valid), batch_size):
+      UserOnboardingService.save_users(valid[start:start + batch_size], result)
+    return result
+
+  def validate_uniqueness(rows, result):
+    """
+    Validates the unique fields and the groups of all the rows with one query each,
+    it returns the rows without errors
+    """
+    values = { field: { data[field] for _, data in rows if data.get(field) } for field in USER_ONBOARDING_UNIQUE_FIELDS }
+    existing = { field: set() for field in USER_ONBOARDING_UNIQUE_FIELDS }
+    users_filter = Q()
+    for field in USER_ONBOARDING_UNIQUE_FIELDS:
+      users_filter |= Q(**{ f'{field}__in': values[field] })
+    for user in User.objects.filter(users_filter).values_list(*USER_ONBOARDING_UNIQUE_FIELDS.keys()):
+      for field, value in zip(USER_ONBOARDING_UNIQUE_FIELDS, user):
+        existing[field].add(value)
+    group_ids = set(Group.objects.filter(id__in={ group for _, data in rows for group in data['groups'] }).values_list('id', flat=True))
+
+    valid = []
+    seen = { field: set() for field in USER_ONBOARDING_UNIQUE_FIELDS }
+    for row_number, data in rows:
+      errors = {}
+      for field in USER_ONBOARDING_UNIQUE_FIELDS:
+        value = data.get(field)
+        if not value:
+          continue
+        if value in seen[field]:
+          errors[field] = ['Repeated in the list']
+        elif value in existing[field]:
+          errors[field] = [USER_ONBOARDING_UNIQUE_FIELDS[field]]
+      missing_groups = set(data['groups']) - group_ids
+      if missing_groups:
+        errors['groups'] = [f'Group {group} not found' for group in sorted(missing_groups)]
+      if errors:
+        result.add_error(row_number, errors)
+        continue
+
+      for field in USER_ONBOARDING_UNIQUE_FIELDS:
+        if data.get(field):
+          seen[field].add(data[field])
+      valid.append((row_number, data))
+    return valid
+
+  def hash_passwords(passwords, processes=False):
+    """
+    The hashes are the slowest part of the onboarding, with processes they are made in a process for each core
+    """
+    workers = PASSWORD_HASHING_WORKERS or os.cpu_count()
+    if not processes or workers == 1 or len(passwords) < 2:
+      return [ hash_password(password) for password in passwords ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      return list(executor.map(hash_password, passwords, chunksize=max(len(passwords) // (workers * 4), 1)))
+
+  def save_users(rows, result):
+    """
+    Saves the users of the rows with their groups and customer information with one insert
+    each. A conflict with a user created after the validation fails the batch, then the rows
+    are saved one by one to find it
+    """
+    if not rows:
+      return
+    try:
+      with transaction.atomic():
+        users = UserOnboardingService.create_users([ data for _, data in rows ])
+    except IntegrityError:
+      if len(rows) == 1:
+        result.add_error(rows[0][0], { 'row': ['The user conflicts with an existing one'] })
+        return
+      for row in rows:
+        UserOnboardingService.save_users([row], result)
+      return
+
+    for (row_number, _), user in zip(rows, users):
+      result.add_user(row_number, user.id)
+
+  def create_users(rows):
+    """
+    bulk_create doesn't send post_save or m2m_changed: the search document is updated here
+    and the new users don't have a permission snapshot to invalidate yet
+    """
+    users = User.objects.bulk_create([
+      User(**{ key: value for key, value in data.items() if key not in ('groups', 'customer') }, is_active=True)
+      for data in rows
+    ])
+    User.groups.through.objects.bulk_create([
+      User.groups.through(user_id=user.id, group_id=group)
+      for user, data in zip(users, rows) for group in set(data['groups'])
+    ])
+
+    customers = [ (user, dict(data['customer'])) for user, data in zip(users, rows) if 'customer' in data ]
+    contacts = UserContact.objects.bulk_create([
+      UserContact(**customer['contact_user_reference']) for _, customer in customers if 'contact_user_reference' in customer
+    ])
+    contacts = iter(contacts)
+    for user, customer in customers:
+      customer.pop('user', None)
+      customer['score'] = 0
+      if 'contact_user_reference' in customer:
+        customer['contact_user_reference'] = next(contacts)
+    CustomerUser.objects.bulk_create([ CustomerUser(user=user, **customer) for user, customer in customers ])
+
+    UserService.update_search_vector(User.objects.filter(id__in=[ user.id for user in users ]))
+    return users
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from users.models import User, UserDocument
+from users.services.user import UserService, USER_SEARCH_FIELDS
+from users.services.permission import PermissionService
+from users.services.document import DocumentService
+from users.services.blob import BlobService
+
+@receiver(post_save, sender=User)
+def update_user_search_vector(sender, instance, update_fields=None, **kwargs):
+  """
+  The search document is computed by postgres from the saved row, the saves
+  of other fields (last_login on each login) don't update it
+  """
+  if update_fields is None or set(update_fields) & set(USER_SEARCH_FIELDS):
+    UserService.update_search_vector(User.objects.filter(id=instance.id))
+
+@receiver(post_save, sender=UserDocument)
+@receiver(post_delete, sender=UserDocument)
+def update_user_document_types(sender, instance, **kwargs):
+  """
+  A document was created, soft deleted (saved with is_deleted) or restored
+  """
+  DocumentService.update_document_types(instance.user_id)
+
+@receiver(post_delete, sender=UserDocument)
+def release_user_document_blob(sender, instance, **kwargs):
+  """
+  The soft deleted documents keep their file, only the deleted rows release the blob
+  """
+  if instance.blob_id:
+    BlobService.release(instance.blob_id)
+
+# ======================== #
+#  Permission snapshots    #
+# ======================== #
+
+@receiver(post_save, sender=User)
+def invalidate_superuser_permissions(sender, instance, created, update_fields=None, **kwargs):
+  # the superusers have all the permissions in their snapshot
+  if not created and (update_fields is None or 'is_superuser' in update_fields):
+    PermissionService.invalidate_user(instance.id)
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+  """
+  The groups or the permissions of users changed: user.groups.add(group)
+  or, from the other side, group.user_set.add(user)
+  """
+  if not action.startswith('post_'):
+    return
+  if not reverse:
+    # the snapshot kept in the user of this request is outdated too
+    instance.__dict__.pop('_permission_snapshot', None)
+    PermissionService.invalidate_user(instance.id)
+  elif pk_set:
+    for user_id in pk_set:
+      PermissionService.invalidate_user(user_id)
+  else:
+    # group.user_set.clear() doesn't say which users it removed
+    PermissionService.invalidate_all()
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_permissions(sender, **kwargs):
+  """
+  The permissions or the name of a group changed, every snapshot could include it
+  """
+  if kwargs.get('action', 'post_').startswith('post_'):
+    PermissionService.invalidate_all()
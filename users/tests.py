@@ -1,6 +1,25 @@
-from django.test import TestCase
+import csv
+import io
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlparse
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
+from storages.backends.gcloud import GoogleCloudStorage
+from users.models import User, UserDocument, DocumentBlob
+from users.services.blob import BlobService
+from users.services.user import UserService
+from users.services.user_onboarding import UserOnboardingService
+from utils.storages import CachedSignedURLGoogleCloudStorage
+from glik.constants import GROUPS, DOCUMENT_TYPES_BITS, SIGNED_URL_CACHE_MARGIN_SECONDS, USER_ONBOARDING_MAX_USERS
 
 class TestCustomer(TestCase):
   user_data = {
@@ -56,4 +75,414 @@ class TestCustomer(TestCase):
       "web_page": "https://www.company.com"      
     }
     response = client.post(f"/api/user/company", data=company_data, format="json", **self.header)
-    self.assertEqual(response.status_code, 201)
\ No newline at end of file
+    self.assertEqual(response.status_code, 201)
+
+class TestSelfUser(TestCase):
+  def test_not_modified_until_the_user_changes(self):
+    user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    client = APIClient()
+    client.force_authenticate(user)
+    etag = client.get("/api/user/self")["ETag"]
+    self.assertEqual(client.get("/api/user/self", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    user.first_name = "John"
+    user.save()
+    response = client.get("/api/user/self", HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()["data"]["firstName"], "John")
+
+class TestUserSearch(TestCase):
+  def setUp(self):
+    self.admin = User.objects.create(username="admin", email="admin@example.com", country_user_id="V-1", is_superuser=True)
+    User.objects.create(
+      username="jperez", first_name="Juan", last_name="Pérez", email="juan.perez@example.com",
+      country_user_id="V-27182818", phone_number="+58 412-5550001"
+    )
+    User.objects.create(
+      username="mgonzalez", first_name="María", last_name="González", email="maria@example.com",
+      country_user_id="E-87654321", rif="J-40001234"
+    )
+
+  def search(self, search):
+    client = APIClient()
+    client.force_authenticate(self.admin)
+    response = client.get("/api/user/all", {"search": search, "ordering": "username"})
+    self.assertEqual(response.status_code, 200)
+    return [user["username"] for user in response.data["data"]["results"]]
+
+  def test_search_by_name_prefix_and_email(self):
+    self.assertEqual(self.search("juan per"), ["jperez"])
+    self.assertEqual(self.search("Maria gonz"), ["mgonzalez"])
+    self.assertEqual(self.search("juan.perez@example.com"), ["jperez"])
+
+  def test_search_by_part_of_the_id(self):
+    self.assertEqual(self.search("182818"), ["jperez"])
+    self.assertEqual(self.search("V-27.182.818"), ["jperez"])
+    self.assertEqual(self.search("4000123"), ["mgonzalez"])
+    self.assertEqual(self.search("5550001"), ["jperez"])
+    # the format of the search and of the stored values are ignored
+    self.assertEqual(self.search("412-555 0001"), ["jperez"])
+    self.assertEqual(self.search("+58 412 555"), ["jperez"])
+
+  def test_search_follows_updates(self):
+    user = User.objects.get(username="jperez")
+    user.last_name = "Rodríguez"
+    user.save()
+    self.assertEqual(self.search("rodriguez"), ["jperez"])
+
+  def test_stream_csv_only_with_stream_param(self):
+    client = APIClient()
+    client.force_authenticate(self.admin)
+    response = client.get("/api/user/all", {"format": "csv", "stream": 1, "ordering": "username"})
+    lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+    self.assertIn("countryUserId", lines[0])
+    self.assertNotIn("password", lines[0])
+    self.assertEqual(len(lines), User.objects.count() + 1)
+    # the pages are only json
+    response = client.get("/api/user/all", {"format": "csv"})
+    self.assertEqual((response.status_code, response["Content-Type"]), (400, "application/json"))
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestPermissionSnapshot(TestCase):
+  def setUp(self):
+    cache.clear()
+    # the groups of the migrations are created with their ids, the sequence is behind
+    self.group = Group.objects.create(id=100, name="sellers")
+    self.group.permissions.add(Permission.objects.get(codename="view_user"))
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.user.groups.add(self.group, Group.objects.get(name=GROUPS['CUSTOMER']['name']))
+
+  def get_user(self):
+    # a new instance, like the user of each request
+    return User.objects.get(id=self.user.id)
+
+  def test_permissions_are_cached_across_requests(self):
+    self.assertTrue(self.get_user().has_perm("users.view_user"))
+    user = self.get_user()
+    with self.assertNumQueries(0):
+      self.assertTrue(user.has_perm("users.view_user"))
+      self.assertFalse(user.has_perm("users.delete_user"))
+      self.assertTrue(user.is_customer)
+      self.assertFalse(user.is_admin)
+
+  def test_changes_of_groups_invalidate_the_snapshot(self):
+    self.assertTrue(self.get_user().has_perm("users.view_user"))
+    with self.captureOnCommitCallbacks(execute=True):
+      self.group.permissions.clear()
+    self.assertFalse(self.get_user().has_perm("users.view_user"))
+
+    with self.captureOnCommitCallbacks(execute=True):
+      self.group.permissions.add(Permission.objects.get(codename="view_user"))
+    self.assertTrue(self.get_user().has_perm("users.view_user"))
+
+    with self.captureOnCommitCallbacks(execute=True):
+      self.user.groups.remove(self.group)
+    self.assertFalse(self.get_user().has_perm("users.view_user"))
+
+class TestUserOnboarding(TestCase):
+  def setUp(self):
+    self.admin = User.objects.create(username="admin", email="admin@example.com", country_user_id="V-1", is_superuser=True)
+    self.client = APIClient()
+    self.client.force_authenticate(self.admin)
+
+  def test_onboard_users(self):
+    users = [
+      {"username": "jperez", "email": "juan@example.com", "password": "secret", "countryUserId": "V-2", "firstName": "Juan",
+       "customer": {"instagram": "@jperez", "contactUserReference": {
+         "name": "Ana", "phoneNumber": "1", "email": "ana@example.com", "address": "Home", "relationship": "Mother"}}},
+      {"username": "mgonzalez", "email": "maria@example.com", "password": "secret", "countryUserId": "V-3", "groups": [1]},
+      # already exists, repeated in the list and invalid
+      {"username": "admin", "email": "other@example.com", "password": "secret", "countryUserId": "V-4"},
+      {"username": "jperez2", "email": "juan@example.com", "password": "secret", "countryUserId": "V-5"},
+      {"username": "nopassword", "email": "nopassword@example.com", "countryUserId": "V-6"},
+    ]
+    response = self.client.post("/api/user/onboarding", {"users": users, "groups": [GROUPS['CUSTOMER']['id']]}, format="json")
+    self.assertEqual(response.status_code, 200)
+    data = response.json()["data"]
+    self.assertEqual((data["created"], data["failed"]), (2, 3))
+    self.assertEqual([error["row"] for error in data["errors"]], [3, 4, 5])
+    self.assertIn("username", data["errors"][0]["errors"])
+    self.assertIn("email", data["errors"][1]["errors"])
+    self.assertIn("password", data["errors"][2]["errors"])
+
+    juan = User.objects.get(username="jperez")
+    self.assertEqual(juan.customer.contact_user_reference.name, "Ana")
+    self.assertEqual(list(juan.groups.values_list("name", flat=True)), [GROUPS['CUSTOMER']['name']])
+    self.assertEqual(list(User.objects.get(username="mgonzalez").groups.values_list("id", flat=True)), [1])
+    # the same password as set_password and the search document
+    self.assertEqual(self.client.post("/api/auth/login", {"username": "jperez", "password": "secret"}, format="json").status_code, 200)
+    self.assertEqual(UserService.search(User.objects.all(), "juan").get(), juan)
+
+  def test_onboard_requests_are_limited(self):
+    users = [ {"username": f"user{index}", "email": f"user{index}@example.com", "password": "secret", "countryUserId": f"V-{index + 10}"}
+              for index in range(USER_ONBOARDING_MAX_USERS + 1) ]
+    with mock.patch.object(UserOnboardingService, "hash_passwords") as hash_passwords:
+      response = self.client.post("/api/user/onboarding", {"users": users}, format="json")
+    self.assertEqual(response.status_code, 400)
+    hash_passwords.assert_not_called()
+
+  def test_onboard_users_from_csv(self):
+    path = Path(tempfile.mkdtemp()) / "users.csv"
+    path.write_text(
+      "username,email,password,country_user_id,groups\n"
+      f"jperez,juan@example.com,secret,V-2,\"{GROUPS['CUSTOMER']['id']}, 1\"\n"
+      "mgonzalez,maria@example.com,secret,V-3,\n"
+    )
+    call_command("onboard_users", str(path), "--group", str(GROUPS['CUSTOMER']['id']), stdout=io.StringIO())
+    self.assertEqual(set(User.objects.get(username="jperez").groups.values_list("id", flat=True)), {GROUPS['CUSTOMER']['id'], 1})
+    # the users without groups get the ones of --group
+    self.assertEqual(list(User.objects.get(username="mgonzalez").groups.values_list("id", flat=True)), [GROUPS['CUSTOMER']['id']])
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestLeaseEligibility(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.admin = User.objects.create(username="admin", email="admin@example.com", country_user_id="V-1", is_superuser=True)
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-2")
+    self.user.groups.add(GROUPS['CUSTOMER']['id'])
+
+  def add_documents(self, *names):
+    return [ UserDocument.objects.create(user=self.user, name=name, document=f"user_documents/{name}") for name in names ]
+
+  def get_eligible(self):
+    client = APIClient()
+    client.force_authenticate(self.admin)
+    response = client.get("/api/user/all", {"eligible": "true"})
+    return [user["username"] for user in response.data["data"]["results"]]
+
+  def test_documents_and_eligibility(self):
+    ci, *_ = self.add_documents("CI", "RIF", "SERVICE_STATEMENT")
+    user = User.objects.get(id=self.user.id)
+    self.assertEqual(user.can_create_leases, (False, "You need one of the following documents: WORK_STATEMENT."))
+    self.assertEqual(self.get_eligible(), [])
+
+    self.add_documents("WORK_STATEMENT")
+    user = User.objects.get(id=self.user.id)
+    self.assertEqual(user.can_create_leases[0], True)
+    self.assertEqual(self.get_eligible(), ["johndoe"])
+    # one cheap lookup, the groups are in the cached permission snapshot
+    user = User.objects.get(id=self.user.id)
+    with self.assertNumQueries(0):
+      self.assertEqual(user.can_create_leases[0], True)
+
+    # a passport replaces the soft deleted id card
+    ci.soft_delete()
+    self.assertFalse(User.objects.get(id=self.user.id).can_create_leases[0])
+    self.add_documents("PASSPORT")
+    self.assertEqual(self.get_eligible(), ["johndoe"])
+
+@override_settings(STORAGES={
+  # the local storage stands in for the bucket, the client writes the file in the path of the session
+  "default": {"BACKEND": "utils.storages.FileSystemDirectUploadStorage", "OPTIONS": {"location": tempfile.mkdtemp()}},
+  "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class TestDocumentDirectUpload(TestCase):
+  def setUp(self):
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+
+  def upload(self, name, content=b"%PDF-1.4"):
+    response = self.client.post("/api/user/document/upload", {"name": name, "contentType": "application/pdf", "size": len(content)}, format="json")
+    self.assertEqual(response.status_code, 201)
+    upload = response.json()["data"]
+    Path(urlparse(upload["upload"]["url"]).path).write_bytes(content)
+    return upload["id"]
+
+  def test_upload_and_finalize(self):
+    ci = self.upload("CI")
+    # pending until it is finalized
+    self.assertEqual(self.client.get("/api/user/document/all").json()["data"], [])
+    response = self.client.post(f"/api/user/document/{ci}/finalize")
+    self.assertEqual(response.status_code, 200)
+    name = response.json()["data"]["document"].split("/")[-1]
+    self.assertTrue(name.startswith(f"{self.user.id}_CI_") and name.endswith(".pdf"))
+    self.assertEqual(User.objects.get(id=self.user.id).document_types, DOCUMENT_TYPES_BITS["CI"])
+
+    # the passport replaces the id card
+    passport = self.upload("PASSPORT")
+    self.assertEqual(self.client.post(f"/api/user/document/{passport}/finalize", {"replaces": ci}, format="json").status_code, 200)
+    self.assertEqual([document["name"] for document in self.client.get("/api/user/document/all").json()["data"]], ["PASSPORT"])
+    self.assertEqual(User.objects.get(id=self.user.id).document_types, DOCUMENT_TYPES_BITS["PASSPORT"])
+
+  def test_not_uploaded_or_too_large(self):
+    response = self.client.post("/api/user/document/upload", {"name": "CI", "contentType": "application/pdf", "size": 1}, format="json")
+    self.assertEqual(self.client.post(f"/api/user/document/{response.json()['data']['id']}/finalize").status_code, 409)
+
+    with mock.patch("users.services.document.USER_DOCUMENT_MAX_SIZE", 4):
+      document = self.upload("CI")
+      self.assertEqual(self.client.post(f"/api/user/document/{document}/finalize").status_code, 400)
+    self.assertFalse(UserDocument.objects.filter(id=document).exists())
+
+  def test_content_of_another_type(self):
+    document = self.upload("CI", b"<html>")
+    self.assertEqual(self.client.post(f"/api/user/document/{document}/finalize").status_code, 400)
+    self.assertFalse(UserDocument.objects.filter(id=document).exists())
+
+  def test_invalid_replaces(self):
+    document = self.upload("CI")
+    for replaces in ([1], {"id": 1}, "ci"):
+      response = self.client.post(f"/api/user/document/{document}/finalize", {"replaces": replaces}, format="json")
+      self.assertEqual(response.status_code, 400)
+    self.assertFalse(UserDocument.objects.get(id=document).is_uploaded)
+
+@override_settings(STORAGES={
+  "default": {"BACKEND": "utils.storages.FileSystemDirectUploadStorage", "OPTIONS": {"location": tempfile.mkdtemp()}},
+  "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class TestDocumentBlobs(TestCase):
+  def setUp(self):
+    self.users = [ User.objects.create(username=f"user{index}", email=f"user{index}@example.com", country_user_id=f"V-{index}") for index in range(2) ]
+
+  def post_document(self, user, name, content):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post("/api/user/document/all", {"name": name, "document": SimpleUploadedFile("scan.PDF", content)}, format="multipart")
+    self.assertEqual(response.status_code, 201)
+    self.assertNotIn("blob", response.json()["data"])
+    return UserDocument.objects.get(id=response.json()["data"]["id"])
+
+  def test_same_content_is_stored_once(self):
+    first = self.post_document(self.users[0], "CI", b"%PDF-1.4 id card")
+    second = self.post_document(self.users[1], "RIF", b"%PDF-1.4 id card")
+    other = self.post_document(self.users[1], "CI", b"%PDF-1.4 another id card")
+
+    blob = DocumentBlob.objects.get(documents=first)
+    self.assertEqual((second.blob_id, blob.reference_count, blob.size), (blob.id, 2, 16))
+    self.assertEqual(first.document.name, second.document.name)
+    self.assertTrue(first.document.name.endswith(".pdf"))
+    self.assertNotEqual(other.document.name, first.document.name)
+    savings = BlobService.get_savings()
+    self.assertEqual((savings["blobs"], savings["referenced_bytes"], savings["saved_bytes"]), (2, 56, 16))
+
+    # the soft deleted documents keep the blob, the deleted rows release it
+    first.soft_delete()
+    self.assertEqual(DocumentBlob.objects.get(id=blob.id).reference_count, 2)
+    first.delete()
+    second.delete()
+    self.assertEqual(DocumentBlob.objects.get(id=blob.id).reference_count, 0)
+    with mock.patch("users.services.blob.DOCUMENT_BLOB_GC_GRACE_SECONDS", 0):
+      self.assertEqual(BlobService.collect_garbage(), 1)
+    self.assertFalse(blob.file.storage.exists(blob.file.name))
+    self.assertTrue(other.document.storage.exists(other.document.name))
+
+  def test_collector_keeps_referenced_blobs(self):
+    document = self.post_document(self.users[0], "CI", b"%PDF-1.4 id card")
+    other = self.post_document(self.users[1], "CI", b"%PDF-1.4 another id card")
+    # a count that went wrong doesn't delete the file of a document
+    DocumentBlob.objects.update(reference_count=0)
+    storage = BlobService.get_storage()
+    delete = storage.delete
+    def delete_or_fail(name):
+      if name == other.document.name:
+        raise IOError("The storage is not available")
+      delete(name)
+    with mock.patch("users.services.blob.DOCUMENT_BLOB_GC_GRACE_SECONDS", 0), \
+      mock.patch.object(storage, "delete", side_effect=delete_or_fail):
+      self.assertEqual(BlobService.collect_garbage(), 0)
+      document.delete()
+      other.delete()
+      # the object that failed is kept for the next collection
+      with self.assertLogs("users.services.blob", "ERROR"):
+        self.assertEqual(BlobService.collect_garbage(), 1)
+    self.assertEqual(list(DocumentBlob.objects.values_list("sha256", flat=True)), [other.blob.sha256])
+
+  def test_direct_upload_is_adopted(self):
+    stored = self.post_document(self.users[0], "CI", b"%PDF-1.4 id card")
+    client = APIClient()
+    client.force_authenticate(self.users[1])
+    upload = client.post("/api/user/document/upload", {"name": "CI", "contentType": "application/pdf", "size": 16}, format="json").json()["data"]
+    uploaded_path = Path(urlparse(upload["upload"]["url"]).path)
+    uploaded_path.write_bytes(b"%PDF-1.4 id card")
+
+    # the thread of the pool doesn't see the test transaction
+    with mock.patch.object(BlobService, "adopt_in_background", BlobService.adopt), self.captureOnCommitCallbacks(execute=True):
+      self.assertEqual(client.post(f"/api/user/document/{upload['id']}/finalize").status_code, 200)
+    document = UserDocument.objects.get(id=upload["id"])
+    self.assertEqual((document.blob_id, document.document.name), (stored.blob_id, stored.document.name))
+    self.assertEqual(DocumentBlob.objects.get(id=stored.blob_id).reference_count, 2)
+    self.assertFalse(uploaded_path.exists())
+
+@override_settings(STORAGES={
+  "default": {"BACKEND": "utils.storages.FileSystemDirectUploadStorage", "OPTIONS": {"location": tempfile.mkdtemp()}},
+  "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class TestDocumentBundle(TestCase):
+  def setUp(self):
+    self.user = User.objects.create(username="johndoe", email="johndoe@example.com", country_user_id="V-1")
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+    self.contents = {"CI": b"%PDF-1.4 id card" * 1000, "RIF": b"%PDF-1.4 rif"}
+    self.documents = {}
+    for name, content in self.contents.items():
+      response = self.client.post("/api/user/document/all", {"name": name, "document": SimpleUploadedFile("scan.pdf", content)}, format="multipart")
+      self.documents[name] = response.json()["data"]["id"]
+    UserDocument.objects.get(id=self.documents["RIF"]).soft_delete()
+    self.url = f"/api/user/{self.user.id}/document/bundle"
+
+  def read_archive(self, response):
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+    self.assertIsNone(archive.testzip())
+    return { info.filename: archive.read(info) for info in archive.infolist() }
+
+  def test_bundle_and_ranges(self):
+    response = self.client.get(self.url)
+    self.assertEqual((response.status_code, response["Accept-Ranges"]), (200, "bytes"))
+    content = b"".join(response.streaming_content)
+    self.assertEqual(int(response["Content-Length"]), len(content))
+    self.assertEqual(self.read_archive(self.client.get(self.url)), {f"CI_{self.documents['CI']}.pdf": self.contents["CI"]})
+
+    # a resumed download
+    response = self.client.get(self.url, HTTP_RANGE="bytes=100-", HTTP_IF_RANGE=response["ETag"])
+    self.assertEqual((response.status_code, response["Content-Range"]), (206, f"bytes 100-{len(content) - 1}/{len(content)}"))
+    self.assertEqual(b"".join(response.streaming_content), content[100:])
+    self.assertEqual(b"".join(self.client.get(self.url, HTTP_RANGE="bytes=-30").streaming_content), content[-30:])
+    # the documents changed
+    self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=100-", HTTP_IF_RANGE='"old"').status_code, 200)
+    self.assertEqual(self.client.get(self.url, HTTP_RANGE=f"bytes={len(content)}-").status_code, 416)
+
+    other = User.objects.create(username="other", email="other@example.com", country_user_id="V-2")
+    self.client.force_authenticate(other)
+    self.assertEqual(self.client.get(self.url).status_code, 403)
+
+  def test_bundle_without_checksums(self):
+    # a direct upload that wasn't stored as a blob yet: its crc32 is written after its data
+    upload = self.client.post("/api/user/document/upload", {"name": "PASSPORT", "contentType": "application/pdf", "size": 13}, format="json").json()["data"]
+    Path(urlparse(upload["upload"]["url"]).path).write_bytes(b"%PDF-passport")
+    self.client.post(f"/api/user/document/{upload['id']}/finalize")
+
+    response = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+    self.assertEqual((response.status_code, response["Accept-Ranges"]), (200, "none"))
+    self.assertEqual(self.read_archive(response), {
+      f"CI_{self.documents['CI']}.pdf": self.contents["CI"],
+      f"PASSPORT_{upload['id']}.pdf": b"%PDF-passport",
+    })
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestSignedURLCache(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.storage = CachedSignedURLGoogleCloudStorage(bucket_name="documents", expiration=timedelta(minutes=5))
+    self.name = "user_documents/1_CI_0123456789abcdef.pdf"
+
+  def test_urls_are_signed_once_until_the_file_is_deleted(self):
+    urls = (f"https://storage.googleapis.com/documents/{self.name}?X-Goog-Signature={index}" for index in range(3))
+    with mock.patch.object(GoogleCloudStorage, "url", side_effect=lambda name, parameters=None: next(urls)) as url, \
+      mock.patch.object(GoogleCloudStorage, "delete"), mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+      first = self.storage.url(self.name)
+      self.assertEqual(self.storage.url(self.name), first)
+      self.assertEqual(url.call_count, 1)
+      # cached until SIGNED_URL_CACHE_MARGIN_SECONDS before the url expires
+      cache_set.assert_called_once_with(self.storage.get_signed_url_cache_key(self.name), first, 5 * 60 - SIGNED_URL_CACHE_MARGIN_SECONDS)
+
+      self.storage.delete(self.name)
+      self.assertIsNone(cache.get(self.storage.get_signed_url_cache_key(self.name)))
+      self.assertNotEqual(self.storage.url(self.name), first)
+      self.assertEqual(url.call_count, 2)
+
+  def test_urls_with_parameters_are_not_cached(self):
+    with mock.patch.object(GoogleCloudStorage, "url", return_value="https://storage.googleapis.com/signed") as url:
+      self.storage.url(self.name, {"response_disposition": "attachment"})
+      self.storage.url(self.name, {"response_disposition": "attachment"})
+    self.assertEqual(url.call_count, 2)
+    self.assertIsNone(cache.get(self.storage.get_signed_url_cache_key(self.name)))
@@ -8,12 +8,16 @@ from . import views
 urlpatterns = [    
     path('<int:id>', views.UserView.as_view()),    
     path('all', views.UserAllView.as_view()),    
+    path('onboarding', views.UserOnboardingView.as_view()),
     path('self', views.SelfUserView.as_view()),
     path('company', views.UserCompanyView.as_view()),
     path('address/<int:id>', views.UserAddressView.as_view()),
     path('address/all', views.UserAddressAllView.as_view()),
     path('document/<int:id>', views.UserDocumentView.as_view()),
     path('document/all', views.UserDocumentAllView.as_view()),    
+    path('document/upload', views.UserDocumentUploadView.as_view()),
+    path('document/<int:id>/finalize', views.UserDocumentFinalizeView.as_view()),
+    path('<int:id>/document/bundle', views.UserDocumentBundleView.as_view()),
     path('group', views.GroupView.as_view()),
 ]
 
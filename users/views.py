@@ -2,18 +2,25 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from utils.api_response import get_failed_response, get_successful_response, get_paginated_queryset, \
     get_paginated_response_structure
+from utils.streaming import STREAM_RENDERER_CLASSES, is_stream_request, get_stream_response
+from utils.zipstream import ZIP_RENDERER_CLASSES
 from rest_framework import status
-from users.serializers import UserSerializer, UserCompanySerializer, AddressSerializer, DocumentSerializer, GroupSerializer
+from users.serializers import UserSerializer, UserCompanySerializer, AddressSerializer, DocumentSerializer, GroupSerializer, \
+    DocumentUploadSerializer, DocumentFinalizeSerializer
 from authentication.models import User
 from django.contrib.auth.models import Group
-from django.contrib.postgres.search import SearchVector, SearchQuery
 from django.db.models import Q, F, Count
 from rest_framework.permissions import IsAuthenticated
 from users.permissions import UserViewPermission, GroupViewPermission, UserAllViewPermission
 from notifications.services.email import send_email_to_user
-from glik.constants import GROUPS
+from glik.constants import GROUPS, USER_ONBOARDING_MAX_USERS
 from django.db import transaction
-from users.models import UserDocument, Address
+from users.models import UserDocument, Address, CustomerUser
+from users.services.user import UserService
+from users.services.user_onboarding import UserOnboardingService
+from users.services.permission import PermissionService
+from users.services.document import DocumentService
+from utils.etag import get_conditional_successful_response, get_version_etag
 from django.utils.translation import gettext as _
 
 # ================= #
@@ -81,6 +88,7 @@ class UserView(APIView):
 
 class UserAllView(APIView):
   permission_classes = [IsAuthenticated, UserAllViewPermission]
+  renderer_classes = STREAM_RENDERER_CLASSES
 
   def post(self, request):    
     """
@@ -99,23 +107,23 @@ class UserAllView(APIView):
   def get(self, request):
     """
     This method is used to get all the users with 
-    - pagination
+    - pagination (page number, or keyset pagination with ?cursor=)
     - ordering
-    - filtering 
+    - filtering (?eligible=true, the users that can create leases)
     - searching (full text search)
+    - export, with ?format=ndjson|csv&stream=1 all the rows are streamed
     """
     queryset = self.get_filtered_queryset(request)
     ordering = self.get_ordering(request)
 
     search_param = request.query_params.get('search', None)
+    query_object = User.objects.filter(queryset)
     if search_param:
-      query_object = User.objects.annotate(
-          search=SearchVector('id', 'first_name', 'last_name', 'email', 'phone_number', 'CI', config='spanish')
-      ).filter(queryset).filter(search=SearchQuery(search_param, config='spanish'))
-    else:
-      query_object = User.objects.filter(queryset)
+      query_object = UserService.search(query_object, search_param)
 
     users = query_object.order_by(ordering)
+    if is_stream_request(request):
+      return get_stream_response(request, users, UserSerializer, 'users')
     page_object = get_paginated_queryset(request, users)
     serialized_data = UserSerializer(page_object.object_list, many=True).data
     response = get_paginated_response_structure(page_object, serialized_data)
@@ -126,6 +134,10 @@ class UserAllView(APIView):
   def get_filtered_queryset(request):
       queryset = Q()
 
+      # customers that can create leases
+      if request.query_params.get('eligible', '').lower() in ('1', 'true'):
+        queryset.add(UserService.get_lease_eligibility_filter(), Q.AND)
+
       # state_param = request.query_params.getlist('state', [])
       # if state_param and len(state_param) > 0:
       #     queryset.add(Q(current_state__in=state_param), Q.AND)
@@ -162,15 +174,51 @@ class UserAllView(APIView):
 
         return default_ordering
 
+class UserOnboardingView(APIView):
+  permission_classes = [IsAuthenticated, UserAllViewPermission]
+
+  def post(self, request):
+    """
+    This method is used to create many users at once (customers or the employees of a company),
+    the rows with errors are reported by row number and the rest are saved.
+    - users: list of users, with the fields of a user, groups (ids) and customer
+    - groups: groups (ids) of the users without groups
+    The passwords are hashed in the request, the lists of more than USER_ONBOARDING_MAX_USERS
+    users are onboarded with the onboard_users command
+    """
+    users = request.data.get('users', None)
+    if not isinstance(users, list) or not users:
+      return get_failed_response(message=_("users must be a list of users"))
+    if len(users) > USER_ONBOARDING_MAX_USERS:
+      return get_failed_response(message=_("At most %(max)s users can be created at once, use the onboard_users command for more") % { 'max': USER_ONBOARDING_MAX_USERS })
+    groups = request.data.get('groups', None) or []
+    if not isinstance(groups, list) or not all(isinstance(group, int) for group in groups):
+      return get_failed_response(message=_("groups must be a list of ids"))
+
+    result = UserOnboardingService.onboard_users(users, groups=groups)
+    return get_successful_response(message=_("Users onboarded"), data=result.get_structure())
+
 class SelfUserView(APIView):
   permission_classes = [IsAuthenticated]
   def get(self, request):
     """
-    This method is used to get the user in the authentication token
+    This method is used to get the user in the authentication token (If-None-Match returns 304)
     """
     user = request.user
-    user_serializer = UserSerializer(user)
-    return get_successful_response(data=user_serializer.data, message=_("User information"))
+    return get_conditional_successful_response(
+      request, self.get_user_etag(user), lambda: UserSerializer(user).data, message=_("User information")
+    )
+
+  @staticmethod
+  def get_user_etag(user):
+    """
+    The ETag is made from the versions of the rows in the serialized user,
+    so it is computed without serializing or querying the groups
+    """
+    customer = CustomerUser.objects.filter(user=user).values_list('id', 'updated_at', 'contact_user_reference_id').first()
+    # the key of the permission snapshot changes with the groups and permissions of the user
+    permissions = PermissionService.get_snapshot_key(user)
+    return get_version_etag(user.id, user.updated_at, customer, permissions)
 
 # ================ #
 #  document views  #
@@ -252,6 +300,61 @@ class UserDocumentAllView(APIView):
     user_documents_serializer = DocumentSerializer(user_documents, many=True)
     return get_successful_response(data=user_documents_serializer.data, message=_("User documents information"))
 
+class UserDocumentUploadView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request):
+    """
+    This method is used to start the direct upload of a user document, the client uploads
+    the file to the storage with the session of the response and then finalizes it
+    - name: type of the document
+    - contentType and size of the file
+    """
+    serializer = DocumentUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+      return get_failed_response(errors=serializer.errors, message=_("Validation error"))
+
+    upload = DocumentService.create_upload(
+      request.user.id, serializer.validated_data['name'], serializer.validated_data['content_type'], serializer.validated_data['size'],
+    )
+    return get_successful_response(data=upload, message=_("User document upload started"), status_code=status.HTTP_201_CREATED)
+
+class UserDocumentFinalizeView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request, id):
+    """
+    This method is used to confirm the direct upload of a user document
+    - replaces: id of the document that the new one replaces, it is deleted
+    """
+    serializer = DocumentFinalizeSerializer(data=request.data)
+    if not serializer.is_valid():
+      return get_failed_response(errors=serializer.errors, message=_("Validation error"))
+
+    try:
+      user_document = UserDocument.objects.get(id=id, user=request.user, is_deleted=False)
+      replaced_document = None
+      if serializer.validated_data.get('replaces', None):
+        replaced_document = UserDocument.undeleted_objects.get(id=serializer.validated_data['replaces'], user=request.user)
+    except UserDocument.DoesNotExist:
+      return get_failed_response(message=_("User document not found"), status_code=status.HTTP_404_NOT_FOUND)
+
+    user_document = DocumentService.finalize_upload(user_document, replaced_document)
+    return get_successful_response(data=DocumentSerializer(user_document).data, message=_("User document information created successfully"))
+
+class UserDocumentBundleView(APIView):
+  permission_classes = [IsAuthenticated, UserViewPermission]
+  renderer_classes = ZIP_RENDERER_CLASSES
+
+  def get(self, request, id):
+    """
+    This method is used to download the undeleted documents of the user as a zip archive,
+    the Range header resumes a download
+    """
+    if not User.objects.filter(id=id).exists():
+      return get_failed_response(message=_("User not found"), status_code=status.HTTP_404_NOT_FOUND)
+    return DocumentService.get_bundle_response(request, UserDocument.undeleted_objects.filter(user_id=id), f"user-{id}-documents")
+
 # ================ #
 #  address views   #
 # ================ #
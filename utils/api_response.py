@@ -1,19 +1,38 @@
 from django.core.paginator import Page, Paginator
 from rest_framework import status
 from rest_framework.response import Response
-from glik.constants import PAGE_SIZE_DEFAULT, REQUEST_SUCCESSFUL, REQUEST_UNSUCCESSFUL
+from glik.constants import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, REQUEST_SUCCESSFUL, REQUEST_UNSUCCESSFUL
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from utils.cursor_pagination import CursorPage, get_cursor_page
 
 def get_page_params(request):
+  """
+  The page size is limited to PAGE_SIZE_MAX, an invalid page size uses the default
+  """
   page = request.GET.get('page', 1)
-  page_size = request.GET.get('page_size', PAGE_SIZE_DEFAULT)
+  try:
+    page_size = int(request.GET.get('page_size', PAGE_SIZE_DEFAULT))
+  except ValueError:
+    page_size = PAGE_SIZE_DEFAULT
 
-  return page, page_size
+  return page, min(max(page_size, 1), PAGE_SIZE_MAX)
+
+
+def is_cursor_pagination(request):
+  """
+  The cursor pagination is used when the cursor param is sent, empty for the first page
+  Example: /api/lease/all?cursor=&page_size=20
+  """
+  return 'cursor' in request.GET
 
 
 def get_paginated_queryset(request, queryset):
   page, page_size = get_page_params(request)
+
+  if is_cursor_pagination(request):
+    return get_cursor_page(queryset, request.GET.get('cursor'), page_size)
+
   paginator = Paginator(queryset, page_size)
   page_object = paginator.get_page(page)
 
@@ -21,6 +40,15 @@ def get_paginated_queryset(request, queryset):
 
 
 def get_paginated_response_structure(page_object, serialized_data):
+  if isinstance(page_object, CursorPage):
+    # The cursor pagination doesn't count the elements
+    return {
+        'page_size': page_object.page_size,
+        'next_cursor': page_object.next_cursor,
+        'previous_cursor': page_object.previous_cursor,
+        'results': serialized_data,
+    }
+
   response_structure = {
       'current_page': page_object.number,
       'page_size': page_object.paginator.per_page,
@@ -0,0 +1,96 @@
+"""
+Versioned cache of responses. Each namespace has a version number in the cache,
+the keys include it, so a write only has to increase the version to invalidate
+every response of the namespace (the old entries expire by themselves).
+"""
+
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from glik.constants import CACHE_BUILD_LOCK_SECONDS, CACHE_BUILD_POLL_SECONDS
+from utils.etag import get_content_etag
+
+def get_version_key(namespace):
+  return f"{namespace}:version"
+
+def get_cache_version(namespace):
+  key = get_version_key(namespace)
+  version = cache.get(key)
+  if version is None:
+    # the version starts from the clock, so an evicted version never reuses old entries
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    version = cache.get(key)
+  return version
+
+def bump_cache_version(namespace):
+  """
+  Invalidates the cached responses of the namespace once the current transaction
+  is committed, before that the readers would cache the old data with the new version
+  """
+  def bump():
+    key = get_version_key(namespace)
+    try:
+      cache.incr(key)
+      # some backends set the default timeout when they increase a value
+      cache.touch(key, None)
+    except ValueError:
+      cache.add(key, int(time.time() * 1000), timeout=None)
+  transaction.on_commit(bump)
+
+def get_request_cache_key(namespace, request, *args):
+  """
+  Key of the response of a request, the query params are sorted so the
+  same query in a different order has the same key
+  """
+  params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+  digest = hashlib.sha256(repr((args, params)).encode('utf-8')).hexdigest()
+  return f"{namespace}:{get_cache_version(namespace)}:{digest}"
+
+def get_or_build(key, build, timeout, is_cacheable=None):
+  """
+  Returns the cached value of the key or builds it. Only one worker builds a
+  missing value, the others wait for it instead of hitting the database at the same time.
+  is_cacheable(value) is False for the values that are returned but not cached (incomplete ones)
+  """
+  def set_value(value):
+    if is_cacheable is None or is_cacheable(value):
+      cache.set(key, value, timeout)
+
+  value = cache.get(key)
+  if value is not None:
+    return value
+
+  lock_key = f"{key}:lock"
+  if cache.add(lock_key, 1, CACHE_BUILD_LOCK_SECONDS):
+    try:
+      value = build()
+      set_value(value)
+    finally:
+      cache.delete(lock_key)
+    return value
+
+  deadline = time.monotonic() + CACHE_BUILD_LOCK_SECONDS
+  while time.monotonic() < deadline:
+    time.sleep(CACHE_BUILD_POLL_SECONDS)
+    value = cache.get(key)
+    if value is not None:
+      return value
+    # the builder failed, build it here
+    if cache.get(lock_key) is None:
+      break
+
+  value = build()
+  set_value(value)
+  return value
+
+def get_or_build_with_etag(key, build, timeout, is_cacheable=None):
+  """
+  Same as get_or_build, the value is {'etag': ..., 'data': ...} so the
+  ETag of the data is computed once, when the data is built. is_cacheable gets the data
+  """
+  def build_with_etag():
+    data = build()
+    return { 'etag': get_content_etag(data), 'data': data }
+  cacheable = None if is_cacheable is None else lambda value: is_cacheable(value['data'])
+  return get_or_build(key, build_with_etag, timeout, cacheable)
@@ -0,0 +1,142 @@
+"""
+Keyset (cursor) pagination, the page is located with a filter over the values
+of the ordering fields of the last row instead of COUNT and OFFSET, so the
+cost of a page doesn't depend on how deep it is.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import status
+from exceptions.custom_exception import CustomException
+
+NEXT = 'next'
+PREVIOUS = 'previous'
+
+class CursorPage:
+  """
+  Page of a cursor pagination, it has the same object_list attribute
+  of the django Page so the views serialize both in the same way
+  """
+  def __init__(self, object_list, page_size, next_cursor, previous_cursor):
+    self.object_list = object_list
+    self.page_size = page_size
+    self.next_cursor = next_cursor
+    self.previous_cursor = previous_cursor
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+  """
+  DjangoJSONEncoder truncates the datetimes to milliseconds, the rows of the same millisecond
+  would be skipped or repeated. The cursors keep the microseconds (DateTimeField.to_python reads them)
+  """
+  def default(self, o):
+    if isinstance(o, (datetime.datetime, datetime.time)):
+      return o.isoformat()
+    return super().default(o)
+
+def encode_cursor(values, direction):
+  payload = json.dumps({'v': values, 'd': direction}, cls=CursorJSONEncoder, separators=(',', ':'))
+  return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+  try:
+    padding = '=' * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    values, direction = payload['v'], payload['d']
+  except (binascii.Error, ValueError, TypeError, KeyError):
+    raise CustomException("Invalid cursor", status.HTTP_400_BAD_REQUEST)
+  if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+    raise CustomException("Invalid cursor", status.HTTP_400_BAD_REQUEST)
+  return values, direction
+
+def get_cursor_ordering(queryset):
+  """
+  Returns the ordering of the queryset as (column, is descending, field) tuples,
+  the primary key is added at the end to make the position of each row unique
+  """
+  model = queryset.model
+  ordering = []
+  for order in queryset.query.order_by:
+    descending = order.startswith('-')
+    name = order.lstrip('-')
+    try:
+      field = model._meta.get_field(name)
+      # the foreign keys are ordered by their column
+      name = field.attname
+    except FieldDoesNotExist:
+      field = None  # annotation, for example the rank of a search
+    if name == 'pk':
+      name = model._meta.pk.attname
+    ordering.append((name, descending, field))
+
+  if not any(name == model._meta.pk.attname for name, _, _ in ordering):
+    last_descending = ordering[-1][1] if ordering else True
+    ordering.append((model._meta.pk.attname, last_descending, model._meta.pk))
+  return ordering
+
+def get_keyset_filter(ordering, values, reverse):
+  """
+  Filter of the rows after the position given by values in the ordering,
+  the nulls are placed as postgres does: last in ascending order and first in descending order
+  """
+  keyset = Q(pk__in=[])
+  equal = Q()
+  for (name, descending, _), value in zip(ordering, values):
+    descending = descending != reverse
+    if value is None:
+      after = Q(**{name + '__isnull': False}) if descending else Q(pk__in=[])
+      same = Q(**{name + '__isnull': True})
+    else:
+      after = Q(**{name + ('__lt' if descending else '__gt'): value})
+      if not descending:
+        after |= Q(**{name + '__isnull': True})
+      same = Q(**{name: value})
+    keyset |= equal & after
+    equal &= same
+  return keyset
+
+def get_cursor_values(row, ordering):
+  return [ getattr(row, name) for name, _, _ in ordering ]
+
+def parse_cursor_values(values, ordering):
+  if len(values) != len(ordering):
+    raise CustomException("Invalid cursor", status.HTTP_400_BAD_REQUEST)
+  try:
+    return [
+      field.to_python(value) if field is not None and value is not None else value
+      for (_, _, field), value in zip(ordering, values)
+    ]
+  except ValidationError:
+    raise CustomException("Invalid cursor", status.HTTP_400_BAD_REQUEST)
+
+def get_cursor_page(queryset, cursor, page_size):
+  """
+  Returns the page of the queryset after (or before) the cursor,
+  one extra row is fetched to know if there are more pages
+  """
+  ordering = get_cursor_ordering(queryset)
+  direction = NEXT
+  if cursor:
+    values, direction = decode_cursor(cursor)
+    values = parse_cursor_values(values, ordering)
+    queryset = queryset.filter(get_keyset_filter(ordering, values, reverse=direction == PREVIOUS))
+
+  reverse = direction == PREVIOUS
+  queryset = queryset.order_by(*[
+    ('-' if descending != reverse else '') + name for name, descending, _ in ordering
+  ])
+  rows = list(queryset[:page_size + 1])
+  has_more = len(rows) > page_size
+  rows = rows[:page_size]
+  if reverse:
+    rows.reverse()
+
+  has_next = has_more if not reverse else True
+  has_previous = bool(cursor) if not reverse else has_more
+  next_cursor = encode_cursor(get_cursor_values(rows[-1], ordering), NEXT) if rows and has_next else None
+  previous_cursor = encode_cursor(get_cursor_values(rows[0], ordering), PREVIOUS) if rows and has_previous else None
+  return CursorPage(rows, page_size, next_cursor, previous_cursor)
@@ -0,0 +1,43 @@
+"""
+Strong ETags and conditional GET (If-None-Match -> 304) for the API views.
+The ETags are computed from row versions (updated_at) or from a hash of the data
+stored next to it in the cache, so a 304 doesn't serialize anything.
+"""
+
+import hashlib
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, quote_etag
+from glik.constants import REQUEST_SUCCESSFUL
+from utils.api_response import get_successful_response
+
+def get_content_etag(data):
+  content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+  return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+def get_version_etag(*versions):
+  """
+  ETag of rows given by their versions, for example: (id, updated_at)
+  """
+  return hashlib.sha256(repr(versions).encode('utf-8')).hexdigest()[:32]
+
+def get_response_etag(request, etag):
+  """
+  The same data has a different body in each renderer (camel case json, browsable api),
+  so the format of the renderer is part of the ETag
+  """
+  renderer = getattr(request, 'accepted_renderer', None)
+  renderer_format = renderer.format if renderer else ''
+  return quote_etag(f"{etag}-{renderer_format}")
+
+def get_conditional_successful_response(request, etag, get_data, message=REQUEST_SUCCESSFUL):
+  """
+  Returns 304 when the If-None-Match header has the ETag, otherwise
+  the successful response with the data returned by get_data
+  """
+  etag = get_response_etag(request, etag)
+  response = get_conditional_response(request, etag=etag)
+  if response is None:
+    response = get_successful_response(message=message, data=get_data())
+  response['ETag'] = etag
+  return response
@@ -0,0 +1,176 @@
+"""
+Storages of the uploaded files, configured in STORAGES (glik/settings.py)
+"""
+
+import hashlib
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+from storages.backends.gcloud import GoogleCloudStorage
+from storages.utils import clean_name
+from glik.constants import SIGNED_URL_CACHE_MARGIN_SECONDS, PUBLIC_FILES_CACHE_CONTROL, DIRECT_UPLOAD_SECONDS, \
+  DIRECT_UPLOAD_FILE_SIGNATURES
+
+def get_public_storage():
+  """
+  Storage of the public files, used as a callable so the fields don't
+  freeze the storage in the migrations
+  """
+  return storages['public']
+
+def get_content_hash(content):
+  sha256 = hashlib.sha256()
+  content.seek(0)
+  for chunk in content.chunks():
+    sha256.update(chunk)
+  content.seek(0)
+  return sha256.hexdigest()
+
+def open_stream(storage, name, chunk_size):
+  """
+  Opens a stored file to read it by parts. storage.open downloads the whole
+  object of a bucket to a temporary file, the blob reader gets each chunk
+  with a range request and can seek
+  """
+  if isinstance(storage, GoogleCloudStorage):
+    return storage.bucket.blob(storage._normalize_name(clean_name(name))).open('rb', chunk_size=chunk_size)
+  return storage.open(name, 'rb')
+
+def has_file_signature(storage, name):
+  """
+  The client declares the content type of a direct upload, the first bytes of the
+  object must be the signature of its extension (DIRECT_UPLOAD_FILE_SIGNATURES)
+  """
+  signature = DIRECT_UPLOAD_FILE_SIGNATURES[os.path.splitext(name)[1].lower()]
+  length = max(offset + len(magic) for offset, magic in signature)
+  with open_stream(storage, name, 256 * 1024) as stream:
+    head = stream.read(length)
+  return all(head[offset:offset + len(magic)] == magic for offset, magic in signature)
+
+def get_content_addressed_name(name, content):
+  """
+  Adds the hash of the content to the name: product_images/moto.jpg -> product_images/moto-3f1b2c4d5e6f7a8b.jpg
+  """
+  root, extension = os.path.splitext(name)
+  return f"{root}-{get_content_hash(content)[:16]}{extension.lower()}"
+
+class DirectUploadMixin:
+  """
+  Uploads from the clients straight to the bucket, the files don't go through the workers.
+  The client starts a resumable session with the signed url (POST with the headers), the
+  Location of the response is the session url where it uploads the file and resumes it
+  after a failure. Then finalize_upload confirms the object. The signed headers limit
+  the object to the size declared by the client and only create it, an uploaded object
+  can't be replaced with the same url
+  """
+
+  def get_upload_session(self, name, content_type, size):
+    name = self._normalize_name(clean_name(name))
+    headers = {
+      'Content-Type': content_type,
+      'x-goog-content-length-range': f"0,{size}",
+      'x-goog-if-generation-match': '0',
+    }
+    acl = self.get_object_parameters(name).get('acl', self.default_acl)
+    if acl:
+      # the canned acls of the XML api: publicRead -> public-read
+      headers['x-goog-acl'] = re.sub(r'[A-Z]', lambda letter: '-' + letter.group().lower(), acl)
+    params = { 'version': 'v4', 'method': 'RESUMABLE', 'expiration': timedelta(seconds=DIRECT_UPLOAD_SECONDS), 'headers': headers }
+    if self.iam_sign_blob:
+      params['service_account_email'], params['access_token'] = self._get_iam_sign_blob_params()
+    url = self.bucket.blob(name).generate_signed_url(**params)
+    return { 'url': url, 'method': 'POST', 'headers': { **headers, 'x-goog-resumable': 'start' } }
+
+  def finalize_upload(self, name):
+    """
+    Returns the size of the uploaded object, None if it wasn't uploaded. The object
+    parameters that a save would set (cache control) are set on it
+    """
+    blob = self.bucket.get_blob(self._normalize_name(clean_name(name)))
+    if blob is None:
+      return None
+    cache_control = self.get_object_parameters(name).get('cache_control')
+    if cache_control and blob.cache_control != cache_control:
+      blob.cache_control = cache_control
+      blob.patch()
+    return blob.size
+
+@deconstructible
+class FileSystemDirectUploadStorage(FileSystemStorage):
+  """
+  Stand-in of the direct uploads of the buckets for the tests and development,
+  the session url is the path of the file and the client writes it there
+  """
+
+  def get_upload_session(self, name, content_type, size):
+    os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+    return { 'url': Path(self.path(name)).as_uri(), 'method': 'PUT', 'headers': { 'Content-Type': content_type } }
+
+  def finalize_upload(self, name):
+    return self.size(name) if self.exists(name) else None
+
+@deconstructible
+class CachedSignedURLGoogleCloudStorage(DirectUploadMixin, GoogleCloudStorage):
+  """
+  Google Cloud Storage that reuses the signed url of a blob while it is valid.
+  Each signature costs a RSA operation, so the urls are kept in the shared cache
+  until SIGNED_URL_CACHE_MARGIN_SECONDS before they expire
+  """
+
+  def get_signed_url_cache_key(self, name):
+    digest = hashlib.sha256(f"{self.bucket_name}/{name}".encode('utf-8')).hexdigest()
+    return f"storage:signed-url:{digest}"
+
+  def get_signed_url_cache_timeout(self):
+    expiration = self.expiration
+    if isinstance(expiration, timedelta):
+      expiration = expiration.total_seconds()
+    return int(expiration) - SIGNED_URL_CACHE_MARGIN_SECONDS
+
+  def is_signed(self, name):
+    acl = self.get_object_parameters(name).get('acl', self.default_acl)
+    return self.querystring_auth and acl != 'publicRead'
+
+  def url(self, name, parameters=None):
+    timeout = self.get_signed_url_cache_timeout()
+    # urls with custom parameters or public urls are not cached
+    if parameters or timeout <= 0 or not self.is_signed(name):
+      return super().url(name, parameters)
+
+    key = self.get_signed_url_cache_key(name)
+    url = cache.get(key)
+    if url is None:
+      url = super().url(name)
+      cache.set(key, url, timeout)
+    return url
+
+  def delete(self, name):
+    super().delete(name)
+    cache.delete(self.get_signed_url_cache_key(name))
+
+@deconstructible
+class PublicGoogleCloudStorage(DirectUploadMixin, GoogleCloudStorage):
+  """
+  Google Cloud Storage for public content. The urls are not signed and the
+  objects are named after the hash of their content, so an object never
+  changes and browsers and CDNs can keep it as long as they want
+  """
+
+  def get_default_settings(self):
+    default_settings = super().get_default_settings()
+    default_settings.update({
+      'querystring_auth': False,
+      'object_parameters': { 'cache_control': PUBLIC_FILES_CACHE_CONTROL },
+    })
+    return default_settings
+
+  def _save(self, name, content):
+    name = get_content_addressed_name(name, content)
+    # the same content was already uploaded
+    if self.exists(name):
+      return name
+    return super()._save(name, content)
@@ -0,0 +1,116 @@
+"""
+Streaming export of the list endpoints: ?format=ndjson|csv&stream=1
+The rows are read from a server-side cursor by chunks and written to the response
+while they are serialized, so the memory doesn't grow with the size of the export
+"""
+
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from djangorestframework_camel_case.settings import api_settings as camel_case_settings
+from djangorestframework_camel_case.util import camelize
+from rest_framework.settings import api_settings
+from exceptions.custom_exception import CustomException
+from glik.constants import STREAM_CHUNK_SIZE
+
+class StreamFormatRenderer(CamelCaseJSONRenderer):
+  """
+  Only selects the format of the export (DRF returns 404 for an unknown ?format=),
+  the responses that are not streamed (errors) are json with its content type
+  """
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+      response['Content-Type'] = 'application/json'
+    return super().render(data, accepted_media_type, renderer_context)
+
+class NDJSONRenderer(StreamFormatRenderer):
+  media_type = 'application/x-ndjson'
+  format = 'ndjson'
+
+class CSVRenderer(StreamFormatRenderer):
+  media_type = 'text/csv'
+  format = 'csv'
+
+# Renderers of the list views, json stays the default
+STREAM_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, CSVRenderer]
+
+STREAM_CONTENT_TYPES = {
+  'ndjson': 'application/x-ndjson',
+  'csv': 'text/csv; charset=utf-8',
+}
+
+def is_stream_request(request):
+  """
+  Example: /api/lease/all?format=ndjson&stream=1, without format the list is paginated.
+  The pages are only json, the export formats need stream=1
+  """
+  stream_format = request.GET.get('format')
+  if stream_format not in STREAM_CONTENT_TYPES:
+    return False
+  if request.GET.get('stream') not in ('1', 'true'):
+    raise CustomException(f"The {stream_format} format is only available with stream=1", 400)
+  return True
+
+class Echo:
+  """
+  The csv writer writes to this object, it returns the line instead of buffering it
+  """
+  def write(self, value):
+    return value
+
+def get_chunks(queryset, chunk_size):
+  """
+  Yields lists of chunk_size instances, iterator() uses a server-side cursor
+  in postgres (and runs the prefetch_related of each chunk)
+  """
+  chunk = []
+  for instance in queryset.iterator(chunk_size=chunk_size):
+    chunk.append(instance)
+    if len(chunk) >= chunk_size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+def get_serialized_rows(queryset, serializer_class, chunk_size):
+  for chunk in get_chunks(queryset, chunk_size):
+    # one serializer per chunk, so the list serializers can still work by batches
+    yield from camelize(serializer_class(chunk, many=True).data, **camel_case_settings.JSON_UNDERSCOREIZE)
+
+def get_ndjson_lines(rows):
+  for row in rows:
+    yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+def get_csv_lines(rows, columns):
+  writer = csv.writer(Echo())
+  yield writer.writerow(columns)
+  for row in rows:
+    # the nested values (lists and objects) are written as json
+    yield writer.writerow([
+      json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+      for value in (row.get(column) for column in columns)
+    ])
+
+def get_stream_response(request, queryset, serializer_class, file_name, chunk_size=STREAM_CHUNK_SIZE):
+  """
+  This method is used to export a queryset with the serializer of its list endpoint,
+  as ndjson (one json object by line) or csv (one column by readable field of the serializer)
+  """
+  stream_format = request.GET.get('format')
+  rows = get_serialized_rows(queryset, serializer_class, chunk_size)
+  if stream_format == 'csv':
+    # the write only fields (password) are not in the rows
+    fields = [ name for name, field in serializer_class().fields.items() if not field.write_only ]
+    columns = list(camelize(dict.fromkeys(fields), **camel_case_settings.JSON_UNDERSCOREIZE))
+    lines = get_csv_lines(rows, columns)
+  else:
+    lines = get_ndjson_lines(rows)
+
+  response = StreamingHttpResponse(lines, content_type=STREAM_CONTENT_TYPES[stream_format])
+  response['Content-Disposition'] = f'attachment; filename="{file_name}.{stream_format}"'
+  # the proxies must not wait for the whole response
+  response['X-Accel-Buffering'] = 'no'
+  return response
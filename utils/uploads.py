@@ -0,0 +1,38 @@
+"""
+Handlers of the uploaded files, configured in FILE_UPLOAD_HANDLERS (glik/settings.py)
+"""
+
+import hashlib
+import zlib
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+class HashingUploadMixin:
+  """
+  Hashes the files while they are received: the uploaded file has the sha256 and the
+  crc32 of its content (file.sha256, file.crc32) without reading it again, see users/services/blob.py
+  """
+
+  def new_file(self, *args, **kwargs):
+    self.sha256 = hashlib.sha256()
+    self.crc32 = 0
+    return super().new_file(*args, **kwargs)
+
+  def receive_data_chunk(self, raw_data, start):
+    # the memory handler only keeps the small files, the large ones go on to the temporary file handler
+    if getattr(self, 'activated', True):
+      self.sha256.update(raw_data)
+      self.crc32 = zlib.crc32(raw_data, self.crc32)
+    return super().receive_data_chunk(raw_data, start)
+
+  def file_complete(self, file_size):
+    file = super().file_complete(file_size)
+    if file is not None:
+      file.sha256 = self.sha256.hexdigest()
+      file.crc32 = self.crc32
+    return file
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+  pass
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+  pass
@@ -0,0 +1,264 @@
+"""
+Zip archives of stored files, built while they are sent. The files are read from the
+storage by chunks and stored without compression (the documents are pdf and images,
+already compressed), so the memory doesn't grow with the archive and nothing is written
+to disk. The size of the archive is known before reading the files, and when the crc32
+of every file is known too (DocumentBlob.crc32) any part of it can be built: the archive
+answers the Range requests and the downloads can be resumed
+"""
+
+import queue
+import re
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import quote_etag
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from rest_framework.settings import api_settings
+from exceptions.custom_exception import CustomException
+from utils.storages import open_stream
+from glik.constants import ZIP_STREAM_CHUNK_SIZE, ZIP_STREAM_WORKERS, ZIP_STREAM_PREFETCH_CHUNKS
+
+class ZipRenderer(CamelCaseJSONRenderer):
+  """
+  Only accepts the requests of the archives (Accept: application/zip),
+  the responses that are not archives (errors) are rendered as json
+  """
+  media_type = 'application/zip'
+  format = 'zip'
+
+ZIP_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, ZipRenderer]
+
+# Without zip64 the sizes, the offsets and the number of files are limited
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+# Version 2.0: stored files and data descriptors
+ZIP_VERSION = 20
+# The names are utf-8, and the files with a data descriptor have their crc32 after the data
+ZIP_FLAG_UTF8 = 0x0800
+ZIP_FLAG_DATA_DESCRIPTOR = 0x0008
+
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+DATA_DESCRIPTOR = struct.Struct('<4s3L')
+CENTRAL_DIRECTORY_HEADER = struct.Struct('<4s6H3L5H2L')
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class ZipEntry:
+  """
+  A stored file of the archive, crc32 is None when it is only known after reading the file
+  """
+  def __init__(self, name, storage, storage_name, size, crc32=None, modified=None):
+    self.name = name.encode('utf-8')
+    self.storage = storage
+    self.storage_name = storage_name
+    self.size = size
+    # the crc32 of an empty file is 0
+    self.crc32 = 0 if size == 0 else crc32
+    self.has_data_descriptor = self.crc32 is None
+    self.flags = ZIP_FLAG_UTF8 | (ZIP_FLAG_DATA_DESCRIPTOR if self.has_data_descriptor else 0)
+    self.time, self.date = get_dos_datetime(modified)
+    self.offset = 0
+
+  def get_local_header(self):
+    return LOCAL_HEADER.pack(
+      b'PK\x03\x04', ZIP_VERSION, self.flags, 0, self.time, self.date,
+      0 if self.has_data_descriptor else self.crc32, self.size, self.size, len(self.name), 0,
+    ) + self.name
+
+  def get_data_descriptor(self):
+    return DATA_DESCRIPTOR.pack(b'PK\x07\x08', self.crc32, self.size, self.size)
+
+  def get_central_directory_header(self):
+    return CENTRAL_DIRECTORY_HEADER.pack(
+      b'PK\x01\x02', ZIP_VERSION, ZIP_VERSION, self.flags, 0, self.time, self.date,
+      self.crc32, self.size, self.size, len(self.name), 0, 0, 0, 0, 0, self.offset,
+    ) + self.name
+
+def get_dos_datetime(value):
+  """
+  Date and time of the files in the zip format, local time from 1980 with 2 seconds of precision
+  """
+  if value is None:
+    return 0, (1 << 5) | 1
+  value = timezone.localtime(value) if timezone.is_aware(value) else value
+  if value.year < 1980:
+    return 0, (1 << 5) | 1
+  return (
+    (value.hour << 11) | (value.minute << 5) | (value.second // 2),
+    ((value.year - 1980) << 9) | (value.month << 5) | value.day,
+  )
+
+class ZipFileReader:
+  """
+  Reads the files of a part of the archive in threads: ZIP_STREAM_WORKERS files at the
+  same time and up to ZIP_STREAM_PREFETCH_CHUNKS chunks ahead of each one. The executor
+  starts the files in order, so the file that is being sent is always being read
+  """
+  def __init__(self, parts):
+    self.cancelled = threading.Event()
+    self.queues = deque()
+    self.executor = ThreadPoolExecutor(max_workers=ZIP_STREAM_WORKERS, thread_name_prefix='zip-stream') if parts else None
+    for entry, start, end in parts:
+      chunks = queue.Queue(maxsize=ZIP_STREAM_PREFETCH_CHUNKS)
+      self.executor.submit(self.read, entry, start, end, chunks)
+      self.queues.append(chunks)
+
+  def put(self, chunks, item):
+    # the response was closed (the client went away), the files aren't read any more
+    while not self.cancelled.is_set():
+      try:
+        chunks.put(item, timeout=1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def read(self, entry, start, end, chunks):
+    try:
+      with open_stream(entry.storage, entry.storage_name, ZIP_STREAM_CHUNK_SIZE) as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+          chunk = file.read(min(ZIP_STREAM_CHUNK_SIZE, remaining))
+          if not chunk:
+            raise IOError(f"The file {entry.storage_name} is smaller than {entry.size} bytes")
+          remaining -= len(chunk)
+          if not self.put(chunks, chunk):
+            return
+      self.put(chunks, None)
+    except Exception as error:
+      self.put(chunks, error)
+
+  def get_chunks(self):
+    """
+    Chunks of the next file
+    """
+    chunks = self.queues.popleft()
+    while True:
+      item = chunks.get()
+      if item is None:
+        return
+      if isinstance(item, Exception):
+        raise item
+      yield item
+
+  def close(self):
+    self.cancelled.set()
+    if self.executor is not None:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+
+class ZipStream:
+  """
+  The archive is a list of segments: the headers of each file, its data and, at the end,
+  the central directory. The headers are built when they are sent, so the data
+  descriptors and the central directory have the crc32 of the files read before
+  """
+  def __init__(self, entries):
+    self.entries = entries
+    self.segments = []
+    offset = 0
+    for entry in entries:
+      entry.offset = offset
+      offset += self.add_segment(LOCAL_HEADER.size + len(entry.name), entry.get_local_header)
+      offset += self.add_segment(entry.size, entry)
+      if entry.has_data_descriptor:
+        offset += self.add_segment(DATA_DESCRIPTOR.size, entry.get_data_descriptor)
+    self.central_directory_offset = offset
+    self.central_directory_size = sum(CENTRAL_DIRECTORY_HEADER.size + len(entry.name) for entry in entries)
+    offset += self.add_segment(self.central_directory_size + END_OF_CENTRAL_DIRECTORY.size, self.get_central_directory)
+    self.size = offset
+    # a part of the archive can only be built when all the crc32 are known
+    self.is_seekable = not any(entry.has_data_descriptor for entry in entries)
+
+  def add_segment(self, length, value):
+    self.segments.append((length, value))
+    return length
+
+  def get_central_directory(self):
+    return b''.join(entry.get_central_directory_header() for entry in self.entries) + END_OF_CENTRAL_DIRECTORY.pack(
+      b'PK\x05\x06', 0, 0, len(self.entries), len(self.entries),
+      self.central_directory_size, self.central_directory_offset, 0,
+    )
+
+  def iter_bytes(self, start=0, end=None):
+    """
+    The bytes of the archive from start to end (not included)
+    """
+    end = self.size if end is None else end
+    parts = []
+    offset = 0
+    for length, value in self.segments:
+      if offset < end and offset + length > start:
+        parts.append((value, max(start - offset, 0), min(end - offset, length)))
+      offset += length
+
+    files = ZipFileReader([ part for part in parts if isinstance(part[0], ZipEntry) ])
+    try:
+      for value, part_start, part_end in parts:
+        if not isinstance(value, ZipEntry):
+          yield value()[part_start:part_end]
+          continue
+        crc32 = 0
+        for chunk in files.get_chunks():
+          if value.has_data_descriptor:
+            crc32 = zlib.crc32(chunk, crc32)
+          yield chunk
+        if value.has_data_descriptor:
+          value.crc32 = crc32
+    finally:
+      files.close()
+
+def get_byte_range(request, size, etag):
+  """
+  The range of a Range header as (start, end not included), None for the whole archive.
+  Only one range is served, the others and the ones of an old version (If-Range) get the
+  whole archive. The start of the ranges after the end is the size
+  """
+  match = RANGE_HEADER.match(request.headers.get('Range', '').strip())
+  if match is None or request.headers.get('If-Range', etag) != etag:
+    return None
+  first, last = match.groups()
+  if first:
+    if last and int(last) < int(first):
+      return None
+    return min(int(first), size), min(int(last) + 1, size) if last else size
+  if last:
+    # the last bytes: bytes=-500
+    return max(size - int(last), 0), size
+  return None
+
+def get_zip_response(request, entries, file_name, etag):
+  """
+  This method is used to send the stored files as a zip archive, the ETag
+  identifies the files (it validates the If-Range of the resumed downloads)
+  """
+  if len(entries) > ZIP_MAX_ENTRIES:
+    raise CustomException(message=f"The archive can't have more than {ZIP_MAX_ENTRIES} files", status_code=400)
+  archive = ZipStream(entries)
+  if archive.size > ZIP_MAX_SIZE:
+    raise CustomException(message=f"The archive can't be larger than {ZIP_MAX_SIZE} bytes", status_code=400)
+
+  etag = quote_etag(etag)
+  byte_range = get_byte_range(request, archive.size, etag) if archive.is_seekable else None
+  if byte_range and byte_range[0] >= archive.size:
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f"bytes */{archive.size}"
+    return response
+
+  start, end = byte_range or (0, archive.size)
+  response = StreamingHttpResponse(archive.iter_bytes(start, end), content_type='application/zip', status=206 if byte_range else 200)
+  if byte_range:
+    response['Content-Range'] = f"bytes {start}-{end - 1}/{archive.size}"
+  response['Content-Length'] = end - start
+  response['Content-Disposition'] = f'attachment; filename="{file_name}.zip"'
+  response['Accept-Ranges'] = 'bytes' if archive.is_seekable else 'none'
+  response['ETag'] = etag
+  # the proxies must not wait for the whole response
+  response['X-Accel-Buffering'] = 'no'
+  return response